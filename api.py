@@ -0,0 +1,330 @@
+"""API HTTP sin interfaz sobre el mismo motor que la app de Streamlit
+
+Endpoints (JSON):
+    POST   /uploads                 cuerpo: CSV de GSC (Pages)   -> {upload, rows}
+    GET    /uploads/<id>/ranking    ?top=50, ranking_mode=score|click_gain y pesos/umbrales de DEFAULT_SCORING
+    POST   /audits                  {url, assets?, upload?, language?} -> {job}
+    POST   /jobs                    {kind, params}               -> {job}  (solo PUBLIC_JOB_KINDS sin token)
+    GET    /jobs/<id>               estado, progreso y resultado
+    DELETE /jobs/<id>               cancela
+    GET    /health
+    GET    /stats                   pool de descargas: cola, en curso y espera por propietario
+
+Cada petición se atiende en su hilo. Los trabajos largos van al pool de trabajos
+del proceso (jobs.py), con la IP del cliente como propietario para el reparto de
+descargas (fetchpool), y los CSV limpios y los rankings calculados se comparten
+entre clientes en cachés LRU. La clave de Groq va en la cabecera X-Groq-Api-Key;
+con CRP_API_TOKEN definido se exige Authorization: Bearer <token>. Sin token,
+POST /jobs solo acepta los tipos de CRP_API_JOB_KINDS (por defecto audit): el
+resto (crawl, sitemaps…) haría peticiones a cualquier dominio desde este host.
+
+Uso:
+    python -m api --port 8502
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import jobs
+
+API_TOKEN = os.environ.get('CRP_API_TOKEN')
+MAX_UPLOAD_BYTES = int(os.environ.get('CRP_API_MAX_UPLOAD_MB', 200)) * 1024 * 1024
+MAX_UPLOADS = int(os.environ.get('CRP_API_UPLOADS', 16))
+MAX_RANKINGS = 256
+DEFAULT_TOP = 50
+MAX_TOP = 10000
+PUBLIC_JOB_KINDS = frozenset(k for k in os.environ.get('CRP_API_JOB_KINDS', 'audit').split(',') if k)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    """Caché LRU acotada y segura entre hilos"""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+_uploads = LRUCache(MAX_UPLOADS)
+_rankings = LRUCache(MAX_RANKINGS)
+
+
+def jsonable(value):
+    """Resultados de trabajos y DataFrames a tipos JSON (NaN/inf -> null)"""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        return jsonable(value.to_dict('records'))
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    if hasattr(value, 'to_dict'):
+        return jsonable(value.to_dict())
+    if hasattr(value, 'summary'):
+        return jsonable(value.summary())
+    return str(value)
+
+
+def load_upload(body):
+    """Limpia un CSV de GSC y lo guarda en la caché compartida. El id es el hash del contenido"""
+    import pandas as pd
+    from gsc import clean_gsc_data
+
+    upload_id = hashlib.sha256(body).hexdigest()[:16]
+    if _uploads.get(upload_id) is None:
+        clean = clean_gsc_data(pd.read_csv(io.BytesIO(body), encoding='utf-8', on_bad_lines='skip'))
+        if clean is None:
+            raise ApiError(422, "El CSV no tiene columnas de posición y clicks reconocibles")
+        _uploads.put(upload_id, clean)
+    return upload_id, len(_uploads.get(upload_id))
+
+
+def _upload(upload_id):
+    clean = _uploads.get(upload_id)
+    if clean is None:
+        raise ApiError(404, f"Upload desconocido o expirado: {upload_id}")
+    return clean
+
+
+def _scoring(query):
+    from gsc import CTR_MAX_POSITION, DEFAULT_SCORING, RANKING_MODES
+
+    config = {}
+    for key, values in query.items():
+        if key == 'top':
+            continue
+        if key not in DEFAULT_SCORING:
+            raise ApiError(400, f"Parámetro desconocido: {key}")
+        if key == 'ranking_mode':
+            if values[-1] not in RANKING_MODES:
+                raise ApiError(400, f"ranking_mode debe ser uno de {', '.join(RANKING_MODES)}")
+            config[key] = values[-1]
+            continue
+        try:
+            value = float(values[-1])
+            if not math.isfinite(value):
+                raise ValueError(values[-1])
+            config[key] = type(DEFAULT_SCORING[key])(value)
+        except (ValueError, OverflowError):
+            raise ApiError(400, f"Valor no numérico para {key}: {values[-1]}")
+        if key == 'gain_positions':
+            if not 1 <= config[key] <= CTR_MAX_POSITION:
+                raise ApiError(400, f"gain_positions debe estar entre 1 y {CTR_MAX_POSITION}")
+        elif config[key] < 0:
+            # Pesos, bonificaciones, umbrales, días y ventana de posiciones
+            raise ApiError(400, f"{key} no puede ser negativo")
+
+    cfg = dict(DEFAULT_SCORING, **config)
+    if cfg['position_min'] > cfg['position_max']:
+        raise ApiError(400, "position_min no puede ser mayor que position_max")
+    return config
+
+
+def ranking(upload_id, query):
+    """JSON (bytes) del top del ranking; se cachea por upload, configuración y top"""
+    from gsc import rank_gsc_data
+
+    clean = _upload(upload_id)
+    config = _scoring(query)
+    try:
+        top = int(query.get('top', [DEFAULT_TOP])[-1])
+    except ValueError:
+        raise ApiError(400, "top debe ser un entero")
+    if not 1 <= top <= MAX_TOP:
+        raise ApiError(400, f"top debe estar entre 1 y {MAX_TOP}")
+    key = (upload_id, tuple(sorted(config.items())), top)
+    cached = _rankings.get(key)
+    if cached is None:
+        ranked, total = rank_gsc_data(clean, config, top_k=top)
+        rows = [] if ranked is None else jsonable(ranked)
+        cached = json.dumps({'upload': upload_id, 'total': total, 'rows': rows}, ensure_ascii=False).encode('utf-8')
+        _rankings.put(key, cached)
+    return cached
+
+
+def submit_audit(payload, secrets, owner=None):
+    """Encola una auditoría; con `upload` las métricas GSC de la URL permiten pedir el insight"""
+    from gsc import insight_metrics
+
+    url = payload.get('url')
+    if not url:
+        raise ApiError(400, "Falta 'url'")
+    params = {'url': url, 'assets': bool(payload.get('assets')), 'language': payload.get('language', 'English'),
+              'domain': payload.get('domain')}
+    if payload.get('upload'):
+        clean = _upload(payload['upload'])
+        rows = clean[clean['url'] == url]
+        if len(rows):
+            params['metrics'] = jsonable(insight_metrics(rows.iloc[0]))
+    return jobs.submit('audit', params, secrets, owner)
+
+
+def job_status(job_id):
+    job = jobs.queue().get(job_id)
+    if job is None:
+        raise ApiError(404, f"Trabajo desconocido: {job_id}")
+    if job['status'] == 'done':
+        job['result'] = jsonable(jobs.queue().result(job_id))
+    return jsonable(job)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'crp-api'
+    # Cabeceras y cuerpo van en escrituras separadas: con Nagle cada respuesta keep-alive espera ~40 ms al ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_UPLOAD_BYTES:
+            # El cuerpo no se lee: la conexión no se puede reutilizar
+            self.close_connection = True
+            raise ApiError(413, f"Máximo {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        return self.rfile.read(length)
+
+    def _json(self):
+        try:
+            payload = json.loads(self._body() or b'{}')
+        except ValueError:
+            raise ApiError(400, "JSON inválido")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "Se esperaba un objeto JSON")
+        return payload
+
+    def _secrets(self):
+        api_key = self.headers.get('X-Groq-Api-Key')
+        return {'groq_api_key': api_key} if api_key else None
+
+    def _owner(self):
+        return f"api:{self.client_address[0]}"
+
+    def _dispatch(self, method):
+        try:
+            if API_TOKEN and self.headers.get('Authorization') != f"Bearer {API_TOKEN}":
+                raise ApiError(401, "Token inválido")
+            parts = urlsplit(self.path)
+            path = [p for p in parts.path.split('/') if p]
+            status, body = self._route(method, path, parse_qs(parts.query))
+        except ApiError as e:
+            status, body = e.status, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': f"{type(e).__name__}: {e}"}
+        self._send(status, body)
+
+    def _route(self, method, path, query):
+        if method == 'GET' and path == ['health']:
+            return 200, {'status': 'ok', 'uploads': len(_uploads), 'job_workers': jobs.JOB_WORKERS, 'time': time.time()}
+        if method == 'GET' and path == ['stats']:
+            import fetchpool
+            return 200, {'fetch': fetchpool.pool().stats(), 'owners': fetchpool.pool().snapshot()}
+        if method == 'POST' and path == ['uploads']:
+            upload_id, rows = load_upload(self._body())
+            return 201, {'upload': upload_id, 'rows': rows}
+        if method == 'GET' and len(path) == 3 and path[0] == 'uploads' and path[2] == 'ranking':
+            return 200, ranking(path[1], query)
+        if method == 'POST' and path == ['audits']:
+            return 202, {'job': submit_audit(self._json(), self._secrets(), self._owner())}
+        if method == 'POST' and path == ['jobs']:
+            payload = self._json()
+            if payload.get('kind') not in jobs.HANDLERS:
+                raise ApiError(400, f"Tipo de trabajo desconocido: {payload.get('kind')}")
+            if not API_TOKEN and payload['kind'] not in PUBLIC_JOB_KINDS:
+                raise ApiError(403, f"Tipo de trabajo no permitido sin CRP_API_TOKEN: {payload['kind']}")
+            return 202, {'job': jobs.submit(payload['kind'], payload.get('params') or {}, self._secrets(),
+                                            self._owner())}
+        if len(path) == 2 and path[0] == 'jobs':
+            if method == 'GET':
+                return 200, job_status(path[1])
+            if method == 'DELETE':
+                job_status(path[1])
+                jobs.cancel(path[1])
+                return 200, {'job': path[1], 'status': jobs.queue().get(path[1])['status']}
+        raise ApiError(404, f"Ruta desconocida: {method} {self.path}")
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+def serve(host='127.0.0.1', port=8502):
+    """Arranca la API en un hilo. Devuelve (server, base_url); port=0 elige uno libre"""
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP del priorizador")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args(argv)
+
+    jobs.pool()
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.daemon_threads = True
+    print(f"http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
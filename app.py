@@ -1,14 +1,7 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-from groq import Groq
-import requests
-from bs4 import BeautifulSoup
-import json
-import time
-import re
-import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import perf
+import jobs
+from texts import TEXTS_BY_LANGUAGE
 
 st.set_page_config(page_title="Content Refresh Prioritizer", page_icon="🎯", layout="wide")
 
@@ -53,576 +46,481 @@ else:
 if api_key_input:
     st.session_state['groq_api_key'] = api_key_input
 
-# Textos según idioma
-if language == "Español":
-    TEXTS = {
-        'title': '🎯 Content Refresh Prioritizer',
-        'subtitle': 'Descubre qué páginas optimizar primero basándote en Google Search Console',
-        'upload': '📊 Google Search Console CSV',
-        'analyze_btn': '🚀 Analizar',
-        'analyzing': 'Analizando datos...',
-        'success': 'oportunidades encontradas',
-        'new_analysis': '🔄 Nuevo análisis',
-        'prioritized_urls': '📋 URLs Priorizadas',
-        'select_url': '💡 **Selecciona una URL** de la lista escribiendo su número para ver el análisis completo',
-        'enter_number': 'Ingresa el número (#) de la URL que quieres analizar:',
-        'analyze_selected': '🔍 Analizar URL seleccionada',
-        'deep_analysis': '🎯 Análisis Profundo',
-        'on_page': '🔍 Análisis On-Page',
-        'ai_recommendations': '💡 Recomendaciones IA',
-        'generating': 'Generando análisis personalizado...',
-        'internal_links': '🔗 Recomendaciones de Enlaces Internos',
-        'current': 'Actual',
-        'suggestion': 'Sugerencia',
-        'your_page_has': 'Tu página tiene',
-        'internal_links_text': 'enlaces internos en el contenido.',
-        'add_links_to': 'Añade enlaces a estas páginas de alto rendimiento:',
-        'comparativa': '📊 Comparativa vs Top 10 de Google',
-        'auto_scraping': '🤖 Scraping Automático',
-        'manual_input': '✍️ Input Manual',
-        'auto_desc': '**Intenta obtener automáticamente las URLs del top 10 de Google**',
-        'enter_keyword': 'Ingresa la keyword principal de esta URL:',
-        'keyword_placeholder': 'Ej: how to build app with bubble',
-        'get_top10': '🔍 Obtener Top 10 automáticamente',
-        'getting_top10': 'Obteniendo top 10 para',
-        'urls_obtained': 'Se obtuvieron',
-        'obtained_urls': 'URLs obtenidas',
-        'analyze_urls': '▶️ Analizar estas URLs',
-        'scraping_blocked': 'No se pudo obtener el top 10 automáticamente',
-        'use_manual': 'Google está bloqueando el scraping. Usa el método **Input Manual** en la pestaña de al lado.',
-        'manual_desc': '**Pega manualmente las URLs del top 10 de Google**',
-        'manual_tip': '💡 Abre Google en modo incógnito, busca tu keyword, y copia las URLs de los primeros 10 resultados',
-        'keyword': 'Keyword:',
-        'paste_urls': 'Pega las URLs del top 10 (una por línea):',
-        'urls_ready': 'URLs listas para analizar',
-        'need_3_urls': 'Necesitas al menos 3 URLs válidas',
-        'analyzing_urls': 'Analizando',
-        'for_keyword': 'URLs para la keyword:',
-        'analyzing_position': 'Analizando posición',
-        'heading_recommendations': '📑 Recomendaciones de Headings Faltantes',
-        'heading_structure': '📑 Estructura de Encabezados de la Competencia',
-        'heading_structure_desc': 'Analiza cómo estructuran su contenido los competidores del Top 10',
-        'generating_headings': 'Generando análisis de headings faltantes...',
-        'new_comparativa': '🔄 Nueva comparativa',
-        'back_to_list': '⬅️ Volver a la lista de URLs',
-        'priority_calculation': '¿Cómo se calcula la prioridad?',
-        'tutorial': '¿Cómo exportar desde GSC?',
-        'upload_csv': 'Sube tu CSV de Google Search Console para comenzar',
-        'fell': 'Empeoró',
-        'rose': 'Mejoró',
-        'pos': 'pos',
-        'no_change': 'Sin cambio',
-        'api_key_required': '⚠️ Necesitas ingresar tu Groq API Key en el sidebar para usar las recomendaciones con IA',
-        'api_key_invalid': '❌ API Key inválida. Verifica que la copiaste correctamente desde console.groq.com'
-    }
-else:
-    TEXTS = {
-        'title': '🎯 Content Refresh Prioritizer',
-        'subtitle': 'Discover which pages to optimize first based on Google Search Console',
-        'upload': '📊 Google Search Console CSV',
-        'analyze_btn': '🚀 Analyze',
-        'analyzing': 'Analyzing data...',
-        'success': 'opportunities found',
-        'new_analysis': '🔄 New analysis',
-        'prioritized_urls': '📋 Prioritized URLs',
-        'select_url': '💡 **Select a URL** from the list by entering its number to see the full analysis',
-        'enter_number': 'Enter the number (#) of the URL you want to analyze:',
-        'analyze_selected': '🔍 Analyze selected URL',
-        'deep_analysis': '🎯 Deep Analysis',
-        'on_page': '🔍 On-Page Analysis',
-        'ai_recommendations': '💡 AI Recommendations',
-        'generating': 'Generating personalized analysis...',
-        'internal_links': '🔗 Internal Links Recommendations',
-        'current': 'Current',
-        'suggestion': 'Suggestion',
-        'your_page_has': 'Your page has',
-        'internal_links_text': 'internal links in content.',
-        'add_links_to': 'Add links to these high-performance pages:',
-        'comparativa': '📊 Comparison vs Google Top 10',
-        'auto_scraping': '🤖 Automatic Scraping',
-        'manual_input': '✍️ Manual Input',
-        'auto_desc': '**Try to automatically get the top 10 URLs from Google**',
-        'enter_keyword': 'Enter the main keyword for this URL:',
-        'keyword_placeholder': 'Ex: how to build app with bubble',
-        'get_top10': '🔍 Get Top 10 automatically',
-        'getting_top10': 'Getting top 10 for',
-        'urls_obtained': 'URLs obtained:',
-        'obtained_urls': 'Obtained URLs',
-        'analyze_urls': '▶️ Analyze these URLs',
-        'scraping_blocked': 'Could not get top 10 automatically',
-        'use_manual': 'Google is blocking scraping. Use the **Manual Input** method in the next tab.',
-        'manual_desc': '**Manually paste the top 10 URLs from Google**',
-        'manual_tip': '💡 Open Google in incognito mode, search your keyword, and copy the URLs of the first 10 results',
-        'keyword': 'Keyword:',
-        'paste_urls': 'Paste top 10 URLs (one per line):',
-        'urls_ready': 'URLs ready to analyze',
-        'need_3_urls': 'You need at least 3 valid URLs',
-        'analyzing_urls': 'Analyzing',
-        'for_keyword': 'URLs for keyword:',
-        'analyzing_position': 'Analyzing position',
-        'heading_recommendations': '📑 Missing Headings Recommendations',
-        'heading_structure': '📑 Competitor Heading Structure',
-        'heading_structure_desc': 'Analyze how Top 10 competitors structure their content',
-        'generating_headings': 'Generating missing headings analysis...',
-        'new_comparativa': '🔄 New comparison',
-        'back_to_list': '⬅️ Back to URL list',
-        'priority_calculation': 'How is priority calculated?',
-        'tutorial': 'How to export from GSC?',
-        'upload_csv': 'Upload your Google Search Console CSV to start',
-        'fell': 'Worsened',
-        'rose': 'Improved',
-        'pos': 'pos',
-        'no_change': 'No change',
-        'api_key_required': '⚠️ You need to enter your Groq API Key in the sidebar to use AI recommendations',
-        'api_key_invalid': '❌ Invalid API Key. Verify you copied it correctly from console.groq.com'
-    }
+# Instrumentación de rendimiento (opcional)
+st.sidebar.markdown("---")
+show_perf = st.sidebar.checkbox("📈 Performance", value=False)
+profile_mode = None
+if show_perf:
+    profile_mode = st.sidebar.selectbox("Profiler", ["off", "cprofile", "sampling"])
+    profile_mode = None if profile_mode == "off" else profile_mode
 
-def get_random_user_agent():
-    """Retorna un User-Agent aleatorio para evitar bloqueos"""
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
-    ]
-    return random.choice(user_agents)
+perf_recorder = perf.begin_run(st.session_state, profile_mode)
 
-def get_groq_insight(url, metrics, metadata, lang, api_key):
-    if not api_key:
-        return TEXTS['api_key_required']
-    
-    try:
-        client = Groq(api_key=api_key)
-        
-        if lang == "Español":
-            prompt = f"""Eres un experto SEO. Analiza esta URL y genera 3 recomendaciones ESPECÍFICAS y ACCIONABLES en español:
+TEXTS = TEXTS_BY_LANGUAGE[language]
 
-URL: {url}
+# Trabajos en segundo plano: el id va en la URL para reengancharse tras recargar la página
+for job_key in ('competitor_job', 'crawl_job', 'sitemap_job', 'batch_job', 'insights_job'):
+    if job_key not in st.session_state:
+        st.session_state[job_key] = st.query_params.get(job_key)
 
-**Datos GSC:**
-- Posición: {metrics['position']} (cambio: {metrics['position_change']})
-- Clicks: {metrics['clicks']} (cambio: {metrics['clicks_change']}%)
-- CTR: {metrics['ctr']:.1f}%
+def session_alive(owner):
+    """Los trabajos de una sesión que se cerró (pestaña cerrada, sin reenganche) se cancelan"""
+    from streamlit.runtime import Runtime
+    if not owner.startswith('session:') or not Runtime.exists():
+        return True
+    return Runtime.instance().is_active_session(owner.split(':', 1)[1])
 
-**Datos On-Page:**
-- Title: "{metadata['title']}" ({metadata['title_length']} caracteres)
-- Meta Description: ({metadata['description_length']} caracteres)
-- Word Count: {metadata['word_count']} palabras
-- H1: {metadata['h1_count']}, H2: {metadata['h2_count']}, H3: {metadata['h3_count']}
-- Schemas: {metadata['schemas_count']}
-- FAQs: {metadata['faqs_count']}
-- Enlaces internos en contenido: {metadata['internal_links']}
+def session_owner():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return f"session:{ctx.session_id}" if ctx else None
 
-Genera 3 recomendaciones concretas priorizadas por impacto. Cada una en 1 línea, formato:
-1. [Acción específica con número/dato]
-2. [Acción específica con número/dato]
-3. [Acción específica con número/dato]"""
-        else:
-            prompt = f"""You are an SEO expert. Analyze this URL and generate 3 SPECIFIC and ACTIONABLE recommendations in English:
+jobs.watch_owners(session_alive)
 
-URL: {url}
+def start_job(job_key, kind, params, secrets=None):
+    job_id = jobs.submit(kind, params, secrets, owner=session_owner())
+    st.session_state[job_key] = job_id
+    st.query_params[job_key] = job_id
+    return job_id
 
-**GSC Data:**
-- Position: {metrics['position']} (change: {metrics['position_change']})
-- Clicks: {metrics['clicks']} (change: {metrics['clicks_change']}%)
-- CTR: {metrics['ctr']:.1f}%
+def clear_job(job_key):
+    """Olvida el trabajo; si sigue en curso se cancela (el usuario ha salido de esa vista)"""
+    job = jobs.queue().get(st.session_state.get(job_key))
+    if job is not None and job['status'] in jobs.ACTIVE:
+        jobs.cancel(job['id'])
+    st.session_state[job_key] = None
+    if job_key in st.query_params:
+        del st.query_params[job_key]
 
-**On-Page Data:**
-- Title: "{metadata['title']}" ({metadata['title_length']} characters)
-- Meta Description: ({metadata['description_length']} characters)
-- Word Count: {metadata['word_count']} words
-- H1: {metadata['h1_count']}, H2: {metadata['h2_count']}, H3: {metadata['h3_count']}
-- Schemas: {metadata['schemas_count']}
-- FAQs: {metadata['faqs_count']}
-- Internal links in content: {metadata['internal_links']}
+@st.fragment(run_every=1.0)
+def job_progress(job_id):
+    """Consulta el progreso sin bloquear el resto de la página; al terminar relanza el script completo"""
+    job = jobs.queue().get(job_id)
+    if job is None or job['status'] not in jobs.ACTIVE:
+        st.rerun()
+    jobs.adopt(job_id, session_owner())
 
-Generate 3 concrete recommendations prioritized by impact. Each in 1 line, format:
-1. [Specific action with number/data]
-2. [Specific action with number/data]
-3. [Specific action with number/data]"""
+    st.caption(TEXTS['job_running'])
+    st.progress(min(job['done'] / job['total'], 1.0) if job['total'] else 0.0)
+    st.text(f"{job['status']}: {job['done']}/{job['total']} {job['message'] or ''}")
 
-        chat_completion = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.3-70b-versatile",
-            temperature=0.3,
-            max_tokens=300
-        )
-        return chat_completion.choices[0].message.content
-    except Exception as e:
-        if "invalid" in str(e).lower() or "unauthorized" in str(e).lower():
-            return TEXTS['api_key_invalid']
-        return f"Error: {str(e)}"
+    if job['kind'] == 'competitors':
+        for item in jobs.queue().items(job_id):
+            st.write(f"{'✅' if item['success'] else '❌'} {item['url']}")
 
-def clean_number(val):
-    if pd.isna(val):
-        return 0
-    if isinstance(val, (int, float)):
-        return float(val)
-    val = str(val).strip().replace('%', '').replace(',', '')
-    try:
-        return float(val)
-    except:
-        return 0
+    if st.button(TEXTS['job_cancel'], key=f"cancel_{job_id}"):
+        jobs.cancel(job_id)
+        st.rerun()
 
-def extract_domain(url):
-    if not url.startswith('http'):
-        url = 'https://' + url
-    
-    match = re.search(r'https?://([^/]+)', url)
-    if match:
-        return match.group(1).replace('www.', '')
-    return None
+def render_competitor_job(job_id):
+    """Comparativa de competidores a partir de un trabajo (en curso, terminado o con resultados parciales)"""
+    import pandas as pd
 
-def scrape_url_metadata(url, target_domain=None):
-    """Scraping mejorado con User-Agent aleatorio y mejor extracción de headings"""
-    try:
-        if not url.startswith('http'):
-            url = 'https://' + url
-        
-        if not url or url == 'https://' or len(url) < 10:
-            raise ValueError("URL inválida")
-        
-        headers = {
-            'User-Agent': get_random_user_agent(),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Referer': 'https://www.google.com/'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=6, allow_redirects=True)
-        response.raise_for_status()
-        
-        if response.encoding is None:
-            response.encoding = 'utf-8'
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Limpiar antes de extraer
-        for script in soup(['script', 'style', 'nav', 'footer', 'aside', 'form']):
-            script.decompose()
-        
-        title = soup.find('title')
-        title_text = title.get_text().strip() if title else ""
-        
-        meta_desc = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
-        description = meta_desc.get('content', '').strip() if meta_desc else ""
-        
-        # Extracción mejorada de headers
-        h1_tags = [h.get_text(" ", strip=True) for h in soup.find_all('h1') if h.get_text(strip=True)]
-        h2_tags = [h.get_text(" ", strip=True) for h in soup.find_all('h2') if h.get_text(strip=True)]
-        h3_tags = [h.get_text(" ", strip=True) for h in soup.find_all('h3') if h.get_text(strip=True)]
-        
-        # Word count
-        text = soup.get_text(" ", strip=True)
-        words = len(text.split())
-        
-        schemas = []
-        try:
-            for script in soup.find_all('script', type='application/ld+json'):
-                try:
-                    schema_data = json.loads(script.string)
-                    schema_type = schema_data.get('@type', 'Unknown')
-                    if isinstance(schema_type, list):
-                        schemas.extend(schema_type)
+    job = jobs.queue().get(job_id)
+    if job is None:
+        clear_job('competitor_job')
+        return
+
+    params = job['params']
+    own = params['own']
+
+    st.markdown("---")
+    st.info(f"{TEXTS['analyzing_urls']} {len(params['urls'])} {TEXTS['for_keyword']} **{params['keyword']}**")
+
+    if job['status'] in jobs.ACTIVE:
+        job_progress(job_id)
+        return
+
+    if job['status'] == 'done':
+        result = jobs.queue().result(job_id)
+    else:
+        st.error(f"❌ {TEXTS['job_failed']} '{job['status']}' {job['error'] or ''}")
+        result = {'competitors': jobs.queue().items(job_id), 'headings': None, 'headings_error': None}
+        if not result['competitors']:
+            return
+        st.caption(TEXTS['job_partial'])
+
+    competitors_metadata = result['competitors']
+    st.session_state.report['competitors'][own['url']] = {
+        'keyword': params['keyword'], 'competitors': competitors_metadata, 'headings': result['headings']}
+
+    aborted_count = sum(1 for m in competitors_metadata if m.get('aborted'))
+    truncated_count = sum(1 for m in competitors_metadata if m.get('truncated'))
+    if aborted_count or truncated_count:
+        st.caption(TEXTS['fetch_stats'].format(aborted=aborted_count, truncated=truncated_count))
+
+    # Tabla comparativa
+    comparison_data = []
+
+    comparison_data.append({
+        'Posición': f"#{own['position']} (TU URL)",
+        'Title': own['metadata']['title'],
+        'H1': own['metadata']['h1_count'],
+        'H2': own['metadata']['h2_count'],
+        'H3': own['metadata']['h3_count'],
+        'Words': own['metadata']['word_count']
+    })
+
+    for idx, meta in enumerate(competitors_metadata):
+        if meta['success']:
+            comparison_data.append({
+                'Posición': f"#{idx+1}",
+                'Title': meta['title'],
+                'H1': meta['h1_count'],
+                'H2': meta['h2_count'],
+                'H3': meta['h3_count'],
+                'Words': meta['word_count']
+            })
+
+    comparison_df = pd.DataFrame(comparison_data)
+    st.dataframe(comparison_df, use_container_width=True, hide_index=True)
+
+    # VISUALIZADOR DE ESTRUCTURA DE HEADINGS
+    st.markdown("---")
+    st.subheader(TEXTS['heading_structure'])
+    st.markdown(TEXTS['heading_structure_desc'])
+
+    tabs = st.tabs([f"#{i+1}" for i in range(len(competitors_metadata))])
+
+    for i, tab in enumerate(tabs):
+        with tab:
+            comp = competitors_metadata[i]
+            if comp['success']:
+                st.markdown(f"**URL:** [{comp['url']}]({comp['url']})")
+                st.markdown(f"**Title:** {comp['title']}")
+
+                col_h1, col_structure = st.columns([1, 3])
+
+                with col_h1:
+                    st.info(f"**Word Count:** {comp['word_count']}")
+                    st.markdown("### H1")
+                    if comp['h1_tags']:
+                        for h1 in comp['h1_tags']:
+                            st.write(f"• {h1}")
                     else:
-                        schemas.append(schema_type)
-                except:
-                    continue
-        except:
-            pass
-        
-        faqs = []
-        try:
-            for script in soup.find_all('script', type='application/ld+json'):
-                try:
-                    schema_data = json.loads(script.string)
-                    if schema_data.get('@type') == 'FAQPage':
-                        for entity in schema_data.get('mainEntity', []):
-                            question = entity.get('name', '')
-                            if question:
-                                faqs.append(question)
-                except:
-                    continue
-        except:
-            pass
-        
-        images_total = 0
-        images_without_alt = 0
-        try:
-            images = soup.find_all('img')
-            images_total = len(images)
-            images_without_alt = len([img for img in images if not img.get('alt')])
-        except:
-            pass
-        
-        internal_links = 0
-        if target_domain:
-            try:
-                content_area = None
-                
-                content_selectors = [
-                    soup.find('article'),
-                    soup.find('main'),
-                    soup.find('div', class_=re.compile(r'content|post|entry|article', re.I)),
-                    soup.find('div', id=re.compile(r'content|post|entry|article', re.I))
-                ]
-                
-                for selector in content_selectors:
-                    if selector:
-                        content_area = selector
-                        break
-                
-                if not content_area:
-                    content_area = soup.find('body')
-                
-                if content_area:
-                    for unwanted in content_area.find_all(['nav', 'footer', 'header', 'aside']):
-                        unwanted.decompose()
-                    
-                    all_links = content_area.find_all('a', href=True)
-                    for link in all_links:
-                        href = link['href']
-                        if target_domain in href or (href.startswith('/') and not href.startswith('//')):
-                            internal_links += 1
-            except:
-                pass
-        
-        return {
-            'success': True,
-            'url': url,
-            'title': title_text[:200],
-            'title_length': len(title_text),
-            'description': description[:500],
-            'description_length': len(description),
-            'h1_count': len(h1_tags),
-            'h1_tags': h1_tags,
-            'h2_count': len(h2_tags),
-            'h2_tags': h2_tags,
-            'h3_count': len(h3_tags),
-            'h3_tags': h3_tags,
-            'word_count': words,
-            'images_total': images_total,
-            'images_without_alt': images_without_alt,
-            'schemas': schemas,
-            'schemas_count': len(schemas),
-            'faqs_count': len(faqs),
-            'faqs': faqs,
-            'internal_links': internal_links
-        }
-        
-    except Exception as e:
-        return {
-            'success': False, 'url': url, 'error': str(e),
-            'title': '', 'title_length': 0, 'description': '', 'description_length': 0,
-            'h1_count': 0, 'h1_tags': [], 'h2_count': 0, 'h2_tags': [],
-            'h3_count': 0, 'h3_tags': [], 'word_count': 0,
-            'images_total': 0, 'images_without_alt': 0,
-            'schemas_count': 0, 'faqs_count': 0, 'internal_links': 0
-        }
+                        st.warning("No H1 found")
 
-def recommend_internal_links(current_url, all_results_df, n=3):
-    other_urls = all_results_df[all_results_df['url'] != current_url].copy()
-    
-    if len(other_urls) == 0:
-        return []
-    
-    other_urls = other_urls.sort_values('score', ascending=False)
-    
-    recommendations = []
-    for idx, row in other_urls.head(n).iterrows():
-        recommendations.append({
-            'url': row['url'],
-            'position': int(row['position_current']),
-            'clicks': int(row['clicks_current']),
-            'score': round(row['score'], 1)
-        })
-    
-    return recommendations
+                with col_structure:
+                    st.markdown("### Estructura H2 y H3")
+                    if not comp['h2_tags'] and not comp['h3_tags']:
+                        st.warning("No se detectaron H2 o H3.")
 
-def get_google_top_10(keyword, debug=False):
-    """Mejorado con User-Agent aleatorio"""
-    try:
-        headers = {
-            'User-Agent': get_random_user_agent()
-        }
-        
-        url = f"https://html.duckduckgo.com/html/?q={keyword.replace(' ', '+')}"
-        
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = []
-        
-        for result in soup.find_all('a', class_='result__url'):
-            href = result.get('href', '')
-            if href.startswith('http') and href not in results:
-                results.append(href)
-                if len(results) >= 10:
-                    break
-        
-        if len(results) >= 5:
-            return results[:10]
-            
-    except:
-        pass
-    
-    try:
-        headers = {
-            'User-Agent': get_random_user_agent(),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'es-ES,es;q=0.9,en-US,en;q=0.8',
-            'Referer': 'https://www.google.com/',
-            'DNT': '1',
-            'Cookie': 'CONSENT=YES+cb.20210720-07-p0.en+FX+417;'
-        }
-        
-        url = f"https://www.google.com/search?q={keyword.replace(' ', '+')}&num=15"
-        
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = []
-        
-        for selector in [
-            soup.find_all('div', class_='g'),
-            soup.find_all('div', class_='yuRUbf'),
-            soup.find_all('a', jsname='UWckNb')
-        ]:
-            for elem in selector:
-                link = elem.find('a', href=True) if elem.name == 'div' else elem
-                if link:
-                    href = link.get('href', '')
-                    
-                    if '/url?q=' in href:
-                        href = href.split('/url?q=')[1].split('&')[0]
-                    
-                    if (href.startswith('http') and 
-                        'google.com' not in href and 
-                        'youtube.com' not in href and
-                        href not in results):
-                        results.append(href)
-            
-            if len(results) >= 10:
-                break
-        
-        if len(results) >= 5:
-            return results[:10]
-            
-    except:
-        pass
-    
-    return []
+                    for h2 in comp['h2_tags']:
+                        st.markdown(f"**H2: {h2}**")
 
-def process_gsc_data(df):
-    df = df[~df.iloc[:, 0].astype(str).str.contains('Grand total|^total$', case=False, regex=True, na=False)]
-    df = df[df.iloc[:, 0].notna()]
-    
-    if len(df) == 0:
-        return None
-    
-    pos_cols = [col for col in df.columns if 'position' in col.lower()]
-    click_cols = [col for col in df.columns if 'click' in col.lower()]
-    imp_cols = [col for col in df.columns if 'impression' in col.lower()]
-    ctr_cols = [col for col in df.columns if 'ctr' in col.lower()]
-    
-    pos_cols = sorted(pos_cols, key=lambda x: 'previous' in x.lower())
-    click_cols = sorted(click_cols, key=lambda x: 'previous' in x.lower())
-    imp_cols = sorted(imp_cols, key=lambda x: 'previous' in x.lower())
-    ctr_cols = sorted(ctr_cols, key=lambda x: 'previous' in x.lower())
-    
-    if len(pos_cols) < 2 or len(click_cols) < 2:
-        return None
-    
-    df['url'] = df.iloc[:, 0]
-    df['position_current'] = df[pos_cols[0]].apply(clean_number)
-    df['position_previous'] = df[pos_cols[1]].apply(clean_number)
-    df['clicks_current'] = df[click_cols[0]].apply(clean_number)
-    df['clicks_previous'] = df[click_cols[1]].apply(clean_number)
-    df['impressions_current'] = df[imp_cols[0]].apply(clean_number) if imp_cols else 0
-    df['ctr_current'] = df[ctr_cols[0]].apply(clean_number) if ctr_cols else 0
-    
-    df = df[df['position_current'] > 0]
-    df = df[(df['position_current'] >= 5) & (df['position_current'] <= 20)]
-    
-    if len(df) == 0:
-        return None
-    
-    df = df[df['clicks_current'] > 0]
-    avg_clicks = df['clicks_current'].mean()
-    df = df[df['clicks_current'] >= (avg_clicks * 0.3)]
-    
-    if len(df) == 0:
-        return None
-    
-    df['position_change'] = df['position_current'] - df['position_previous']
-    df['clicks_change'] = ((df['clicks_current'] - df['clicks_previous']) / df['clicks_previous']) * 100
-    
-    df['position_score'] = (20 - df['position_current']) / 15 * 100
-    
-    if df['clicks_current'].max() > df['clicks_current'].min():
-        df['traffic_score'] = (df['clicks_current'] - df['clicks_current'].min()) / (df['clicks_current'].max() - df['clicks_current'].min()) * 100
+                    if comp['h3_tags']:
+                        st.markdown("---")
+                        st.caption("Subtemas (H3):")
+                        for h3 in comp['h3_tags']:
+                            st.markdown(f"- *{h3}*")
+            else:
+                st.error(f"No se pudo analizar esta URL: {comp.get('error', 'Error desconocido')}")
+
+    # Recomendaciones de headings faltantes
+    st.markdown("---")
+    st.subheader(TEXTS['heading_recommendations'])
+
+    if result['headings']:
+        st.markdown(result['headings'])
+    elif result['headings_error']:
+        error = result['headings_error']
+        if "invalid" in error.lower() or "unauthorized" in error.lower():
+            st.error(TEXTS['api_key_invalid'])
+        else:
+            st.error(f"Error: {error}")
     else:
-        df['traffic_score'] = 50
-    
-    df['trend_score'] = 50
-    df.loc[df['position_change'] > 0, 'trend_score'] -= df['position_change'] * 5
-    df.loc[df['clicks_change'] < 0, 'trend_score'] += df['clicks_change'] * 0.3
-    df.loc[df['position_change'] < 0, 'trend_score'] += abs(df['position_change']) * 3
-    df.loc[df['clicks_change'] > 0, 'trend_score'] += df['clicks_change'] * 0.2
-    df['trend_score'] = df['trend_score'].clip(0, 100)
-    
-    df['score'] = (df['position_score'] * 0.5) + (df['traffic_score'] * 0.3) + (df['trend_score'] * 0.2)
-    
-    df['fell_from_page1'] = (df['position_previous'] <= 10) & (df['position_current'] > 10)
-    df.loc[df['fell_from_page1'], 'score'] += 30
-    df.loc[df['position_change'] > 3, 'score'] += 15
-    df.loc[df['clicks_change'] < -20, 'score'] += 10
-    
-    df = df.sort_values('score', ascending=False)
-    
-    return df
+        st.warning(TEXTS['api_key_required'])
+
+    if st.button(TEXTS['new_comparativa']):
+        st.session_state['top_10_urls'] = None
+        st.session_state['keyword'] = None
+        clear_job('competitor_job')
+        st.rerun()
+
+with st.sidebar.expander(TEXTS['jobs']):
+    recent_jobs = jobs.queue().recent(5)
+    if not recent_jobs:
+        st.caption(TEXTS['no_jobs'])
+    for recent in recent_jobs:
+        st.caption(f"{recent['kind']} · {recent['status']} · {recent['done']}/{recent['total']}")
+        if recent['kind'] == 'competitors' and recent['id'] != st.session_state.competitor_job:
+            if st.button(TEXTS['job_attach'], key=f"attach_{recent['id']}"):
+                st.session_state.competitor_job = recent['id']
+                st.query_params['competitor_job'] = recent['id']
+                st.rerun()
 
 # UI
 st.title(TEXTS['title'])
 st.markdown(TEXTS['subtitle'])
 
 # Session state
+if 'gsc_clean' not in st.session_state:
+    st.session_state.gsc_clean = None
 if 'analysis_results' not in st.session_state:
     st.session_state.analysis_results = None
 if 'selected_url' not in st.session_state:
     st.session_state.selected_url = None
+if 'link_graph' not in st.session_state:
+    st.session_state.link_graph = None
+if 'cannibal' not in st.session_state:
+    st.session_state.cannibal = None
+if 'report' not in st.session_state:
+    # Lo analizado en la sesión, para la exportación
+    st.session_state.report = {'on_page': {}, 'assets': {}, 'insights': {}, 'competitors': {}}
+
+# Filas que se muestran del ranking; el resto no se ordena
+TOP_K = 1000
 
 gsc_file = st.file_uploader(TEXTS['upload'], type=['csv'])
 
 if gsc_file:
-    if st.session_state.analysis_results is None:
+    # Dependencias pesadas (pandas, bs4, requests, groq): solo cuando hay datos que procesar
+    import pandas as pd
+    from gsc import (DEFAULT_SCORING, RANKING_MODES, clean_gsc_data, rank_gsc_data, recommend_internal_links,
+                     add_link_metrics, add_content_age, insight_metrics)
+    from llm import get_groq_insight
+    from scraper import extract_domain, scrape_url_metadata, get_google_top_10
+    
+    # Pesos y umbrales del score: moverlos solo recalcula el ranking sobre las columnas ya limpias
+    with st.sidebar.expander(TEXTS['scoring']):
+        scoring = {'ranking_mode': st.radio(TEXTS['ranking_mode'], RANKING_MODES, horizontal=True,
+                                            format_func=lambda mode: TEXTS[f'ranking_mode_{mode}'])}
+        if scoring['ranking_mode'] == 'click_gain':
+            st.caption(TEXTS['click_gain_desc'])
+            scoring['gain_positions'] = st.slider(TEXTS['gain_positions'], 1, 10, DEFAULT_SCORING['gain_positions'])
+        else:
+            st.caption(TEXTS['scoring_desc'])
+            scoring['position_weight'] = st.slider(TEXTS['weight_position'], 0, 100,
+                                                   int(DEFAULT_SCORING['position_weight'] * 100), 5)
+            scoring['traffic_weight'] = st.slider(TEXTS['weight_traffic'], 0, 100,
+                                                  int(DEFAULT_SCORING['traffic_weight'] * 100), 5)
+            scoring['trend_weight'] = st.slider(TEXTS['weight_trend'], 0, 100, int(DEFAULT_SCORING['trend_weight'] * 100), 5)
+        scoring['position_min'], scoring['position_max'] = st.slider(
+            TEXTS['position_window'], 1, 100, (DEFAULT_SCORING['position_min'], DEFAULT_SCORING['position_max']))
+        if scoring['ranking_mode'] == 'score':
+            scoring['click_threshold'] = st.slider(TEXTS['click_threshold'], 0.0, 2.0, DEFAULT_SCORING['click_threshold'],
+                                                   0.05)
+            for bonus in ('bonus_fell_page1', 'bonus_position_loss', 'bonus_traffic_loss', 'bonus_orphan',
+                          'bonus_weak_links', 'bonus_stale'):
+                scoring[bonus] = st.slider(TEXTS[bonus], 0, 50, DEFAULT_SCORING[bonus])
+            scoring['stale_days'] = st.slider(TEXTS['stale_days'], 30, 1095, DEFAULT_SCORING['stale_days'], 30)
+    
+    if st.session_state.gsc_clean is None:
         if st.button(TEXTS['analyze_btn'], type="primary"):
             with st.spinner(TEXTS['analyzing']):
                 try:
-                    gsc_df = pd.read_csv(gsc_file, encoding='utf-8', on_bad_lines='skip')
-                    results = process_gsc_data(gsc_df)
+                    with perf.stage('csv_parse'):
+                        gsc_df = pd.read_csv(gsc_file, encoding='utf-8', on_bad_lines='skip')
+                    with perf.stage('clean_gsc_data'):
+                        gsc_clean = clean_gsc_data(gsc_df)
                     
-                    if results is None or len(results) == 0:
+                    if gsc_clean is None or len(gsc_clean) == 0:
                         st.error("❌ No opportunities found")
                     else:
-                        st.session_state.analysis_results = results
+                        st.session_state.gsc_clean = gsc_clean
                         st.rerun()
                         
                 except Exception as e:
                     st.error(f"❌ Error: {str(e)}")
     
-    if st.session_state.analysis_results is not None:
-        results = st.session_state.analysis_results
+    if st.session_state.gsc_clean is not None:
+        # Solo se recalcula si cambian los pesos o los datos (p. ej. tras el crawl)
+        scoring_key = (id(st.session_state.gsc_clean), tuple(sorted(scoring.items())))
+        if st.session_state.get('scoring_key') != scoring_key:
+            with perf.stage('rank_gsc_data'):
+                st.session_state.analysis_results, st.session_state.analysis_total = rank_gsc_data(
+                    st.session_state.gsc_clean, scoring, top_k=TOP_K)
+            st.session_state.scoring_key = scoring_key
         
-        st.success(f"✅ {len(results)} {TEXTS['success']}")
+        if st.session_state.analysis_results is None:
+            st.warning(TEXTS['no_results_scoring'])
+        else:
+            st.success(f"✅ {st.session_state.analysis_total} {TEXTS['success']}")
+            if st.session_state.analysis_total > len(st.session_state.analysis_results):
+                st.caption(TEXTS['top_k_shown'].format(k=len(st.session_state.analysis_results)))
         
         if st.button(TEXTS['new_analysis']):
+            st.session_state.gsc_clean = None
             st.session_state.analysis_results = None
+            st.session_state.scoring_key = None
             st.session_state.selected_url = None
+            st.session_state.link_graph = None
+            st.session_state.sitemap_applied = None
+            st.session_state.cannibal = None
+            st.session_state.report = {'on_page': {}, 'assets': {}, 'insights': {}, 'competitors': {}}
+            clear_job('crawl_job')
+            clear_job('sitemap_job')
+            clear_job('competitor_job')
+            clear_job('batch_job')
+            clear_job('insights_job')
             st.rerun()
+    
+    if st.session_state.gsc_clean is not None and st.session_state.analysis_results is not None:
+        results = st.session_state.analysis_results
+        
+        with st.expander(TEXTS['site_crawl']):
+            st.caption(TEXTS['site_crawl_desc'])
+            crawl_pages = st.number_input(TEXTS['crawl_max_pages'], min_value=10, max_value=100000, value=500, step=100)
+            
+            if st.button(TEXTS['crawl_btn']):
+                crawl_domain = extract_domain(results['url'].iloc[0])
+                start_job('crawl_job', 'crawl', {'domain': crawl_domain, 'seeds': results['url'].tolist(),
+                                                 'max_pages': int(crawl_pages)})
+                st.session_state.link_graph = None
+            
+            crawl_job = jobs.queue().get(st.session_state.crawl_job)
+            if crawl_job is not None:
+                if crawl_job['status'] in jobs.ACTIVE:
+                    job_progress(crawl_job['id'])
+                elif crawl_job['status'] == 'done' and st.session_state.link_graph is None:
+                    link_graph = jobs.queue().result(crawl_job['id'])
+                    st.session_state.link_graph = link_graph
+                    st.session_state.gsc_clean = add_link_metrics(st.session_state.gsc_clean, link_graph)
+                    st.rerun()
+                elif crawl_job['status'] != 'done':
+                    st.error(f"❌ {TEXTS['job_failed']} '{crawl_job['status']}' {crawl_job['error'] or ''}")
+            
+            if st.session_state.link_graph is not None:
+                st.write(TEXTS['crawl_summary'].format(**st.session_state.link_graph.summary()))
+                if not st.session_state.link_graph.complete:
+                    st.caption(TEXTS['crawl_partial'])
+        
+        with st.expander(TEXTS['sitemap']):
+            st.caption(TEXTS['sitemap_desc'])
+            sitemap_domain = extract_domain(results['url'].iloc[0])
+            
+            if st.button(TEXTS['sitemap_btn']):
+                start_job('sitemap_job', 'sitemap', {'domain': sitemap_domain})
+            
+            sitemap_job = jobs.queue().get(st.session_state.sitemap_job)
+            if sitemap_job is not None:
+                if sitemap_job['status'] in jobs.ACTIVE:
+                    job_progress(sitemap_job['id'])
+                elif sitemap_job['status'] == 'done' and st.session_state.get('sitemap_applied') != sitemap_job['id']:
+                    import sitemap
+                    lastmods = sitemap.lastmod_for(sitemap_domain, st.session_state.gsc_clean['url'])
+                    st.session_state.gsc_clean = add_content_age(st.session_state.gsc_clean, lastmods)
+                    st.session_state.sitemap_applied = sitemap_job['id']
+                    st.rerun()
+                elif sitemap_job['status'] == 'done':
+                    summary = jobs.queue().result(sitemap_job['id'])
+                    matched = int(st.session_state.gsc_clean['lastmod'].notna().sum())
+                    st.write(TEXTS['sitemap_summary'].format(matched=matched, **summary))
+                else:
+                    st.error(f"❌ {TEXTS['job_failed']} '{sitemap_job['status']}' {sitemap_job['error'] or ''}")
+        
+        with st.expander(TEXTS['cannibalization']):
+            st.caption(TEXTS['cannibal_desc'])
+            query_page_file = st.file_uploader(TEXTS['cannibal_upload'], type=['csv'], key='query_page_file')
+            
+            if query_page_file and st.button(TEXTS['cannibal_btn']):
+                from cannibalization import load_query_page, detect_cannibalization, add_cannibalization
+                with st.spinner(TEXTS['analyzing']):
+                    with perf.stage('csv_parse'):
+                        pairs = load_query_page(pd.read_csv(query_page_file, encoding='utf-8', on_bad_lines='skip'))
+                    if pairs is None:
+                        st.error(TEXTS['cannibal_bad_file'])
+                    else:
+                        with perf.stage('detect_cannibalization'):
+                            cannibal_pages, clusters = detect_cannibalization(pairs)
+                        st.session_state.cannibal = {'pages': cannibal_pages, 'clusters': clusters, 'pairs': len(pairs)}
+                        if cannibal_pages is not None:
+                            st.session_state.gsc_clean = add_cannibalization(st.session_state.gsc_clean, cannibal_pages)
+                            st.rerun()
+            
+            cannibal = st.session_state.cannibal
+            if cannibal is not None and cannibal['clusters'] is None:
+                st.write(TEXTS['cannibal_none'])
+            elif cannibal is not None:
+                clusters = cannibal['clusters']
+                st.write(TEXTS['cannibal_summary'].format(clusters=len(clusters), pages=len(cannibal['pages']),
+                                                          pairs=cannibal['pairs']))
+                st.dataframe(pd.DataFrame({
+                    '#': clusters['cluster'],
+                    'URLs': clusters['n_pages'],
+                    'Primary': clusters['primary'],
+                    'Impressions': clusters['impressions'].astype(int),
+                    'Clicks': clusters['clicks'].astype(int),
+                    TEXTS['cannibal_queries']: clusters['top_queries'].str.join(', ')
+                }), use_container_width=True, hide_index=True, height=300)
+        
+        with st.expander(TEXTS['batch']):
+            st.caption(TEXTS['batch_desc'])
+            pairs_text = st.text_area(TEXTS['batch_pairs'], placeholder="https://tusitio.com/post, keyword", key='batch_pairs')
+            
+            if st.button(TEXTS['batch_btn']):
+                from batch import parse_pairs
+                pairs = parse_pairs(pairs_text)
+                if pairs:
+                    start_job('batch_job', 'batch_competitors', {'pairs': pairs})
+                else:
+                    st.error(TEXTS['batch_no_pairs'])
+            
+            batch_job = jobs.queue().get(st.session_state.batch_job)
+            if batch_job is not None:
+                if batch_job['status'] in jobs.ACTIVE:
+                    job_progress(batch_job['id'])
+                elif batch_job['status'] == 'done':
+                    batch_result = jobs.queue().result(batch_job['id'])
+                    st.write(TEXTS['batch_summary'].format(**batch_result['stats']))
+                    comparisons = batch_result['comparisons']
+                    for comparison in comparisons:
+                        st.session_state.report['competitors'][(comparison['url'], comparison['keyword'])] = {
+                            'url': comparison['url'], 'keyword': comparison['keyword'],
+                            'competitors': comparison['competitors'], 'headings': None, 'gaps': comparison['gaps']}
+                    
+                    chosen = st.selectbox(TEXTS['batch_pick'], range(len(comparisons)),
+                                          format_func=lambda i: f"{comparisons[i]['keyword']} — {comparisons[i]['url'][:60]}")
+                    comparison = comparisons[chosen]
+                    if not comparison['serp']:
+                        st.warning(TEXTS['batch_no_serp'])
+                    elif comparison['own_rank']:
+                        st.caption(TEXTS['batch_own_rank'].format(rank=comparison['own_rank']))
+                    if comparison['rows']:
+                        st.dataframe(pd.DataFrame(comparison['rows']), use_container_width=True, hide_index=True)
+                    if comparison['gaps']:
+                        st.markdown(f"**{TEXTS['batch_gaps']}**")
+                        for heading, count in comparison['gaps']:
+                            st.write(f"- {heading} ({count}/{len(comparison['competitors'])})")
+                else:
+                    st.error(f"❌ {TEXTS['job_failed']} '{batch_job['status']}' {batch_job['error'] or ''}")
+        
+        with st.expander(TEXTS['bulk_insights']):
+            st.caption(TEXTS['bulk_insights_desc'])
+            bulk_api_key = st.session_state.get('groq_api_key', '')
+            bulk_n = st.number_input(TEXTS['bulk_insights_n'], min_value=1, max_value=len(results),
+                                     value=min(20, len(results)), key='bulk_insights_n')
+            
+            if not bulk_api_key:
+                st.warning(TEXTS['api_key_required'])
+            elif st.button(TEXTS['bulk_insights_btn']):
+                top = results.head(int(bulk_n))
+                start_job('insights_job', 'insights', {
+                    'metrics': {row['url']: insight_metrics(row) for _, row in top.iterrows()},
+                    'domain': extract_domain(top['url'].iloc[0]),
+                    'language': language
+                }, secrets={'groq_api_key': bulk_api_key})
+            
+            insights_job = jobs.queue().get(st.session_state.insights_job)
+            if insights_job is not None:
+                if insights_job['status'] in jobs.ACTIVE:
+                    job_progress(insights_job['id'])
+                elif insights_job['status'] == 'done':
+                    insights_result = jobs.queue().result(insights_job['id'])
+                    st.session_state.report['insights'].update(insights_result['insights'])
+                    if insights_result['stats']:
+                        st.write(TEXTS['bulk_insights_summary'].format(**insights_result['stats']))
+                        if insights_result['stats']['tokens_per_url'] is not None:
+                            st.caption(TEXTS['bulk_insights_tokens'].format(**insights_result['stats']))
+                    for url, insight in insights_result['insights'].items():
+                        st.markdown(f"**{url}**")
+                        st.info(insight)
+                    if insights_result['failed']:
+                        st.markdown(f"**{TEXTS['bulk_insights_failed']}**")
+                        for url, error in insights_result['failed'].items():
+                            st.write(f"- {url}: {error}")
+                else:
+                    st.error(f"❌ {TEXTS['job_failed']} '{insights_job['status']}' {insights_job['error'] or ''}")
         
         st.markdown("---")
         st.subheader(TEXTS['prioritized_urls'])
@@ -638,6 +536,22 @@ if gsc_file:
             'CTR (%)': results['ctr_current'].round(1)
         })
         
+        if 'click_gain' in results.columns:
+            display_df = display_df.drop(columns='Score')
+            display_df.insert(1, TEXTS['click_gain'], results['click_gain'].round(0).astype(int).values)
+            display_df['Pos. →'] = results['target_position'].round(1).values
+            display_df['CTR → (%)'] = results['target_ctr'].round(1).values
+        
+        if 'inlinks' in results.columns:
+            display_df['Inlinks'] = results['inlinks'].values
+            display_df['Authority'] = results['authority'].round(0).values
+        
+        if 'content_age_days' in results.columns and results['content_age_days'].notna().any():
+            display_df['Age (days)'] = results['content_age_days'].values
+        
+        if 'cannibal_cluster' in results.columns:
+            display_df['Cannibal'] = ['#%d' % c if c else '' for c in results['cannibal_cluster']]
+        
         st.dataframe(
             display_df,
             use_container_width=True,
@@ -645,6 +559,24 @@ if gsc_file:
             height=400
         )
         
+        with st.expander(TEXTS['export']):
+            st.caption(TEXTS['export_desc'])
+            from export import FORMATS, export_filename, export_report, report_tables
+            export_format = st.selectbox(TEXTS['export_format'], FORMATS, format_func=str.upper)
+            export_clean, export_report_data = st.session_state.gsc_clean, st.session_state.report
+            
+            def build_export(fmt=export_format, clean=export_clean, config=dict(scoring), report=export_report_data):
+                # Se ejecuta al pulsar, en otro hilo: el fichero se escribe por trozos en disco
+                import tempfile
+                out = tempfile.TemporaryFile()
+                export_report(report_tables(clean, config, report), fmt, out)
+                out.seek(0)
+                return out
+            
+            # report_tables es perezoso con el ranking: aquí solo se usan los nombres
+            file_name, mime = export_filename(report_tables(export_clean, None, export_report_data), export_format)
+            st.download_button(TEXTS['export_btn'], perf.bind(build_export), file_name=file_name, mime=mime)
+        
         st.info(TEXTS['select_url'])
         
         selected_index = st.number_input(
@@ -669,7 +601,13 @@ if gsc_file:
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("Score", f"{selected['score']:.1f}/100")
+                if 'click_gain' in selected.index:
+                    st.metric(TEXTS['click_gain'], f"+{selected['click_gain']:,.0f}", help=TEXTS['click_gain_help'].format(
+                        current=selected['position_current'], target=selected['target_position'],
+                        ctr_now=selected['expected_ctr'], ctr_target=selected['target_ctr'],
+                        impressions=int(selected['impressions_current'])))
+                else:
+                    st.metric("Score", f"{selected['score']:.1f}/100")
             
             with col2:
                 pos_change = int(selected['position_change'])
@@ -702,14 +640,28 @@ if gsc_file:
             
             st.markdown(f"**URL:** `{selected['url']}`")
             
+            if 'cannibal_cluster' in selected.index and selected['cannibal_cluster'] > 0:
+                cluster = st.session_state.cannibal['clusters'].set_index('cluster').loc[selected['cannibal_cluster']]
+                st.warning(TEXTS['cannibal_warning'].format(n=int(selected['cannibal_competitors']),
+                                                            cluster=int(selected['cannibal_cluster'])))
+                for url in cluster['pages']:
+                    if url != selected['url']:
+                        st.write(f"- `{url}`")
+                if cluster['top_queries']:
+                    st.caption(f"{TEXTS['cannibal_queries']}: {', '.join(cluster['top_queries'])}")
+            
             with st.spinner(f"{TEXTS['analyzing']}..."):
                 target_domain = extract_domain(selected['url'])
                 metadata = scrape_url_metadata(selected['url'], target_domain)
             
             if metadata['success']:
+                st.session_state.report['on_page'][selected['url']] = metadata.to_dict()
                 st.markdown("---")
                 st.subheader(TEXTS['on_page'])
                 
+                if metadata.get('truncated'):
+                    st.caption(TEXTS['page_truncated'])
+                
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
@@ -731,6 +683,34 @@ if gsc_file:
                     st.metric("FAQs", metadata['faqs_count'])
                     st.metric("Enlaces Internos", metadata['internal_links'])
                 
+                # Peso de la página: opcional, son decenas de peticiones por URL
+                audit = st.session_state.get('asset_audit')
+                if audit is None or audit['url'] != metadata['url']:
+                    if st.button(TEXTS['asset_audit_btn']):
+                        from assets import audit_page
+                        with st.spinner(TEXTS['asset_audit_running']):
+                            st.session_state.asset_audit = audit = audit_page(metadata['url'])
+                        st.session_state.report['assets'][selected['url']] = audit
+                    else:
+                        audit = None
+                
+                if audit is not None:
+                    st.markdown(f"**{TEXTS['asset_audit']}**")
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric(TEXTS['page_weight'], f"{audit['total_bytes'] / 1024 / 1024:.2f} MB")
+                    col2.metric("Assets", audit['assets'])
+                    col3.metric("HTML", f"{audit['html_bytes'] / 1024:.0f} KB")
+                    st.caption(" · ".join(f"{kind}: {size / 1024:.0f} KB" for kind, size in audit['by_kind'].items()))
+                    if audit['unknown']:
+                        st.caption(TEXTS['asset_unknown'].format(unknown=audit['unknown'], timed_out=audit['timed_out']))
+                    if audit['heaviest']:
+                        st.dataframe(pd.DataFrame({
+                            'URL': [a['url'] for a in audit['heaviest']],
+                            'Type': [a['kind'] for a in audit['heaviest']],
+                            'Format': [a['format'] for a in audit['heaviest']],
+                            'KB': [round(a['bytes'] / 1024, 1) for a in audit['heaviest']]
+                        }), use_container_width=True, hide_index=True)
+                
                 st.markdown("---")
                 st.subheader(TEXTS['ai_recommendations'])
                 
@@ -740,29 +720,35 @@ if gsc_file:
                     st.warning(TEXTS['api_key_required'])
                 else:
                     with st.spinner(TEXTS['generating']):
-                        metrics = {
-                            'position': int(selected['position_current']),
-                            'position_change': f"{int(selected['position_change']):+d}",
-                            'clicks': int(selected['clicks_current']),
-                            'clicks_change': selected['clicks_change'],
-                            'impressions': int(selected['impressions_current']),
-                            'ctr': selected['ctr_current']
-                        }
-                        insight = get_groq_insight(selected['url'], metrics, metadata, language, user_api_key)
+                        insight = get_groq_insight(selected['url'], insight_metrics(selected), metadata, language,
+                                                   user_api_key)
+                    st.session_state.report['insights'][selected['url']] = insight
                     
                     st.info(insight)
                 
                 st.markdown("---")
                 st.subheader(TEXTS['internal_links'])
                 
-                internal_link_recs = recommend_internal_links(selected['url'], results, n=3)
+                link_graph = st.session_state.link_graph
+                internal_link_recs = recommend_internal_links(selected['url'], results, n=3, link_graph=link_graph)
                 
                 if internal_link_recs:
                     st.write(f"**{TEXTS['current']}:** {TEXTS['your_page_has']} {metadata['internal_links']} {TEXTS['internal_links_text']}")
                     st.write(f"**{TEXTS['suggestion']}:** {TEXTS['add_links_to']}")
                     
                     for idx, rec in enumerate(internal_link_recs, 1):
-                        st.write(f"{idx}. `{rec['url']}` (Posición: #{rec['position']}, Score: {rec['score']}/100)")
+                        score_text = (f"{TEXTS['click_gain']}: +{rec['score']:.0f}" if 'click_gain' in results.columns
+                                      else f"Score: {rec['score']}/100")
+                        st.write(f"{idx}. `{rec['url']}` (Posición: #{rec['position']}, {score_text})")
+                
+                if link_graph is not None:
+                    link_sources = link_graph.missing_sources(selected['url'], n=3)
+                    if 'inlinks' in selected.index and selected['inlinks'] >= 0:
+                        st.write(f"**{TEXTS['inlinks']}:** {int(selected['inlinks'])}")
+                    if link_sources:
+                        st.write(f"**{TEXTS['suggestion']}:** {TEXTS['link_sources']}")
+                        for idx, source in enumerate(link_sources, 1):
+                            st.write(f"{idx}. `{source['url']}` (Authority: {source['authority']})")
                 
                 st.markdown("---")
                 st.subheader(TEXTS['comparativa'])
@@ -829,221 +815,30 @@ if gsc_file:
                             else:
                                 st.error(f"❌ {TEXTS['need_3_urls']}")
                 
-                # ANÁLISIS PARALELO DE COMPETIDORES
+                # ANÁLISIS DE COMPETIDORES EN SEGUNDO PLANO: descargas, parseo y LLM fuera del hilo del script
                 if st.session_state.get('start_analysis'):
                     top_10_urls = st.session_state.get('top_10_urls', [])
                     keyword = st.session_state.get('keyword', '')
                     
                     if top_10_urls and keyword:
-                        st.markdown("---")
-                        st.info(f"{TEXTS['analyzing_urls']} {len(top_10_urls)} {TEXTS['for_keyword']} **{keyword}**")
-                        
-                        # Barra de progreso
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-                        
-                        competitors_metadata = []
-                        
-                        # EJECUCIÓN PARALELA
-                        def fetch_url(url):
-                            return scrape_url_metadata(url)
-                        
-                        with ThreadPoolExecutor(max_workers=5) as executor:
-                            future_to_url = {executor.submit(fetch_url, url): url for url in top_10_urls[:10]}
-                            
-                            completed_count = 0
-                            for future in as_completed(future_to_url):
-                                data = future.result()
-                                competitors_metadata.append(data)
-                                
-                                completed_count += 1
-                                progress = completed_count / len(top_10_urls[:10])
-                                progress_bar.progress(progress)
-                                status_text.text(f"Analizando: {data['url'][:40]}... ({completed_count}/{len(top_10_urls[:10])})")
-                        
-                        status_text.empty()
-                        progress_bar.empty()
-                        
-                        # Reordenar para mantener orden original
-                        competitors_metadata.sort(key=lambda x: top_10_urls.index(x['url']) if x['url'] in top_10_urls else 999)
-                        
-                        # Tabla comparativa
-                        comparison_data = []
-                        
-                        comparison_data.append({
-                            'Posición': f"#{int(selected['position_current'])} (TU URL)",
-                            'Title': metadata['title'],
-                            'H1': metadata['h1_count'],
-                            'H2': metadata['h2_count'],
-                            'H3': metadata['h3_count'],
-                            'Words': metadata['word_count']
-                        })
-                        
-                        for idx, meta in enumerate(competitors_metadata):
-                            if meta['success']:
-                                comparison_data.append({
-                                    'Posición': f"#{idx+1}",
-                                    'Title': meta['title'],
-                                    'H1': meta['h1_count'],
-                                    'H2': meta['h2_count'],
-                                    'H3': meta['h3_count'],
-                                    'Words': meta['word_count']
-                                })
-                        
-                        comparison_df = pd.DataFrame(comparison_data)
-                        st.dataframe(comparison_df, use_container_width=True, hide_index=True)
-                        
-                        # VISUALIZADOR DE ESTRUCTURA DE HEADINGS
-                        st.markdown("---")
-                        st.subheader(TEXTS['heading_structure'])
-                        st.markdown(TEXTS['heading_structure_desc'])
-                        
-                        tabs = st.tabs([f"#{i+1}" for i in range(len(competitors_metadata))])
-                        
-                        for i, tab in enumerate(tabs):
-                            with tab:
-                                comp = competitors_metadata[i]
-                                if comp['success']:
-                                    st.markdown(f"**URL:** [{comp['url']}]({comp['url']})")
-                                    st.markdown(f"**Title:** {comp['title']}")
-                                    
-                                    col_h1, col_structure = st.columns([1, 3])
-                                    
-                                    with col_h1:
-                                        st.info(f"**Word Count:** {comp['word_count']}")
-                                        st.markdown("### H1")
-                                        if comp['h1_tags']:
-                                            for h1 in comp['h1_tags']:
-                                                st.write(f"• {h1}")
-                                        else:
-                                            st.warning("No H1 found")
-                                    
-                                    with col_structure:
-                                        st.markdown("### Estructura H2 y H3")
-                                        if not comp['h2_tags'] and not comp['h3_tags']:
-                                            st.warning("No se detectaron H2 o H3.")
-                                        
-                                        for h2 in comp['h2_tags']:
-                                            st.markdown(f"**H2: {h2}**")
-                                        
-                                        if comp['h3_tags']:
-                                            st.markdown("---")
-                                            st.caption("Subtemas (H3):")
-                                            for h3 in comp['h3_tags']:
-                                                st.markdown(f"- *{h3}*")
-                                else:
-                                    st.error(f"No se pudo analizar esta URL: {comp.get('error', 'Error desconocido')}")
-                        
-                        # Recomendaciones de headings faltantes
-                        st.markdown("---")
-                        st.subheader(TEXTS['heading_recommendations'])
-                        
-                        user_api_key = st.session_state.get('groq_api_key', '')
-                        
-                        if not user_api_key:
-                            st.warning(TEXTS['api_key_required'])
-                        else:
-                            with st.spinner(TEXTS['generating_headings']):
-                                all_competitor_h2 = []
-                                for meta in competitors_metadata:
-                                    if meta['success'] and meta.get('h2_tags'):
-                                        all_competitor_h2.extend(meta['h2_tags'])
-                                
-                                current_h2 = set([h.lower() for h in metadata['h2_tags']])
-                                
-                                missing_h2_candidates = []
-                                for h2 in all_competitor_h2:
-                                    h2_lower = h2.lower()
-                                    if h2_lower not in current_h2:
-                                        if h2 not in missing_h2_candidates:
-                                            missing_h2_candidates.append(h2)
-                                
-                                if language == "Español":
-                                    heading_prompt = f"""Eres un experto SEO. Analiza los headings FALTANTES en esta página comparando con la competencia.
-
-**Keyword objetivo:** {keyword}
-
-**H2 ACTUALES en la página (YA EXISTEN, NO recomendar):**
-{', '.join(metadata['h2_tags']) if metadata['h2_tags'] else 'Ninguno'}
-
-**H2 que tienen los COMPETIDORES pero TÚ NO TIENES:**
-{', '.join(missing_h2_candidates[:15]) if missing_h2_candidates else 'Los competidores no tienen H2 adicionales relevantes'}
-
-**INSTRUCCIÓN CRÍTICA:** 
-Solo recomienda H2 que:
-1. Los competidores SÍ tienen
-2. Tú NO tienes actualmente
-3. Son relevantes para la keyword "{keyword}"
-
-**NO recomiendes H2 que ya existen en la lista de "H2 ACTUALES".**
-
-Genera:
-**H2 FALTANTES recomendados (5-8 máximo):**
-1. [H2 que tienen competidores pero tú no]
-2. [H2 que tienen competidores pero tú no]
-...
-
-**Justificación:**
-Explica brevemente por qué estos H2 son importantes para cubrir la intención de búsqueda."""
-                                else:
-                                    heading_prompt = f"""You are an SEO expert. Analyze the MISSING headings on this page compared to competitors.
-
-**Target keyword:** {keyword}
-
-**CURRENT H2s on the page (ALREADY EXIST, DO NOT recommend):**
-{', '.join(metadata['h2_tags']) if metadata['h2_tags'] else 'None'}
-
-**H2s that COMPETITORS have but YOU DON'T:**
-{', '.join(missing_h2_candidates[:15]) if missing_h2_candidates else 'Competitors do not have additional relevant H2s'}
-
-**CRITICAL INSTRUCTION:** 
-Only recommend H2s that:
-1. Competitors DO have
-2. You DON'T currently have
-3. Are relevant to the keyword "{keyword}"
-
-**DO NOT recommend H2s that already exist in the "CURRENT H2s" list.**
-
-Generate:
-**MISSING H2s recommended (5-8 maximum):**
-1. [H2 competitors have but you don't]
-2. [H2 competitors have but you don't]
-...
-
-**Justification:**
-Briefly explain why these H2s are important to cover search intent."""
-
-                                try:
-                                    client = Groq(api_key=user_api_key)
-                                    
-                                    chat_completion = client.chat.completions.create(
-                                        messages=[{"role": "user", "content": heading_prompt}],
-                                        model="llama-3.3-70b-versatile",
-                                        temperature=0.4,
-                                        max_tokens=800
-                                    )
-                                    
-                                    heading_recommendations = chat_completion.choices[0].message.content
-                                    st.markdown(heading_recommendations)
-                                    
-                                except Exception as e:
-                                    if "invalid" in str(e).lower() or "unauthorized" in str(e).lower():
-                                        st.error(TEXTS['api_key_invalid'])
-                                    else:
-                                        st.error(f"Error: {str(e)}")
-                        
-                        st.session_state['start_analysis'] = False
-                        
-                        if st.button(TEXTS['new_comparativa']):
-                            st.session_state['top_10_urls'] = None
-                            st.session_state['keyword'] = None
-                            st.rerun()
+                        start_job('competitor_job', 'competitors', {
+                            'urls': top_10_urls[:10],
+                            'keyword': keyword,
+                            'language': language,
+                            'own': {'url': selected['url'], 'position': int(selected['position_current']), 'metadata': metadata.to_dict()}
+                        }, secrets={'groq_api_key': st.session_state.get('groq_api_key', '')})
+                    
+                    st.session_state['start_analysis'] = False
+                
+                if st.session_state.competitor_job:
+                    render_competitor_job(st.session_state.competitor_job)
             else:
                 st.warning("⚠️ Could not analyze the page")
             
             st.markdown("---")
             if st.button(TEXTS['back_to_list']):
                 st.session_state.selected_url = None
+                clear_job('competitor_job')
                 st.rerun()
         
         with st.expander(f"ℹ️ {TEXTS['priority_calculation']}"):
@@ -1058,6 +853,8 @@ Briefly explain why these H2s are important to cover search intent."""
                 - 🚨 **+30 puntos**: Si cayó de página 1 (posiciones 1-10) a página 2 (11-20)
                 - ⚠️ **+15 puntos**: Si perdió más de 3 posiciones
                 - 📊 **+10 puntos**: Si perdió más del 20% de tráfico
+                - 🕸️ **+10 / +5 puntos**: Si el crawl del sitio la encuentra huérfana (0 enlaces internos) o con 1-2 enlaces
+                - 🗓️ **+10 puntos**: Si el `lastmod` del sitemap tiene más de un año
                 
                 **Indicadores de posición:**
                 - 🟢 Verde "Mejoró X pos": La posición BAJÓ en número (ej: de 12 a 8) = MEJOR ranking
@@ -1077,6 +874,8 @@ Briefly explain why these H2s are important to cover search intent."""
                 - 🚨 **+30 points**: If dropped from page 1 (positions 1-10) to page 2 (11-20)
                 - ⚠️ **+15 points**: If lost more than 3 positions
                 - 📊 **+10 points**: If lost more than 20% traffic
+                - 🕸️ **+10 / +5 points**: If the site crawl finds it orphaned (0 internal links) or with 1-2 links
+                - 🗓️ **+10 points**: If the sitemap `lastmod` is more than a year old
                 
                 **Position indicators:**
                 - 🟢 Green "Improved X pos": Position number DECREASED (ex: from 12 to 8) = BETTER ranking
@@ -1087,6 +886,10 @@ Briefly explain why these H2s are important to cover search intent."""
                 """)
                 
 else:
+    if st.session_state.competitor_job:
+        st.caption(TEXTS['job_reattached'])
+        render_competitor_job(st.session_state.competitor_job)
+    
     st.info(f"👆 {TEXTS['upload_csv']}")
     
     with st.expander(f"📖 {TEXTS['tutorial']}", expanded=True):
@@ -1194,3 +997,45 @@ else:
             
             If you have questions, search on YouTube: **"How to export GSC pages data"**
             """)
+
+# Panel de rendimiento (al final para incluir las métricas de esta ejecución)
+perf.end_run(st.session_state)
+
+if show_perf:
+    import pandas as pd
+    import fetchpool
+    import hosts
+    
+    with st.sidebar.expander(TEXTS['perf_title'], expanded=True):
+        perf_summary = perf_recorder.summary()
+        if not perf_summary['stages']:
+            st.caption(TEXTS['perf_empty'])
+        else:
+            st.caption(TEXTS['perf_stages'])
+            st.dataframe(pd.DataFrame(perf_summary['stages']), hide_index=True, use_container_width=True)
+            if perf_summary['hosts']:
+                st.caption(TEXTS['perf_hosts'])
+                st.dataframe(pd.DataFrame(perf_summary['hosts']), hide_index=True, use_container_width=True)
+                st.caption(TEXTS['perf_calls'])
+                st.dataframe(
+                    pd.DataFrame(perf_summary['calls'][-20:])[['kind', 'host', 'seconds', 'bytes', 'status']],
+                    hide_index=True, use_container_width=True
+                )
+        host_state = hosts.registry().snapshot()
+        if host_state:
+            st.caption(TEXTS['perf_host_state'])
+            st.dataframe(pd.DataFrame(host_state), hide_index=True, use_container_width=True)
+        fetch_owners = fetchpool.pool().snapshot()
+        if fetch_owners:
+            st.caption(TEXTS['perf_fetch_pool'].format(**fetchpool.pool().stats()))
+            own_session = session_owner()
+            for row in fetch_owners:
+                row['owner'] = '⭐ ' + row['owner'] if row['owner'] == own_session else row['owner']
+            st.dataframe(pd.DataFrame(fetch_owners), hide_index=True, use_container_width=True)
+        if perf_summary['profile']:
+            st.caption(TEXTS['perf_profile'])
+            st.code(perf_summary['profile'], language=None)
+        st.download_button(TEXTS['perf_export'], perf_recorder.to_json(), file_name="perf.json", mime="application/json")
+        if st.button(TEXTS['perf_reset']):
+            perf_recorder.reset()
+            st.rerun()
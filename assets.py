@@ -0,0 +1,351 @@
+"""Auditoría del peso de página: imágenes, scripts y hojas de estilo
+
+Resuelve las URLs de los assets del HTML y pide su tamaño con HEAD (o GET con
+Range: bytes=0-0 si el servidor no responde al HEAD o no da Content-Length).
+Las sondas van al pool de descargas (fetchpool) a nombre del propietario de la
+auditoría. El límite de sondas simultáneas por host se aplica antes de
+encolarlas, así que un CDN lento no ocupa hilos del pool esperando turno. Cada
+página tiene un presupuesto de tiempo: lo que no responde a tiempo se cuenta
+como desconocido en lugar de bloquear la auditoría.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+import fetchpool
+import perf
+from scraper import timed_get, get_random_user_agent, fetch_page
+
+HOST_CONCURRENCY = int(os.environ.get('CRP_ASSET_HOST_CONCURRENCY', 4))
+ASSET_BUDGET = float(os.environ.get('CRP_ASSET_BUDGET', 8))
+ASSET_TIMEOUT = 4
+# Con sondas retenidas por el límite de un host, cada cuánto se reintenta encolarlas
+HOST_RETRY = 0.05
+MAX_ASSETS = 300
+# Sin Content-Length ni Content-Range se cuentan los bytes descargados hasta este límite
+MAX_COUNTED_BYTES = 10 * 1024 * 1024
+HEAVIEST = 10
+
+# Etiquetas y atributos con assets; los regex evitan un segundo parseo completo del HTML
+TAG_RE = re.compile(r'<(img|script|link|source)\b([^>]*)>', re.I)
+ATTR_RE = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+CONTENT_RANGE_RE = re.compile(r'/(\d+)\s*$')
+
+FORMATS_BY_EXTENSION = {
+    'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png', 'gif': 'gif', 'webp': 'webp', 'avif': 'avif', 'svg': 'svg',
+    'ico': 'ico', 'js': 'js', 'mjs': 'js', 'css': 'css',
+}
+FORMATS_BY_TYPE = {
+    'image/jpeg': 'jpeg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp', 'image/avif': 'avif',
+    'image/svg+xml': 'svg', 'image/x-icon': 'ico', 'image/vnd.microsoft.icon': 'ico', 'text/css': 'css',
+    'application/javascript': 'js', 'text/javascript': 'js', 'application/x-javascript': 'js',
+}
+
+# Sondas en curso o en cola por host, de todas las auditorías (solo hosts con alguna)
+_host_probes = {}
+_host_lock = threading.Lock()
+
+
+def _attrs(text):
+    return {m.group(1).lower(): m.group(2) or m.group(3) or m.group(4) or '' for m in ATTR_RE.finditer(text)}
+
+
+def _srcset_first(srcset):
+    return srcset.split(',')[0].strip().split(' ')[0] if srcset else ''
+
+
+def extract_assets(html, base_url):
+    """[(url absoluta, tipo)] sin duplicados ni data: URIs, en orden de aparición"""
+    found = {}
+    for match in TAG_RE.finditer(html):
+        tag, attrs = match.group(1).lower(), _attrs(match.group(2))
+        if tag == 'img':
+            src, kind = attrs.get('src') or attrs.get('data-src') or _srcset_first(attrs.get('srcset')), 'image'
+        elif tag == 'source':
+            src, kind = _srcset_first(attrs.get('srcset')) or attrs.get('src'), 'image'
+        elif tag == 'script':
+            src, kind = attrs.get('src'), 'script'
+        else:
+            rel = attrs.get('rel', '').lower()
+            if 'stylesheet' in rel:
+                kind = 'stylesheet'
+            elif 'icon' in rel:
+                kind = 'image'
+            elif 'preload' in rel and attrs.get('as') in ('script', 'style', 'image', 'font'):
+                kind = {'style': 'stylesheet', 'script': 'script', 'image': 'image'}.get(attrs['as'], 'font')
+            else:
+                continue
+            src = attrs.get('href')
+        if not src or src.startswith(('data:', 'javascript:', '#')):
+            continue
+        url = urljoin(base_url, src.strip())
+        if url.startswith('http') and url not in found:
+            found[url] = kind
+            if len(found) >= MAX_ASSETS:
+                break
+    return list(found.items())
+
+
+def _acquire_host(host):
+    """Reserva un hueco del host sin bloquear; False si ya tiene HOST_CONCURRENCY sondas"""
+    with _host_lock:
+        if _host_probes.get(host, 0) >= HOST_CONCURRENCY:
+            return False
+        _host_probes[host] = _host_probes.get(host, 0) + 1
+        return True
+
+
+def _release_host(host):
+    with _host_lock:
+        if _host_probes.get(host, 0) <= 1:
+            _host_probes.pop(host, None)
+        else:
+            _host_probes[host] -= 1
+
+
+def _asset_format(url, content_type):
+    fmt = FORMATS_BY_TYPE.get((content_type or '').split(';')[0].strip().lower())
+    if fmt:
+        return fmt
+    extension = urlsplit(url).path.rsplit('.', 1)[-1].lower()
+    return FORMATS_BY_EXTENSION.get(extension, extension if 0 < len(extension) <= 5 else 'unknown')
+
+
+def _declared_size(response):
+    match = CONTENT_RANGE_RE.search(response.headers.get('Content-Range', ''))
+    if match:
+        return int(match.group(1))
+    length = response.headers.get('Content-Length')
+    # Con 206 el Content-Length es el del rango, no el del fichero
+    if length and length.isdigit() and response.status_code == 200:
+        return int(length)
+    return None
+
+
+def _ranged_get(url, deadline=None, **kwargs):
+    """GET de un solo byte; si el servidor ignora el Range y no da tamaño, cuenta los bytes del cuerpo"""
+    response = requests.get(url, stream=True, **kwargs)
+    try:
+        if response.ok and _declared_size(response) is None:
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size >= MAX_COUNTED_BYTES or (deadline and time.monotonic() > deadline):
+                    break
+            response.streamed_bytes = size
+    finally:
+        response.close()
+    response._content = b''
+    response._content_consumed = True
+    return response
+
+
+def probe_asset(url, kind, deadline):
+    """Tamaño y formato de un asset. Devuelve un dict con bytes=None si no se pudo saber"""
+    result = {'url': url, 'kind': kind, 'format': _asset_format(url, None), 'bytes': None, 'method': None,
+              'status': None, 'error': None}
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        result['error'] = 'budget'
+        return result
+    headers = {'User-Agent': get_random_user_agent()}
+    timeout = min(ASSET_TIMEOUT, remaining)
+    try:
+        # Estado por host propio: los HEAD rápidos o rechazados no tocan el timeout ni el circuito de las páginas
+        response = timed_get('asset', url, live_get=requests.head, method='HEAD', hedge=False, host_scope='asset',
+                             headers=headers, timeout=timeout, allow_redirects=True)
+        size = _declared_size(response) if response.ok else None
+        result['method'] = 'HEAD'
+        if size is None and response.status_code not in (404, 410):
+            # 405/403 al HEAD o sin Content-Length (chunked): GET con rango
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                result['error'] = 'budget'
+                return result
+            response = timed_get('asset', url, live_get=_ranged_get, method='RANGE', hedge=False,
+                                 host_scope='asset', headers=dict(headers, Range='bytes=0-0'),
+                                 timeout=min(ASSET_TIMEOUT, remaining), allow_redirects=True, deadline=deadline)
+            size = _declared_size(response) if response.ok else None
+            if size is None and response.ok:
+                size = getattr(response, 'streamed_bytes', None)
+            result['method'] = 'GET'
+        result['status'] = response.status_code
+        result['bytes'] = size
+        result['format'] = _asset_format(url, response.headers.get('Content-Type'))
+        if not response.ok:
+            result['error'] = f"HTTP {response.status_code}"
+    except Exception as e:
+        result['error'] = type(e).__name__
+    return result
+
+
+def _probe(host, url, kind, deadline):
+    # El hueco se libera antes de publicar el resultado: quien espera el future ya puede reutilizarlo
+    try:
+        return probe_asset(url, kind, deadline)
+    finally:
+        _release_host(host)
+
+
+class _Probes:
+    """Sondas de assets de una o varias páginas en el pool de descargas
+
+    Cada página lleva su cola de assets y su plazo. poll() recoge lo terminado,
+    encola lo que permiten los límites por host y devuelve las páginas acabadas
+    (todo sondeado o plazo vencido).
+    """
+
+    def __init__(self):
+        self.executor = fetchpool.pool()
+        # Por número de página: dos URLs pueden redirigir a la misma
+        self.pages = {}
+        self.in_flight = {}
+        self._added = 0
+
+    def __len__(self):
+        return len(self.pages)
+
+    def add(self, url, html, html_bytes, budget):
+        assets = extract_assets(html, url)
+        self._added += 1
+        self.pages[self._added] = {'url': url, 'html_bytes': html_bytes, 'assets': len(assets), 'pending': deque(assets),
+                           'running': set(), 'probed': [], 'deadline': time.monotonic() + budget}
+
+    def _submit(self, key, page):
+        blocked = deque()
+        while page['pending']:
+            asset_url, kind = page['pending'].popleft()
+            host = urlsplit(asset_url).netloc.lower()
+            if not _acquire_host(host):
+                blocked.append((asset_url, kind))
+                continue
+            future = self.executor.submit(perf.bind(_probe), host, asset_url, kind, page['deadline'])
+            # Una sonda cancelada en cola no llega a ejecutarse ni a liberar su hueco
+            future.add_done_callback(lambda f, host=host: f.cancelled() and _release_host(host))
+            self.in_flight[future] = key
+            page['running'].add(future)
+        page['pending'] = blocked
+
+    def poll(self):
+        for future in [f for f in self.in_flight if f.done()]:
+            page = self.pages[self.in_flight.pop(future)]
+            page['running'].discard(future)
+            if not future.cancelled():
+                page['probed'].append(future.result())
+        finished = []
+        now = time.monotonic()
+        for key, page in list(self.pages.items()):
+            if now < page['deadline']:
+                self._submit(key, page)
+            if (not page['pending'] and not page['running']) or now >= page['deadline']:
+                self._drop(page)
+                del self.pages[key]
+                finished.append((page['url'], self._report(page)))
+        return finished
+
+    def timeout(self):
+        """Espera máxima hasta el siguiente poll(): el plazo más cercano, o HOST_RETRY si hay sondas retenidas"""
+        timeout = min(page['deadline'] for page in self.pages.values()) - time.monotonic()
+        if any(page['pending'] for page in self.pages.values()):
+            timeout = min(timeout, HOST_RETRY)
+        return max(0, timeout)
+
+    def _drop(self, page):
+        fetchpool.cancel(page['running'])
+        for future in page['running']:
+            self.in_flight.pop(future, None)
+
+    def cancel(self):
+        for page in self.pages.values():
+            self._drop(page)
+        self.pages.clear()
+
+    @staticmethod
+    def _report(page):
+        probed = page['probed']
+        sized = [a for a in probed if a['bytes'] is not None]
+        by_kind, by_format = {}, {}
+        for asset in sized:
+            by_kind[asset['kind']] = by_kind.get(asset['kind'], 0) + asset['bytes']
+            by_format[asset['format']] = by_format.get(asset['format'], 0) + asset['bytes']
+
+        return {
+            'url': page['url'],
+            'html_bytes': page['html_bytes'],
+            'assets': page['assets'],
+            'sized': len(sized),
+            'unknown': page['assets'] - len(sized),
+            'timed_out': page['assets'] - len(probed) + sum(1 for a in probed if a['error'] == 'budget'),
+            'total_bytes': page['html_bytes'] + sum(a['bytes'] for a in sized),
+            'by_kind': by_kind,
+            'by_format': by_format,
+            'heaviest': sorted(sized, key=lambda a: a['bytes'], reverse=True)[:HEAVIEST],
+            'failed': [a for a in probed if a['bytes'] is None],
+        }
+
+
+def audit_page(url, html=None, budget=None, html_bytes=None):
+    """Peso total de la página y assets más pesados, en como mucho `budget` segundos de sondas
+
+    Sin `html` se descarga la página. Los assets que no responden a tiempo
+    cuentan en `unknown` y no suman al total.
+    """
+    budget = ASSET_BUDGET if budget is None else budget
+    if html is None:
+        url, html, info = fetch_page(url)
+        html_bytes = info['bytes']
+    html_bytes = len(html.encode('utf-8')) if html_bytes is None else html_bytes
+
+    probes = _Probes()
+    probes.add(url, html, html_bytes, budget)
+    with perf.stage('asset_audit'):
+        try:
+            while True:
+                finished = probes.poll()
+                if finished:
+                    return finished[0][1]
+                wait(list(probes.in_flight), timeout=probes.timeout(), return_when=FIRST_COMPLETED)
+        finally:
+            probes.cancel()
+
+
+def audit_pages(urls, workers=4, budget=None):
+    """Auditorías de varias páginas a la vez; genera (url, informe o excepción) en orden de finalización
+
+    Hasta `workers` páginas en curso (descargándose o con sondas). Las descargas y
+    las sondas van al pool compartido y respetan los límites por host, así que el
+    lote escala sin saturar a un mismo servidor ni crear hilos propios.
+    """
+    budget = ASSET_BUDGET if budget is None else budget
+    executor = fetchpool.pool()
+    queued = deque(urls)
+    fetching = {}
+    probes = _Probes()
+    with perf.stage('asset_audit'):
+        try:
+            while queued or fetching or probes:
+                while queued and len(fetching) + len(probes) < workers:
+                    url = queued.popleft()
+                    fetching[executor.submit(perf.bind(fetch_page), url)] = url
+                for future in [f for f in fetching if f.done()]:
+                    url = fetching.pop(future)
+                    try:
+                        final_url, html, info = future.result()
+                    except Exception as e:
+                        yield url, e
+                        continue
+                    probes.add(final_url, html, info['bytes'], budget)
+                for final_url, report in probes.poll():
+                    yield final_url, report
+                if fetching or probes:
+                    wait(list(fetching) + list(probes.in_flight), timeout=probes.timeout() if probes else None,
+                         return_when=FIRST_COMPLETED)
+        finally:
+            fetchpool.cancel(fetching)
+            probes.cancel()
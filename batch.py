@@ -0,0 +1,115 @@
+"""Comparativa de competidores por lotes: muchas parejas (URL, keyword) con un único corpus
+
+Las SERPs se piden una vez por keyword y espaciadas (CRP_SERP_INTERVAL). Después
+se descarga la unión de URLs (competidores y páginas propias) una sola vez y todas
+las comparativas y huecos de headings se calculan sobre ese corpus compartido.
+"""
+import os
+import random
+import re
+import time
+
+import replay
+
+SERP_INTERVAL = float(os.environ.get('CRP_SERP_INTERVAL', 2.0))
+MAX_PAIRS = 200
+SPACE_RE = re.compile(r'\s+')
+
+
+def parse_pairs(text):
+    """Líneas 'url, keyword' (o separadas por tabulador/punto y coma) -> [{'url', 'keyword'}] sin repetidos"""
+    pairs, seen = [], set()
+    for line in text.splitlines():
+        parts = re.split(r'[\t;,]', line.strip(), maxsplit=1)
+        if len(parts) != 2:
+            continue
+        # El buscador no distingue mayúsculas: una sola SERP por keyword
+        url, keyword = parts[0].strip(), SPACE_RE.sub(' ', parts[1]).strip().lower()
+        if url.startswith('http') and keyword and (url, keyword) not in seen:
+            seen.add((url, keyword))
+            pairs.append({'url': url, 'keyword': keyword})
+    return pairs[:MAX_PAIRS]
+
+
+def fetch_serps(keywords, interval=None, search=None):
+    """Genera (keyword, urls) con al menos `interval` segundos (±25%) entre peticiones al buscador"""
+    if search is None:
+        from scraper import get_google_top_10 as search
+    interval = SERP_INTERVAL if interval is None else interval
+    next_at = 0.0
+    for keyword in keywords:
+        # En replay no hay buscador al que saturar
+        if replay.mode() != 'replay':
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            next_at = time.monotonic() + interval * random.uniform(0.75, 1.25)
+        yield keyword, search(keyword)
+
+
+def _heading_key(heading):
+    return SPACE_RE.sub(' ', heading).strip().lower()
+
+
+def heading_gaps(own, competitors, min_competitors=2, limit=10):
+    """H2 que usan al menos `min_competitors` competidores y la página propia no tiene: [(h2, nº competidores)]"""
+    own_keys = {_heading_key(h) for h in (own.get('h2_tags') or [])} if own else set()
+    counts, labels = {}, {}
+    for meta in competitors:
+        if not meta['success']:
+            continue
+        for key in {_heading_key(h) for h in meta['h2_tags']}:
+            if key and key not in own_keys:
+                counts[key] = counts.get(key, 0) + 1
+        for h in meta['h2_tags']:
+            labels.setdefault(_heading_key(h), h)
+    ranked = sorted((key for key, n in counts.items() if n >= min_competitors), key=lambda k: (-counts[k], k))
+    return [(labels[key], counts[key]) for key in ranked[:limit]]
+
+
+def comparison_rows(own, competitors, own_position=None):
+    """Filas de la tabla comparativa (página propia primero, luego el top en orden de SERP)"""
+    rows = []
+    if own is not None:
+        rows.append({'Posición': f"#{own_position} (TU URL)" if own_position else "TU URL", 'URL': own['url'],
+                     'Title': own['title'], 'H1': own['h1_count'], 'H2': own['h2_count'], 'H3': own['h3_count'],
+                     'Words': own['word_count']})
+    for idx, meta in enumerate(competitors, 1):
+        if meta['success']:
+            rows.append({'Posición': f"#{idx}", 'URL': meta['url'], 'Title': meta['title'], 'H1': meta['h1_count'],
+                         'H2': meta['h2_count'], 'H3': meta['h3_count'], 'Words': meta['word_count']})
+    return rows
+
+
+def compare_pairs(pairs, serps, pages, normalize):
+    """Comparativa de cada pareja a partir de las SERPs y del corpus compartido {url normalizada: metadatos}"""
+    comparisons = []
+    for pair in pairs:
+        own_url = normalize(pair['url'])
+        serp = [normalize(url) for url in serps.get(pair['keyword']) or []]
+        competitors = [pages[url] for url in serp if url in pages and url != own_url]
+        own = pages.get(own_url)
+        own_rank = serp.index(own_url) + 1 if own_url in serp else None
+        comparisons.append({
+            'url': pair['url'],
+            'keyword': pair['keyword'],
+            'serp': serp,
+            'own_rank': own_rank,
+            'own': own,
+            'competitors': competitors,
+            'rows': comparison_rows(own if own is not None and own['success'] else None, competitors, own_rank),
+            'gaps': heading_gaps(own if own is not None and own['success'] else None, competitors),
+        })
+    return comparisons
+
+
+def dedup_stats(pairs, serps, unique_urls):
+    """Descargas que habría hecho una comparativa por pareja frente a las del corpus compartido"""
+    naive_pages = sum(1 + len(serps.get(pair['keyword']) or []) for pair in pairs)
+    return {
+        'pairs': len(pairs),
+        'keywords': len(serps),
+        'serp_requests': len(serps),
+        'serp_saved': len(pairs) - len(serps),
+        'naive_fetches': naive_pages,
+        'unique_fetches': unique_urls,
+        'fetches_saved': naive_pages - unique_urls,
+    }
@@ -0,0 +1 @@
+"""Benchmarks reproducibles del prioritizer (ver bench/run.py)"""
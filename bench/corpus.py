@@ -0,0 +1,299 @@
+"""Corpus de páginas HTML tipo competidor y servidor HTTP local para servirlas
+
+Regenerar el corpus guardado: python -m bench.corpus
+"""
+import functools
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+WORDS = (
+    "seo content page search google ranking keyword traffic click position "
+    "guide tutorial build app web design marketing strategy tips best tools "
+    "how what why when data analysis performance optimize improve update "
+    "contenido página búsqueda posicionamiento palabra clave tráfico guía "
+    "cómo mejorar herramientas estrategia datos análisis rendimiento"
+).split()
+
+# (nombre, contenedor, nº secciones, palabras por párrafo, enlaces extra, script inline en KB, idioma)
+LAYOUTS = [
+    ('blog-article', 'article', 12, 120, 20, 0, 'en'),
+    ('docs-main', 'main', 20, 80, 60, 0, 'en'),
+    ('wordpress-content', 'div.entry-content', 10, 150, 30, 5, 'en'),
+    ('news-post-id', 'div#post-body', 8, 90, 15, 2, 'en'),
+    ('landing-body', 'body', 5, 40, 10, 0, 'en'),
+    ('spa-heavy', 'div#app', 6, 60, 20, 250, 'en'),
+    ('ecommerce-category', 'main', 4, 30, 400, 20, 'en'),
+    ('guia-articulo', 'article', 14, 110, 25, 3, 'es'),
+    ('forum-thread', 'div.post-content', 25, 50, 80, 10, 'en'),
+    ('longform-pillar', 'article', 40, 160, 120, 15, 'en'),
+]
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _open_container(spec):
+    if spec == 'body':
+        return "", ""
+    tag, _, rest = spec.partition('.')
+    if '#' in tag:
+        tag, ident = tag.split('#')
+        return f'<{tag} id="{ident}">', f'</{tag}>'
+    if rest:
+        return f'<{tag} class="{rest}">', f'</{tag}>'
+    return f'<{tag}>', f'</{tag}>'
+
+
+def build_page(name, container, sections, words, links, script_kb, lang, seed=0, truth=None):
+    """HTML de una página del corpus; `truth` (dict) recibe lo que un extractor debería encontrar en el contenido
+
+    Contenido: H1, H2/H3 y párrafos del contenedor (no la navegación, la lista de
+    enlaces relacionados, el sidebar ni el pie). Enlaces internos: los de los párrafos.
+    """
+    rng = random.Random(f"{name}-{seed}")
+    truth = {} if truth is None else truth
+    truth.update(words=8, internal_links=0, h2=0, h3=0)
+    domain = f"{name}.test"
+    title = _sentence(rng, 8)[:-1]
+    faqs = [_sentence(rng, 6)[:-1] + "?" for _ in range(rng.randint(0, 5))]
+
+    schemas = [{"@context": "https://schema.org", "@type": "Article", "headline": title}]
+    if faqs:
+        schemas.append({"@context": "https://schema.org", "@type": "FAQPage", "mainEntity": [
+            {"@type": "Question", "name": q, "acceptedAnswer": {"@type": "Answer", "text": _sentence(rng, 12)}}
+            for q in faqs
+        ]})
+
+    head = [
+        f'<!DOCTYPE html><html lang="{lang}"><head><meta charset="utf-8">',
+        f'<title>{title}</title>',
+        f'<meta name="description" content="{_sentence(rng, 22)}">',
+    ]
+    head += [f'<script type="application/ld+json">{json.dumps(s, ensure_ascii=False)}</script>' for s in schemas]
+    head.append('<style>body{font-family:sans-serif}.nav a{margin:0 4px}</style>')
+    if script_kb:
+        blob = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(script_kb * 1024))
+        head.append(f'<script>window.__STATE__="{blob}";</script>')
+    head.append('</head><body>')
+
+    nav = ['<header><nav class="nav">']
+    nav += [f'<a href="/category/{i}">{rng.choice(WORDS)}</a>' for i in range(15)]
+    nav.append('</nav></header>')
+
+    open_tag, close_tag = _open_container(container)
+    body = [open_tag, f'<h1>{title}</h1>']
+    for s in range(sections):
+        body.append(f'<h2>{_sentence(rng, 5)[:-1]}</h2>')
+        truth['words'] += 5
+        truth['h2'] += 1
+        for _ in range(rng.randint(1, 4)):
+            link = ""
+            if rng.random() < 0.5:
+                target = f"/blog/{rng.choice(WORDS)}-{rng.randrange(1000)}" if rng.random() < 0.7 else f"https://other-{rng.randrange(50)}.test/x"
+                link = f' <a href="{target}">{rng.choice(WORDS)}</a>'
+                truth['words'] += 1
+                truth['internal_links'] += target.startswith('/')
+            body.append(f'<p>{_sentence(rng, words)}{link}</p>')
+            truth['words'] += words
+        if rng.random() < 0.4:
+            body.append(f'<h3>{_sentence(rng, 4)[:-1]}</h3><p>{_sentence(rng, words // 2)}</p>')
+            truth['words'] += 4 + words // 2
+            truth['h3'] += 1
+        if rng.random() < 0.5:
+            alt = f' alt="{rng.choice(WORDS)}"' if rng.random() < 0.6 else ''
+            ext = rng.choice(['jpg', 'png', 'webp'])
+            body.append(f'<img src="/img/{name}-{s}.{ext}"{alt} width="800" height="450">')
+    body.append('<ul class="related">')
+    body += [f'<li><a href="/p/{rng.randrange(10 ** 5)}">{_sentence(rng, 3)[:-1]}</a></li>' for _ in range(links)]
+    body.append('</ul>')
+    body.append(close_tag)
+
+    footer = ['<aside class="sidebar">'] + [f'<a href="/tag/{w}">{w}</a>' for w in WORDS[:20]] + ['</aside>']
+    footer += ['<footer>', f'<p>© {domain}</p>', '<form><input name="email"></form>', '</footer>', '</body></html>']
+
+    return "\n".join(head + nav + body + footer)
+
+
+def build_corpus(path=CORPUS_DIR):
+    os.makedirs(path, exist_ok=True)
+    names = []
+    for layout in LAYOUTS:
+        html = build_page(*layout)
+        with open(os.path.join(path, f"{layout[0]}.html"), 'w', encoding='utf-8') as f:
+            f.write(html)
+        names.append(layout[0])
+    return names
+
+
+def corpus_truth():
+    """{fichero: valores esperados del contenido principal} de las páginas generadas por build_page"""
+    truth = {}
+    for layout in LAYOUTS:
+        build_page(*layout, truth=truth.setdefault(f"{layout[0]}.html", {}))
+    return truth
+
+
+def corpus_pages(path=CORPUS_DIR):
+    """Nombres de fichero del corpus guardado"""
+    return sorted(f for f in os.listdir(path) if f.endswith('.html'))
+
+
+HOSTILE_PATHS = ('/__pdf', '/__endless', '/__huge')
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    """Sirve el corpus más rutas hostiles: PDF grande, stream infinito y HTML enorme"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/__pdf':
+            return self._send_blob('application/pdf', b'%PDF-1.7\n' + b'0' * (8 * 1024 * 1024))
+        if self.path == '/__huge':
+            return self._send_blob('text/html; charset=utf-8', b'<html><body>' + b'<p>palabra \xc3\xa1</p>' * 600000 + b'</body></html>')
+        if self.path == '/__endless':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            try:
+                self.wfile.write(b'<html><body>')
+                while True:
+                    self.wfile.write(b'<p>' + b'x' * 4096 + b'</p>')
+            except (BrokenPipeError, ConnectionResetError):
+                return
+        return super().do_GET()
+
+    def _send_blob(self, content_type, body):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class SiteHandler(_QuietHandler):
+    """Sitio sintético de N páginas enlazadas (/page/<i>) para el crawler; algunas quedan huérfanas"""
+    pages = 1000
+
+    def do_GET(self):
+        if self.path == '/' or self.path.startswith('/page/'):
+            i = int(self.path.rsplit('/', 1)[-1]) if self.path.startswith('/page/') else 0
+            rng = random.Random(i)
+            # Cada 10 páginas hay una sin enlaces entrantes
+            targets = [t for t in (rng.randrange(self.pages) for _ in range(25)) if t % 10 != 9]
+            links = "".join(f'<a href="/page/{t}">p{t}</a>' for t in targets)
+            nav = '<nav><a href="/">home</a><a href="/page/1">one</a></nav>'
+            body = f"<html><body>{nav}<article><h1>Page {i}</h1><p>{links}</p></article></body></html>"
+            return self._send_blob('text/html; charset=utf-8', body.encode('utf-8'))
+        self.send_error(404)
+
+
+class SitemapHandler(_QuietHandler):
+    """Índice de sitemaps sintético: robots.txt → /sitemap_index.xml → /sitemap-<i>.xml.gz de `per_file` URLs"""
+    entries = 1000000
+    per_file = 50000
+    _bodies = {}
+
+    def do_GET(self):
+        host = self.headers.get('Host')
+        files = -(-self.entries // self.per_file)
+        if self.path == '/robots.txt':
+            return self._send_blob('text/plain', f"User-agent: *\nSitemap: http://{host}/sitemap_index.xml\n".encode())
+        if self.path == '/sitemap_index.xml':
+            body = ['<?xml version="1.0" encoding="UTF-8"?>',
+                    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+            body += [f"<sitemap><loc>http://{host}/sitemap-{i}.xml.gz</loc></sitemap>" for i in range(files)]
+            body.append('</sitemapindex>')
+            return self._send_blob('application/xml', "\n".join(body).encode())
+        if self.path.startswith('/sitemap-') and self.path.endswith('.xml.gz'):
+            i = int(self.path[len('/sitemap-'):-len('.xml.gz')])
+            key = (host, self.entries, self.per_file, i)
+            if key not in self._bodies:
+                start, end = i * self.per_file, min((i + 1) * self.per_file, self.entries)
+                body = ['<?xml version="1.0" encoding="UTF-8"?>',
+                        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+                body += [f"<url><loc>http://{host}/page/{j}</loc><lastmod>20{15 + j % 10}-0{1 + j % 9}-1{j % 10}</lastmod></url>"
+                         for j in range(start, end)]
+                body.append('</urlset>')
+                self._bodies[key] = gzip.compress("\n".join(body).encode(), compresslevel=5)
+            return self._send_blob('application/gzip', self._bodies[key])
+        self.send_error(404)
+
+
+class AssetHandler(_QuietHandler):
+    """Páginas con imágenes, scripts y CSS (/page/<i>) y assets de tamaño fijo por ruta
+
+    Uno de cada 7 assets rechaza el HEAD (405), uno de cada 11 ignora el Range y no
+    manda Content-Length, y uno de cada 13 tarda `slow` segundos en responder.
+    """
+    images = 30
+    scripts = 8
+    stylesheets = 4
+    slow = 0.0
+
+    def do_GET(self):
+        if self.path.startswith('/page/'):
+            i = int(self.path.rsplit('/', 1)[-1])
+            tags = [f'<img src="/img/{i * 100 + j}.{("jpg", "png", "webp")[j % 3]}" alt="x">' for j in range(self.images)]
+            tags += [f'<script src="/js/{i * 100 + j}.js"></script>' for j in range(self.scripts)]
+            tags += [f'<link rel="stylesheet" href="/css/{i * 100 + j}.css">' for j in range(self.stylesheets)]
+            body = f"<html><head>{''.join(tags[self.images:])}</head><body><h1>Page {i}</h1>{''.join(tags[:self.images])}</body></html>"
+            return self._send_blob('text/html; charset=utf-8', body.encode('utf-8'))
+        return self._asset(head=False)
+
+    def do_HEAD(self):
+        return self._asset(head=True)
+
+    def _asset(self, head):
+        kind, _, name = self.path.strip('/').partition('/')
+        if kind not in ('img', 'js', 'css') or not name:
+            return self.send_error(404)
+        n = int(name.split('.')[0])
+        size = 5000 + (n * 7919) % 400000
+        content_type = {'img': 'image/' + name.rsplit('.', 1)[-1].replace('jpg', 'jpeg'),
+                        'js': 'application/javascript', 'css': 'text/css'}[kind]
+        if self.slow and n % 13 == 0:
+            time.sleep(self.slow)
+        if head and n % 7 == 0:
+            return self.send_error(405)
+        ranged = self.headers.get('Range') == 'bytes=0-0' and n % 11 != 0
+        self.send_response(206 if ranged else 200)
+        self.send_header('Content-Type', content_type)
+        if ranged:
+            self.send_header('Content-Range', f'bytes 0-0/{size}')
+            self.send_header('Content-Length', '1')
+        elif n % 11 != 0:
+            self.send_header('Content-Length', str(size))
+        self.end_headers()
+        if head:
+            return
+        try:
+            self.wfile.write(b'x' if ranged else b'x' * size)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve_corpus(path=CORPUS_DIR, handler=None):
+    """Sirve el corpus en 127.0.0.1 en un puerto libre. Devuelve (server, base_url)"""
+    handler = handler or functools.partial(_QuietHandler, directory=path)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    for name in build_corpus():
+        print(name)
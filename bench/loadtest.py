@@ -0,0 +1,166 @@
+"""Prueba de carga de la API HTTP (api.py): peticiones/s y percentiles de latencia por endpoint
+
+Uso:
+    python -m bench.loadtest                             # arranca la API en otro proceso
+    python -m bench.loadtest --url http://127.0.0.1:8502 --concurrency 32 --duration 20
+
+Mezcla: ranking ya cacheado, ranking con pesos aleatorios (se calcula), estado de
+un trabajo de auditoría y /health. El CSV es sintético (bench.synthetic) y la
+auditoría va contra el corpus HTML servido en local.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.run import _percentile  # noqa: E402
+
+MIX = (('ranking_cached', 0.5), ('ranking_scored', 0.2), ('job_status', 0.2), ('health', 0.1))
+
+
+class Client:
+    """Conexión keep-alive a la API (una por hilo)"""
+
+    def __init__(self, base):
+        parts = urlsplit(base)
+        self.host, self.port = parts.hostname, parts.port
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # El servidor cerró la conexión keep-alive: se reabre una vez
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def spawn_api():
+    """Arranca `python -m api --port 0` en otro proceso. Devuelve (proceso, base_url)"""
+    process = subprocess.Popen([sys.executable, '-m', 'api', '--port', '0'], cwd=ROOT, stdout=subprocess.PIPE,
+                               text=True)
+    return process, process.stdout.readline().strip()
+
+
+def prepare(base, rows):
+    """Sube el CSV sintético y encola una auditoría contra el corpus local. Devuelve (upload, job, upload_s)"""
+    from bench.corpus import corpus_pages, serve_corpus
+    from bench.synthetic import generate_gsc_csv
+
+    client = Client(base)
+    body = generate_gsc_csv(rows)
+    start = time.perf_counter()
+    status, data = client.request('POST', '/uploads', body, {'Content-Type': 'text/csv'})
+    upload_s = time.perf_counter() - start
+    if status != 201:
+        raise RuntimeError(f"upload: HTTP {status} {data[:200]!r}")
+    upload = json.loads(data)['upload']
+
+    server, corpus = serve_corpus()
+    payload = json.dumps({'url': f"{corpus}/{corpus_pages()[0]}"}).encode('utf-8')
+    status, data = client.request('POST', '/audits', payload, {'Content-Type': 'application/json'})
+    job = json.loads(data)['job']
+    # La auditoría termina antes de medir: job_status incluye el resultado serializado
+    while json.loads(client.request('GET', f"/jobs/{job}")[1])['status'] in ('queued', 'running'):
+        time.sleep(0.05)
+    server.shutdown()
+    return upload, job, upload_s
+
+
+def run(base, upload, job, concurrency=16, duration=10.0, seed=0):
+    """Lanza `concurrency` clientes durante `duration` s. Devuelve ({endpoint: latencias}, errores, segundos)"""
+    names = [name for name, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    paths = {
+        'ranking_cached': lambda rng: f"/uploads/{upload}/ranking?top=50",
+        'ranking_scored': lambda rng: (f"/uploads/{upload}/ranking?top=50&position_max={rng.randint(15, 60)}"
+                                       f"&click_threshold={rng.randint(0, 100) / 100}"),
+        'job_status': lambda rng: f"/jobs/{job}",
+        'health': lambda rng: "/health",
+    }
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = Client(base)
+        local = {name: [] for name in names}
+        failed = {name: 0 for name in names}
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status, _ = client.request('GET', paths[name](rng))
+            except Exception:
+                status = None
+            if status == 200:
+                local[name].append(time.perf_counter() - start)
+            else:
+                failed[name] += 1
+        with lock:
+            for name in names:
+                latencies[name].extend(local[name])
+                errors[name] += failed[name]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(latencies, errors, seconds):
+    print(f"{'endpoint':18} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for name, values in latencies.items():
+        everything.extend(values)
+        print(f"{name:18} {len(values):>9} {errors[name]:>7} {len(values) / seconds:>9.1f} "
+              f"{_percentile(values, 0.5) * 1000:>8.2f} {_percentile(values, 0.95) * 1000:>8.2f} "
+              f"{_percentile(values, 0.99) * 1000:>8.2f}")
+    print(f"{'total':18} {len(everything):>9} {sum(errors.values()):>7} {len(everything) / seconds:>9.1f} "
+          f"{_percentile(everything, 0.5) * 1000:>8.2f} {_percentile(everything, 0.95) * 1000:>8.2f} "
+          f"{_percentile(everything, 0.99) * 1000:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help="API ya arrancada (por defecto se lanza una en otro proceso)")
+    parser.add_argument('--rows', type=int, default=10000, help="filas del CSV sintético")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    process, base = (None, args.url) if args.url else spawn_api()
+    try:
+        upload, job, upload_s = prepare(base, args.rows)
+        print(f"upload de {args.rows} filas: {upload_s * 1000:.0f} ms", file=sys.stderr)
+        report(*run(base, upload, job, args.concurrency, args.duration))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,735 @@
+"""Suite de benchmarks reproducible: GSC sintético, corpus HTML local y LLM stub
+
+Uso:
+    python -m bench.run                          # todas las suites
+    python -m bench.run --only gsc --sizes 1000,100000
+    python -m bench.run --label antes && python -m bench.run --label despues --compare latest
+
+Cada ejecución guarda throughput, percentiles de latencia y memoria pico por etapa
+en bench/results/<fecha>[-label].json para poder comparar ejecuciones.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registra una suite: fn(args) -> lista de resultados de run_stage"""
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return decorator
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(stage, latencies, units_per_call=1, unit='item', total=None, peak_kb=None, **info):
+    """Resultado estándar de una etapa a partir de las latencias medidas (segundos)"""
+    total = sum(latencies) if total is None else total
+    result = {
+        'stage': stage,
+        'calls': len(latencies),
+        'unit': unit,
+        'units': len(latencies) * units_per_call,
+        'total_s': round(total, 4),
+        'throughput': round(len(latencies) * units_per_call / total, 2) if total else None,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'peak_mem_kb': peak_kb,
+    }
+    result.update(info)
+    return result
+
+
+def run_stage(stage, calls, units_per_call=1, unit='item', memory=True, **info):
+    """Ejecuta `calls` (callables sin argumentos) midiendo latencia, throughput y memoria pico"""
+    gc.collect()
+    latencies = []
+    start = time.perf_counter()
+    for call in calls:
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    peak_kb = None
+    if memory:
+        # Pasada separada: tracemalloc distorsiona los tiempos
+        gc.collect()
+        tracemalloc.start()
+        for call in calls[:5]:
+            call()
+        peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+
+    return summarize(stage, latencies, units_per_call, unit, total, peak_kb, **info)
+
+
+@benchmark('gsc')
+def bench_gsc(args):
+    import pandas as pd
+    from gsc import process_gsc_data, clean_gsc_data, rank_gsc_data, fit_ctr_curve, DEFAULT_SCORING
+    from bench.synthetic import generate_gsc_csv
+
+    results = []
+    for rows in args.sizes:
+        for locale in ('en', 'es'):
+            raw = generate_gsc_csv(rows, locale=locale)
+            parse = lambda: pd.read_csv(io.BytesIO(raw), encoding='utf-8', on_bad_lines='skip')
+            df = parse()
+            results.append(run_stage(f"csv_parse[{rows},{locale}]", [parse] * args.repeat, rows, 'rows'))
+            results.append(run_stage(f"process_gsc_data[{rows},{locale}]",
+                                     [lambda: process_gsc_data(df.copy())] * args.repeat, rows, 'rows'))
+            if locale == 'en':
+                clean = clean_gsc_data(df)
+        # Re-scoring en vivo: solo el ranking sobre las columnas ya limpias, con pesos distintos en cada llamada
+        configs = [dict(DEFAULT_SCORING, position_weight=0.2 + i * 0.05) for i in range(args.repeat)]
+        results.append(run_stage(f"rank_gsc_data[{rows},top1000]",
+                                 [lambda cfg=cfg: rank_gsc_data(clean, cfg, top_k=1000) for cfg in configs], rows, 'rows'))
+        results.append(run_stage(f"rank_gsc_data[{rows},full_sort]",
+                                 [lambda cfg=cfg: rank_gsc_data(clean, cfg) for cfg in configs], rows, 'rows'))
+        # Modo clicks ganables: ajuste de la curva CTR (una vez por upload) y ranking con la curva cacheada
+        results.append(run_stage(f"fit_ctr_curve[{rows}]", [lambda: fit_ctr_curve(clean)] * args.repeat, rows, 'rows'))
+        gain_configs = [dict(DEFAULT_SCORING, ranking_mode='click_gain', gain_positions=1 + i) for i in range(args.repeat)]
+        results.append(run_stage(f"rank_click_gain[{rows},top1000]",
+                                 [lambda cfg=cfg: rank_gsc_data(clean, cfg, top_k=1000) for cfg in gain_configs],
+                                 rows, 'rows'))
+    return results
+
+
+@benchmark('cannibalization')
+def bench_cannibalization(args):
+    import pandas as pd
+    from cannibalization import load_query_page, detect_cannibalization
+    from bench.synthetic import generate_query_page_csv
+
+    results = []
+    for rows in args.sizes:
+        pairs = load_query_page(pd.read_csv(io.BytesIO(generate_query_page_csv(rows))))
+        found = []
+        stage = run_stage(f"detect_cannibalization[{rows}]",
+                          [lambda: found.append(detect_cannibalization(pairs)[0])] * args.repeat, len(pairs), 'pairs')
+        # Las parejas plantadas por el generador llevan '/dup-' en la URL
+        detected = set(found[-1]['url']) if found[-1] is not None else set()
+        planted = set(pairs.loc[pairs['url'].str.contains('/dup-', regex=False), 'url'])
+        stage['precision'] = round(len(detected & planted) / len(detected), 3) if detected else None
+        stage['recall'] = round(len(detected & planted) / len(planted), 3) if planted else None
+        results.append(stage)
+    return results
+
+
+@benchmark('export')
+def bench_export(args):
+    import tempfile
+    import pandas as pd
+    import export
+    from gsc import clean_gsc_data, DEFAULT_SCORING
+    from bench.synthetic import generate_gsc_csv
+
+    results = []
+    for rows in args.sizes:
+        clean = clean_gsc_data(pd.read_csv(io.BytesIO(generate_gsc_csv(rows))))
+        # Umbral de clicks a 0: se exporta todo el ranking
+        config = dict(DEFAULT_SCORING, click_threshold=0, position_min=1, position_max=100)
+        for fmt in export.FORMATS:
+            with tempfile.TemporaryFile() as out:
+                def write(fmt=fmt, out=out):
+                    out.seek(0)
+                    out.truncate()
+                    export.export_report({'priorities': export.priority_chunks(clean, config)}, fmt, out)
+                stage = run_stage(f"export[{fmt},{rows}]", [write] * args.repeat, rows, 'rows')
+                stage['file_kb'] = round(out.seek(0, 2) / 1024, 1)
+            results.append(stage)
+    return results
+
+
+@benchmark('parse')
+def bench_parse(args):
+    from scraper import _extract_metadata
+    from bench.corpus import CORPUS_DIR, corpus_pages
+
+    pages = []
+    for name in corpus_pages():
+        with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+            pages.append((name, f.read()))
+
+    calls = [lambda html=html, name=name: _extract_metadata(html, f"https://{name}.test/", f"{name}.test")
+             for name, html in pages] * args.repeat
+    total_bytes = sum(len(html.encode('utf-8')) for _, html in pages)
+    return [run_stage('html_parse[corpus]', calls, 1, 'pages', corpus_bytes=total_bytes)]
+
+
+def _legacy_content(soup, target_domain):
+    """Extracción anterior: decompose de script/style/nav/footer/aside/form y enlaces del primer article/main/div de contenido"""
+    import re
+    area_re = re.compile(r'content|post|entry|article', re.I)
+    for tag in soup(['script', 'style', 'nav', 'footer', 'aside', 'form']):
+        tag.decompose()
+    result = {
+        'word_count': len(soup.get_text(" ", strip=True).split()),
+        'h2_tags': [h.get_text(" ", strip=True) for h in soup.find_all('h2') if h.get_text(strip=True)],
+        'h3_tags': [h.get_text(" ", strip=True) for h in soup.find_all('h3') if h.get_text(strip=True)],
+    }
+    area = (soup.find('article') or soup.find('main') or soup.find('div', class_=area_re)
+            or soup.find('div', id=area_re) or soup.find('body'))
+    for tag in area.find_all(['nav', 'footer', 'header', 'aside']):
+        tag.decompose()
+    result['internal_links'] = sum(1 for a in area.find_all('a', href=True) if target_domain in a['href']
+                                   or (a['href'].startswith('/') and not a['href'].startswith('//')))
+    return result
+
+
+@benchmark('content')
+def bench_content(args):
+    """Contenido principal: error frente a la verdad del corpus (extractor nuevo y anterior) y throughput"""
+    from bs4 import BeautifulSoup
+    from maincontent import extract_main_content
+    from bench.corpus import CORPUS_DIR, corpus_pages, corpus_truth
+
+    truth = corpus_truth()
+    pages = []
+    for name in corpus_pages():
+        with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+            pages.append((name, f.read()))
+
+    def errors(extract):
+        words, links, headings = [], [], 0
+        for name, html in pages:
+            result = extract(BeautifulSoup(html, 'html.parser'), f"{name[:-5]}.test")
+            expected = truth[name]
+            words.append(abs(result['word_count'] - expected['words']) / expected['words'])
+            links.append(abs(result['internal_links'] - expected['internal_links']))
+            headings += len(result['h2_tags']) == expected['h2'] and len(result['h3_tags']) == expected['h3']
+        return {'word_error_pct': round(statistics.fmean(words) * 100, 2), 'word_error_max_pct': round(max(words) * 100, 2),
+                'link_error_mean': round(statistics.fmean(links), 2), 'headings_exact': f"{headings}/{len(pages)}"}
+
+    # El extractor nuevo no modifica el soup: se parsea una vez y se mide solo la extracción
+    soups = [(BeautifulSoup(html, 'html.parser'), f"{name[:-5]}.test") for name, html in pages]
+    calls = [lambda soup=soup, domain=domain: extract_main_content(soup, domain) for soup, domain in soups] * args.repeat
+    results = [run_stage('main_content[corpus]', calls, 1, 'pages', **errors(extract_main_content))]
+
+    # El anterior destruye el soup: uno recién parseado por llamada, con el parseo fuera de la medida
+    latencies = []
+    for _ in range(args.repeat):
+        for name, html in pages:
+            soup = BeautifulSoup(html, 'html.parser')
+            t0 = time.perf_counter()
+            _legacy_content(soup, f"{name[:-5]}.test")
+            latencies.append(time.perf_counter() - t0)
+    results.append(summarize('legacy_content[corpus]', latencies, 1, 'pages', **errors(_legacy_content)))
+    return results
+
+
+def _retained_kb(build):
+    """Memoria que retiene el resultado de build() (KB)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return retained / 1024
+
+
+@benchmark('metadata')
+def bench_metadata(args):
+    """PageMetadata frente a los dicts de antes: memoria por página cacheada y (de)serialización"""
+    import pickle
+    from pagemeta import PageMetadata
+    from scraper import _extract_metadata
+    from bench.corpus import CORPUS_DIR, corpus_pages
+
+    records = []
+    for name in corpus_pages():
+        with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+            records.append(_extract_metadata(f.read(), f"https://{name}.test/", f"{name}.test"))
+
+    results = []
+    for pages in args.sizes:
+        sample = [records[i % len(records)] for i in range(pages)]
+        dicts = [meta.to_dict() for meta in sample]
+        formats = {
+            'dict+pickle': (dicts, pickle.dumps, pickle.loads),
+            'dict+json': (dicts, lambda d: json.dumps(d, ensure_ascii=False).encode('utf-8'), json.loads),
+            'PageMetadata': (sample, PageMetadata.to_bytes, PageMetadata.from_bytes),
+        }
+        for fmt, (items, dumps, loads) in formats.items():
+            blobs = [dumps(item) for item in items]
+            stage = run_stage(f"metadata_serialize[{fmt},{pages}]",
+                              [lambda: [dumps(item) for item in items]] * args.repeat, pages, 'pages', memory=False)
+            stage['bytes_per_page'] = round(sum(map(len, blobs)) / pages, 1)
+            results.append(stage)
+            stage = run_stage(f"metadata_deserialize[{fmt},{pages}]",
+                              [lambda: [loads(blob) for blob in blobs]] * args.repeat, pages, 'pages', memory=False)
+            # Caché realista: cada página deserializada tiene sus propias cadenas
+            stage['kb_per_1000_pages'] = round(_retained_kb(lambda: [loads(blob) for blob in blobs]) * 1000 / pages, 1)
+            results.append(stage)
+    return results
+
+
+@benchmark('scrape')
+def bench_scrape(args):
+    from scraper import scrape_url_metadata
+    from bench.corpus import HOSTILE_PATHS, corpus_pages, serve_corpus
+
+    server, base = serve_corpus()
+    try:
+        urls = [f"{base}/{name}" for name in corpus_pages()] * args.repeat
+        sequential = run_stage('scrape_url_metadata[sequential]',
+                               [lambda url=url: scrape_url_metadata(url, '127.0.0.1') for url in urls], 1, 'pages')
+
+        def pooled():
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                list(executor.map(scrape_url_metadata, urls))
+
+        pool = run_stage(f"scrape_url_metadata[threads={args.workers}]", [pooled], len(urls), 'pages', memory=False)
+
+        from scraper import PARSE_WORKERS, scrape_many
+        list(scrape_many(urls[:2], parse_workers=args.parse_workers))  # arranque del pool fuera de la medida
+        pipeline = run_stage(f"scrape_many[fetch={args.workers},parse={args.parse_workers or PARSE_WORKERS}]",
+                             [lambda: list(scrape_many(urls, fetch_workers=args.workers, parse_workers=args.parse_workers))],
+                             len(urls), 'pages', memory=False, cpu_count=os.cpu_count())
+
+        hostile = [f"{base}{path}" for path in HOSTILE_PATHS]
+        outcomes = []
+        hostile_stage = run_stage('scrape_url_metadata[hostile]',
+                                  [lambda url=url: outcomes.append(scrape_url_metadata(url)) for url in hostile], 1, 'pages',
+                                  memory=False)
+        hostile_stage['aborted'] = sum(1 for m in outcomes if m.get('aborted'))
+        hostile_stage['truncated'] = sum(1 for m in outcomes if m.get('truncated'))
+        return [sequential, pool, pipeline, hostile_stage]
+    finally:
+        server.shutdown()
+
+
+@benchmark('fetchpool')
+def bench_fetchpool(args):
+    """Pool de descargas compartido: sesiones pequeñas detrás de un lote grande (por turnos frente a FIFO) y 20 sesiones scrapeando"""
+    import threading
+    import fetchpool
+    from scraper import scrape_many
+    from bench.corpus import corpus_pages, serve_corpus
+
+    task_s, workers, heavy, sessions, tasks = 0.005, 4, 200, 8, 5
+    results = []
+    for mode in ('fifo', 'fair'):
+        latencies = []
+        for _ in range(args.repeat):
+            executor = ThreadPoolExecutor(max_workers=workers) if mode == 'fifo' else fetchpool.FairExecutor(workers)
+            submit = (lambda owner, fn: executor.submit(fn)) if mode == 'fifo' else executor.submit_as
+            for _ in range(heavy):
+                submit('heavy', lambda: time.sleep(task_s))
+            # Cada sesión pequeña llega con el lote grande ya en cola: cuenta lo que tarda en tener sus tareas
+            for session in range(sessions):
+                wait_for = [submit(f'session-{session}', lambda: time.sleep(task_s)) for _ in range(tasks)]
+                t0 = time.perf_counter()
+                for future in wait_for:
+                    future.result()
+                latencies.append(time.perf_counter() - t0)
+            if mode == 'fifo':
+                executor.shutdown()
+        results.append(summarize(f"small_session[{mode},workers={workers},queued={heavy}]", latencies, tasks, 'tasks',
+                                 task_ms=task_s * 1000))
+
+    server, base = serve_corpus()
+    try:
+        urls = [f"{base}/{name}" for name in corpus_pages()]
+        list(scrape_many(urls[:2], parse_workers=args.parse_workers))  # arranque del pool de parseo fuera de la medida
+        latencies = []
+
+        def session(index):
+            fetchpool.activate(f'bench-session-{index}')
+            t0 = time.perf_counter()
+            list(scrape_many(urls, parse_workers=args.parse_workers))
+            latencies.append(time.perf_counter() - t0)
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(20)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = fetchpool.pool().stats()
+        results.append(summarize(f"scrape_many[sessions=20,cap={fetchpool.FETCH_CONCURRENCY}]", latencies, len(urls),
+                                 'pages', total=time.perf_counter() - start, fetch_threads=stats['threads'],
+                                 wait_p50_ms=stats['wait_p50_ms'], wait_p95_ms=stats['wait_p95_ms']))
+    finally:
+        server.shutdown()
+    return results
+
+
+@benchmark('replay')
+def bench_replay(args):
+    import tempfile
+    import replay
+    from scraper import scrape_url_metadata
+    from bench.corpus import corpus_pages, serve_corpus
+
+    server, base = serve_corpus()
+    urls = [f"{base}/{name}" for name in corpus_pages()]
+    with tempfile.TemporaryDirectory() as path:
+        try:
+            replay.configure(mode='record', path=path)
+            record = run_stage('scrape_url_metadata[record]', [lambda url=url: scrape_url_metadata(url) for url in urls],
+                               1, 'pages', memory=False)
+        finally:
+            server.shutdown()
+
+        # Servidor apagado: replay sirve todo desde disco
+        replay.configure(mode='replay', latency=0)
+        replayed = run_stage('scrape_url_metadata[replay]',
+                             [lambda url=url: scrape_url_metadata(url) for url in urls] * args.repeat, 1, 'pages',
+                             **replay.store().stats())
+        replay.configure(mode='off')
+    return [record, replayed]
+
+
+@benchmark('snapshots')
+def bench_snapshots(args):
+    """Archivo de snapshots: escritura con y sin diccionario, duplicados y re-extracción local"""
+    import tempfile
+    import snapshots
+    from scraper import PARSE_WORKERS
+    from bench.corpus import LAYOUTS, build_page
+
+    # Dos dominios con varias páginas cada uno: la plantilla se repite, el contenido no
+    pages = [(f"https://{layout[0]}.test/p/{seed}", build_page(*layout, seed=seed))
+             for layout in LAYOUTS[:2] for seed in range(100)]
+    raw_kb = sum(len(html.encode('utf-8')) for _, html in pages) / 1024
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, samples in (('no-dict', 10 ** 9), ('dict', snapshots.DICT_SAMPLES)):
+            store = snapshots.SnapshotArchive(os.path.join(tmp, f"{label}.sqlite3"), dict_samples=samples)
+            stage = run_stage(f"snapshot_put[{label},{len(pages)}]",
+                              [lambda url=url, html=html: store.put(url, html) for url, html in pages], 1, 'pages',
+                              memory=False, raw_kb=round(raw_kb, 1))
+            stage.update(store.stats())
+            results.append(stage)
+
+        results.append(run_stage(f"snapshot_put[duplicate,{len(pages)}]",
+                                 [lambda url=url, html=html: store.put(url, html) for url, html in pages] * args.repeat,
+                                 1, 'pages', memory=False))
+        results.append(run_stage('snapshot_reextract[serial]',
+                                 [lambda: list(snapshots.reextract(store=store, parse_workers=0))] * args.repeat,
+                                 len(pages), 'pages', memory=False))
+        list(snapshots.reextract(urls=[pages[0][0]], store=store))  # arranque del pool fuera de la medida
+        results.append(run_stage(f"snapshot_reextract[parse={args.parse_workers or PARSE_WORKERS}]",
+                                 [lambda: list(snapshots.reextract(store=store, parse_workers=args.parse_workers))]
+                                 * args.repeat, len(pages), 'pages', memory=False, cpu_count=os.cpu_count()))
+    return results
+
+
+@benchmark('linkgraph')
+def bench_linkgraph(args):
+    import numpy as np
+    from array import array
+    from crawler import LinkGraph, crawl_site
+    from bench.corpus import SiteHandler, serve_corpus
+
+    results = []
+    for nodes in args.sizes:
+        rng = np.random.default_rng(0)
+        degree = 30
+        src = array('i', np.repeat(np.arange(nodes, dtype=np.int32), degree).tobytes())
+        dst = array('i', rng.integers(0, nodes, nodes * degree, dtype=np.int32).tobytes())
+        urls = [f"example.com/p/{i}" for i in range(nodes)]
+
+        def build_and_rank():
+            graph = LinkGraph.from_edges(urls, src, dst, range(nodes))
+            graph.pagerank()
+            graph.in_degree()
+            return graph
+
+        stage = run_stage(f"link_graph+pagerank[{nodes}]", [build_and_rank] * args.repeat, nodes, 'nodes')
+        stage['graph_kb'] = round(build_and_rank().nbytes() / 1024, 1)
+        results.append(stage)
+
+    server, base = serve_corpus(handler=SiteHandler)
+    try:
+        domain = base.split('://', 1)[1]
+        graph_holder = []
+        stage = run_stage('crawl_site[local 1000 pages]',
+                          [lambda: graph_holder.append(crawl_site(domain, seeds=[base + '/'], max_pages=1000,
+                                                                  workers=args.workers * 2, use_sitemap=False))],
+                          1000, 'pages', memory=False)
+        stage.update(graph_holder[-1].summary())
+        results.append(stage)
+    finally:
+        server.shutdown()
+    return results
+
+
+@benchmark('assets')
+def bench_assets(args):
+    import assets
+    from bench.corpus import AssetHandler, serve_corpus
+
+    results = []
+    server, base = serve_corpus(handler=AssetHandler)
+    try:
+        urls = [f"{base}/page/{i}" for i in range(50)]
+        per_page = AssetHandler.images + AssetHandler.scripts + AssetHandler.stylesheets
+        for slow, budget in ((0.0, assets.ASSET_BUDGET), (3.0, 1.0)):
+            AssetHandler.slow = slow
+            reports = []
+            stage = run_stage(f"audit_pages[50 pages,slow={slow}s,budget={budget}s]",
+                              [lambda: reports.extend(r for _, r in assets.audit_pages(urls, workers=args.workers,
+                                                                                       budget=budget))],
+                              len(urls) * per_page, 'assets', memory=False)
+            stage['timed_out'] = sum(r['timed_out'] for r in reports[-len(urls):])
+            stage['max_page_s'] = budget
+            results.append(stage)
+        AssetHandler.slow = 0.0
+    finally:
+        server.shutdown()
+    return results
+
+
+@benchmark('sitemap')
+def bench_sitemap(args):
+    import tempfile
+    import sitemap
+    from bench.corpus import SitemapHandler, serve_corpus
+
+    results = []
+    server, base = serve_corpus(handler=SitemapHandler)
+    try:
+        domain = base.split('://', 1)[1]
+        for entries in args.sizes:
+            SitemapHandler.entries = entries
+            with tempfile.TemporaryDirectory() as tmp:
+                sitemap._cache = sitemap.SitemapCache(os.path.join(tmp, 'cache.sqlite3'))
+                # refresh=True: cada llamada descarga y parsea todo (sin caché ni revalidación)
+                calls = [lambda: sitemap.ingest(domain, start_urls=[base + '/sitemap_index.xml'],
+                                                workers=args.workers, refresh=True)] * args.repeat
+                stage = run_stage(f"sitemap_ingest[{entries}]", calls, entries, 'urls')
+                stage.update(sitemap.ingest(domain, start_urls=[base + '/sitemap_index.xml']))
+                results.append(stage)
+
+                keys = [f"{base}/page/{i}" for i in range(0, entries, max(entries // 10000, 1))]
+                results.append(run_stage(f"sitemap_lastmod_for[{len(keys)}]",
+                                         [lambda: sitemap.lastmod_for(domain, keys)] * args.repeat, len(keys), 'urls'))
+                sitemap._cache = None
+    finally:
+        server.shutdown()
+    return results
+
+
+@benchmark('api')
+def bench_api(args):
+    """API HTTP en otro proceso bajo carga concurrente (mezcla de bench.loadtest)"""
+    from bench import loadtest
+
+    process, base = loadtest.spawn_api()
+    try:
+        results = []
+        for rows in args.sizes:
+            upload, job, upload_s = loadtest.prepare(base, rows)
+            results.append(summarize(f"api_upload[{rows}]", [upload_s], rows, 'rows'))
+            latencies, errors, seconds = loadtest.run(base, upload, job, concurrency=args.workers * 3, duration=5.0)
+            for name, values in latencies.items():
+                results.append(summarize(f"api_{name}[{rows},c={args.workers * 3}]", values, 1, 'requests',
+                                         total=seconds, errors=errors[name]))
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@benchmark('startup')
+def bench_startup(args):
+    # Cada muestra en un proceso nuevo: el arranque en frío incluye los imports
+    probe = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_probe.py')
+    samples = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, probe], capture_output=True, text=True, cwd=ROOT, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+
+    loaded = samples[-1]['heavy_modules_loaded']
+    cold = summarize('app_cold_run', [s['cold_run_s'] for s in samples], 1, 'runs', heavy_modules_loaded=loaded)
+    rerun = summarize('app_rerun', [t for s in samples for t in s['rerun_s']], 1, 'runs',
+                      script_run_mean_ms=round(statistics.fmean(s['script_run_mean_ms'] for s in samples), 3))
+    return [cold, rerun]
+
+
+@benchmark('llm')
+def bench_llm(args):
+    from groq import Groq
+    from llm import groq_chat
+    from bench.stub_llm import serve_stub_llm
+
+    server, base = serve_stub_llm(latency=args.llm_latency)
+    try:
+        client = Groq(api_key='stub', base_url=base, max_retries=0)
+        prompt = "Eres un experto SEO. " * 60
+        calls = [lambda: groq_chat(client, prompt, temperature=0.3, max_tokens=300)] * (5 * args.repeat)
+        results = [run_stage('groq_chat[stub]', calls, 1, 'requests', stub_latency_s=args.llm_latency)]
+    finally:
+        server.shutdown()
+    return results + _bench_llm_packed(args)
+
+
+def _insight_items(n):
+    metrics = {'position': 12, 'position_change': '+3', 'clicks': 140, 'clicks_change': -18.5, 'impressions': 9000,
+               'ctr': 1.6}
+    metadata = {'title': 'Guía completa de ejemplo para el benchmark', 'title_length': 43, 'description_length': 148,
+                'word_count': 1250, 'h1_count': 1, 'h2_count': 6, 'h3_count': 9, 'schemas_count': 2, 'faqs_count': 0,
+                'internal_links': 14}
+    return [(f"https://example.com/blog/post-{i}", metrics, metadata) for i in range(n)]
+
+
+def _bench_llm_packed(args):
+    """Una petición por URL frente a PACK_SIZE URLs por petición (una de cada 5 URLs falla la primera vez)"""
+    from groq import Groq
+    from llm import PACK_SIZE, get_groq_insights_packed, groq_chat, insight_prompt
+    from bench.stub_llm import packed_reply, serve_stub_llm
+
+    results = []
+    for n in (8, 40):
+        items = _insight_items(n)
+        server, base = serve_stub_llm(latency=args.llm_latency)
+        try:
+            client = Groq(api_key='stub', base_url=base, max_retries=0)
+            calls = [lambda: [groq_chat(client, insight_prompt(*item, 'Español'), temperature=0.3, max_tokens=300)
+                              for item in items]] * args.repeat
+            results.append(run_stage(f'insights_single[{n}]', calls, n, 'urls', requests=n))
+        finally:
+            server.shutdown()
+
+        # Un stub nuevo por repetición (fuera de la medida): las URLs omitidas vuelven a fallar la primera vez
+        stubs = [serve_stub_llm(latency=args.llm_latency, reply=packed_reply(drop_every=5)) for _ in range(args.repeat)]
+        stats = {}
+
+        def packed(base):
+            client = Groq(api_key='stub', base_url=base, max_retries=0)
+            insights, errors, run_stats = get_groq_insights_packed(items, 'Español', 'stub', client=client)
+            assert len(insights) == n and not errors, errors
+            # La pasada de memoria de run_stage repite las llamadas: cuentan las de la medida
+            stats.setdefault('run', run_stats)
+        try:
+            calls = [lambda base=base: packed(base) for _, base in stubs]
+            results.append(run_stage(f'insights_packed[{n},pack={PACK_SIZE}]', calls, n, 'urls'))
+        finally:
+            for server, _ in stubs:
+                server.shutdown()
+        # Las estadísticas solo se conocen después de ejecutar la etapa
+        results[-1].update({key: stats['run'][key] for key in ('requests', 'requests_saved', 'retried_urls', 'tokens_per_url',
+                                                        'packed_prompt_tokens_est', 'single_prompt_tokens_est')})
+    return results
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def save_results(results, label=None):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(RESULTS_DIR, f"{stamp}-{label}.json" if label else f"{stamp}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load_previous(which):
+    if which != 'latest':
+        with open(which, encoding='utf-8') as f:
+            return json.load(f), which
+    files = sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith('.json')) if os.path.isdir(RESULTS_DIR) else []
+    if not files:
+        return None, None
+    path = os.path.join(RESULTS_DIR, files[-1])
+    with open(path, encoding='utf-8') as f:
+        return json.load(f), path
+
+
+def print_table(stages, previous=None):
+    before = {s['stage']: s for s in (previous or {}).get('stages', [])}
+    print(f"{'stage':48} {'throughput':>14} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak KB':>10} {'vs prev':>8}")
+    for s in stages:
+        delta = ""
+        old = before.get(s['stage'])
+        if old and old.get('throughput') and s.get('throughput'):
+            delta = f"{s['throughput'] / old['throughput']:.2f}x"
+        throughput = f"{s['throughput']:.1f} {s['unit']}/s" if s['throughput'] else "-"
+        peak = s['peak_mem_kb'] if s['peak_mem_kb'] is not None else "-"
+        print(f"{s['stage']:48} {throughput:>14} {s['p50_ms']:>10} {s['p95_ms']:>10} {s['p99_ms']:>10} {peak:>10} {delta:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', default='', help="suites separadas por comas (%s)" % ", ".join(BENCHMARKS))
+    parser.add_argument('--sizes', default='1000,10000,100000', help="filas del CSV sintético")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--parse-workers', type=int, default=None, help="procesos de parseo (0 = en hilos)")
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="latencia simulada del stub LLM (s)")
+    parser.add_argument('--label', default=None)
+    parser.add_argument('--compare', default=None, help="'latest' o ruta a un JSON previo")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+    args.sizes = [int(x) for x in args.sizes.split(',') if x]
+
+    selected = [n for n in args.only.split(',') if n] or list(BENCHMARKS)
+    stages = []
+    for name in selected:
+        if name not in BENCHMARKS:
+            parser.error(f"suite desconocida: {name}")
+        print(f"== {name}", file=sys.stderr)
+        stages.extend(BENCHMARKS[name](args))
+
+    results = {
+        'label': args.label,
+        'timestamp': time.time(),
+        'git_rev': _git_rev(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'args': {k: v for k, v in vars(args).items() if k != 'compare'},
+        'stages': stages,
+    }
+
+    previous, previous_path = load_previous(args.compare) if args.compare else (None, None)
+    if args.compare and previous is None:
+        print("(sin resultados previos para comparar)", file=sys.stderr)
+    elif previous_path:
+        print(f"comparando con {previous_path}", file=sys.stderr)
+
+    print_table(stages, previous)
+    if not args.no_save:
+        print(f"guardado en {save_results(results, args.label)}", file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Mide arranque en frío y reruns de app.py con el AppTest de Streamlit (se ejecuta en un proceso nuevo)"""
+import json
+import logging
+import os
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+
+def main(reruns=10):
+    logging.disable(logging.CRITICAL)
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP, default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+
+    script = app.session_state['perf_recorder'].stages.get('script_run', {})
+    heavy = [m for m in ('pandas', 'numpy', 'groq', 'bs4', 'requests') if m in sys.modules]
+    print(json.dumps({
+        'cold_run_s': cold,
+        'rerun_s': times,
+        'script_run_mean_ms': script['total_s'] / script['count'] * 1000 if script else None,
+        'heavy_modules_loaded': heavy,
+    }))
+
+
+if __name__ == '__main__':
+    main()
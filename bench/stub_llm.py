@@ -0,0 +1,77 @@
+"""Endpoint local compatible con Groq (/openai/v1/chat/completions) para benchmarks sin red"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPLY = (
+    "1. Amplía el contenido a 1800 palabras cubriendo las 4 subtemas del top 3\n"
+    "2. Reescribe el title a 55 caracteres con la keyword al inicio\n"
+    "3. Añade 3 enlaces internos desde páginas con más de 500 clicks"
+)
+
+
+def make_handler(latency=0.0, reply=STUB_REPLY):
+    class StubGroqHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if latency:
+                time.sleep(latency)
+
+            prompt = " ".join(m.get('content', '') for m in payload.get('messages', []))
+            content = reply(payload) if callable(reply) else reply
+            body = json.dumps({
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload.get('model', 'stub'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': content}}],
+                'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(content.split()),
+                          'total_tokens': len(prompt.split()) + len(content.split())},
+            }).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StubGroqHandler
+
+
+def serve_stub_llm(latency=0.0, reply=STUB_REPLY):
+    """Arranca el stub en un puerto libre. Devuelve (server, base_url) para Groq(base_url=...)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(latency, reply))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def packed_reply(drop_every=0):
+    """Respuesta JSON a los prompts empaquetados de llm.packed_prompt
+
+    Con drop_every=n omite una de cada n URLs la primera vez que aparecen, para
+    que el benchmark ejercite los reintentos del modo empaquetado.
+    """
+    seen = set()
+    lock = threading.Lock()
+
+    def reply(payload):
+        prompt = payload['messages'][-1]['content']
+        items = json.loads(prompt[prompt.rindex('URLs:\n') + 6:])
+        lines = STUB_REPLY.split('\n')
+        out = {}
+        with lock:
+            for i, item in enumerate(items):
+                if drop_every and i % drop_every == drop_every - 1 and item['url'] not in seen:
+                    seen.add(item['url'])
+                    continue
+                out[item['url']] = [line.split('. ', 1)[1] for line in lines]
+        return json.dumps(out, ensure_ascii=False)
+
+    return reply
@@ -0,0 +1,96 @@
+"""Generador de exports sintéticos de GSC (Pages con comparación de periodos)"""
+import io
+import random
+
+HEADER = "Top pages,Clicks,Clicks (previous),Impressions,Impressions (previous),CTR,CTR (previous),Position,Position (previous)"
+
+
+def _fmt(value, locale, decimals=0, percent=False):
+    # Formato en-US: 1,234.5  /  es-ES: 1.234,5
+    text = f"{value:,.{decimals}f}"
+    if locale == 'es':
+        text = text.replace(',', '_').replace('.', ',').replace('_', '.')
+    if percent:
+        text += '%' if locale == 'en' else ' %'
+    return f'"{text}"' if (',' in text) else text
+
+
+def generate_gsc_csv(rows, locale='en', seed=42, domain='example.com', grand_total=True):
+    """CSV de `rows` URLs con números en formato `locale` ('en' o 'es') y fila 'Grand total' opcional"""
+    rng = random.Random(seed)
+    out = io.StringIO()
+    out.write(HEADER + "\n")
+
+    if grand_total:
+        out.write(f"Grand total,{_fmt(rows * 40, locale)},{_fmt(rows * 38, locale)},"
+                  f"{_fmt(rows * 900, locale)},{_fmt(rows * 880, locale)},"
+                  f"{_fmt(4.4, locale, 2, True)},{_fmt(4.3, locale, 2, True)},"
+                  f"{_fmt(14.2, locale, 1)},{_fmt(14.6, locale, 1)}\n")
+
+    for i in range(rows):
+        impressions = int(rng.lognormvariate(6, 1.5)) + 1
+        impressions_prev = max(1, int(impressions * rng.uniform(0.6, 1.4)))
+        position = round(rng.uniform(1, 40), 1)
+        position_prev = round(max(1.0, position + rng.gauss(0, 3)), 1)
+        ctr = max(0.1, 30 / (position ** 1.1) * rng.uniform(0.5, 1.5))
+        ctr_prev = max(0.1, ctr * rng.uniform(0.7, 1.3))
+        clicks = int(impressions * ctr / 100)
+        clicks_prev = int(impressions_prev * ctr_prev / 100)
+        url = f"https://{domain}/blog/post-{i}-{rng.randrange(10 ** 6)}"
+        out.write(f"{url},{_fmt(clicks, locale)},{_fmt(clicks_prev, locale)},"
+                  f"{_fmt(impressions, locale)},{_fmt(impressions_prev, locale)},"
+                  f"{_fmt(ctr, locale, 2, True)},{_fmt(ctr_prev, locale, 2, True)},"
+                  f"{_fmt(position, locale, 1)},{_fmt(position_prev, locale, 1)}\n")
+
+    return out.getvalue().encode('utf-8')
+
+
+QUERY_PAGE_HEADER = "Query,Page,Clicks,Impressions,CTR,Position"
+
+
+def generate_query_page_csv(pairs, seed=42, domain='example.com', cannibal_pages=0.05):
+    """Export Query×Page de ~`pairs` filas con parejas canibalizadas plantadas
+
+    Cada consulta tiene una página dueña y algunas páginas con cuota residual. Una
+    fracción `cannibal_pages` de las páginas va en parejas (URLs con '/dup-') que se
+    reparten las consultas de la pareja con cuotas comparables.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    n_queries = max(pairs // 3, 1)
+    n_pages = max(pairs // 40, 4)
+    n_planted = int(n_pages * cannibal_pages) // 2 * 2
+
+    owner = rng.integers(0, n_pages, n_queries)
+    volume = rng.lognormal(4, 1.5, n_queries) + 20
+
+    # Cuota residual de otras páginas (nunca llega a competir)
+    extra = rng.poisson(2, n_queries)
+    extra_query = np.repeat(np.arange(n_queries), extra)
+    extra_page = rng.integers(0, n_pages, len(extra_query))
+    extra_imp = volume[extra_query] * rng.uniform(0.002, 0.04, len(extra_query))
+
+    # Parejas plantadas: la otra página de la pareja recibe una cuota comparable
+    planted = owner < n_planted
+    dup_query = np.flatnonzero(planted)
+    dup_page = owner[dup_query] ^ 1
+    dup_imp = volume[dup_query] * rng.uniform(0.3, 1.0, len(dup_query))
+
+    query = np.concatenate([np.arange(n_queries), extra_query, dup_query])
+    page = np.concatenate([owner, extra_page, dup_page])
+    impressions = np.concatenate([volume, extra_imp, dup_imp]).astype(int) + 1
+    position = rng.uniform(1, 40, len(query)).round(1)
+    ctr = np.clip(30 / position ** 1.1 * rng.uniform(0.5, 1.5, len(query)), 0.1, 100)
+
+    urls = np.array([f"https://{domain}/{'dup-' if i < n_planted else ''}post-{i}" for i in range(n_pages)])
+    df = pd.DataFrame({
+        'Query': np.char.add('keyword ', query.astype(str)),
+        'Page': urls[page],
+        'Clicks': (impressions * ctr / 100).astype(int),
+        'Impressions': impressions,
+        'CTR': np.char.add(ctr.round(2).astype(str), '%'),
+        'Position': position,
+    })
+    return df.to_csv(index=False).encode('utf-8')
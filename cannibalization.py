@@ -0,0 +1,172 @@
+"""Canibalización de keywords: páginas propias que compiten por las mismas consultas
+
+A partir de un export Query×Page de GSC se construye la matriz dispersa
+consulta×página de impresiones y se calcula la similitud coseno entre páginas con
+un producto disperso (nunca matrices densas). Las páginas unidas por una similitud
+alta forman clusters canibalizados.
+"""
+import numpy as np
+import pandas as pd
+import perf
+
+# Cuota mínima de las impresiones de una consulta para que una página cuente como
+# competidora en ella: acota a 1/min_share las páginas por consulta y con ello el producto
+DEFAULT_CANNIBALIZATION = {
+    'min_share': 0.1,
+    'min_similarity': 0.3,
+    'min_impressions': 10,
+    'top_queries': 5,
+}
+
+QUERY_HINTS = ('quer', 'consulta', 'keyword')
+PAGE_HINTS = ('page', 'página', 'pagina', 'url', 'landing')
+
+
+def _find_column(columns, hints, exclude=()):
+    for col in columns:
+        name = str(col).lower()
+        if col not in exclude and any(hint in name for hint in hints):
+            return col
+    return None
+
+
+def _to_number(series):
+    # Misma regla que gsc.clean_number, vectorizada: sin '%' ni separador ',' y 0 si no es numérico
+    if series.dtype.kind in 'if':
+        return series.fillna(0).to_numpy(dtype=float)
+    text = series.astype(str).str.strip().str.replace('%', '', regex=False).str.replace(',', '', regex=False)
+    return pd.to_numeric(text, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+
+def load_query_page(df):
+    """Columnas query, url, clicks e impressions de un export Query×Page (None si no se reconoce)"""
+    query_col = _find_column(df.columns, QUERY_HINTS)
+    page_col = _find_column(df.columns, PAGE_HINTS, exclude=(query_col,))
+    imp_col = _find_column(df.columns, ('impression', 'impresion'))
+    click_col = _find_column(df.columns, ('click', 'clic'))
+    if query_col is None or page_col is None or imp_col is None:
+        return None
+
+    pairs = pd.DataFrame({
+        'query': df[query_col].to_numpy(),
+        'url': df[page_col].to_numpy(),
+        'clicks': _to_number(df[click_col]) if click_col is not None else 0.0,
+        'impressions': _to_number(df[imp_col]),
+    })
+    pairs = pairs[pairs['query'].notna() & pairs['url'].notna()]
+    pairs = pairs[~pairs['query'].astype(str).str.contains('Grand total|^total$', case=False, regex=True)]
+    return pairs.reset_index(drop=True)
+
+
+def query_page_matrix(pairs):
+    """Matriz CSR consulta×página de impresiones (pares repetidos se suman), consultas y páginas"""
+    from scipy import sparse
+
+    query_codes, queries = pd.factorize(pairs['query'], sort=False)
+    page_codes, pages = pd.factorize(pairs['url'], sort=False)
+    matrix = sparse.csr_matrix((pairs['impressions'].to_numpy(dtype=float), (query_codes, page_codes)),
+                               shape=(len(queries), len(pages)))
+    matrix.sum_duplicates()
+    return matrix, np.asarray(queries), np.asarray(pages)
+
+
+def detect_cannibalization(pairs, config=None):
+    """Páginas en clusters canibalizados. Devuelve (pages, clusters) o (None, None) si no hay
+
+    pages: url, cluster, competitors, similarity (máxima con otra página del cluster), top_competitor.
+    clusters: cluster, n_pages, pages, primary (más clicks), shared_queries, impressions, clicks, top_queries.
+    """
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+
+    cfg = dict(DEFAULT_CANNIBALIZATION, **(config or {}))
+    pairs = pairs[pairs['impressions'] > 0]
+    if len(pairs) == 0:
+        return None, None
+
+    with perf.stage('cannibal_matrix'):
+        matrix, queries, pages = query_page_matrix(pairs)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+
+        # Solo cuentan las entradas con cuota suficiente de la consulta y un mínimo de impresiones
+        query_totals = np.asarray(matrix.sum(axis=1)).ravel()
+        coo = matrix.tocoo()
+        keep = ((coo.data >= cfg['min_share'] * query_totals[coo.row])
+                & (coo.data >= cfg['min_impressions']))
+        competing = sparse.csr_matrix((coo.data[keep], (coo.row[keep], coo.col[keep])), shape=matrix.shape)
+        competing.eliminate_zeros()
+
+    with perf.stage('cannibal_similarity'):
+        # Coseno página×página: columnas normalizadas por su vector completo de impresiones
+        scale = sparse.diags(1.0 / np.where(norms > 0, norms, 1.0))
+        weighted = competing @ scale
+        similarity = (weighted.T @ weighted).tocoo()
+        edge = (similarity.row < similarity.col) & (similarity.data >= cfg['min_similarity'])
+        rows, cols, sims = similarity.row[edge], similarity.col[edge], similarity.data[edge]
+    if len(rows) == 0:
+        return None, None
+
+    with perf.stage('cannibal_clusters'):
+        graph = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(pages), len(pages)))
+        _, labels = connected_components(graph, directed=False)
+
+        # Similitud máxima y competidor principal de cada página enlazada
+        edges = pd.DataFrame({'a': np.concatenate([rows, cols]), 'b': np.concatenate([cols, rows]),
+                              'similarity': np.concatenate([sims, sims])})
+        best = edges.sort_values('similarity', ascending=False, kind='stable').drop_duplicates('a')
+        degree = edges.groupby('a').size()
+
+        members = best['a'].to_numpy()
+        # Clusters numerados desde 1 por impresiones totales
+        page_impressions = np.asarray(matrix.sum(axis=0)).ravel()
+        page_clicks = pairs.groupby('url', sort=False)['clicks'].sum().reindex(pages).to_numpy()
+        member_labels = labels[members]
+        label_impressions = pd.Series(page_impressions[members]).groupby(member_labels).sum()
+        renumber = pd.Series(np.arange(1, len(label_impressions) + 1),
+                             index=label_impressions.sort_values(ascending=False, kind='stable').index)
+        member_clusters = renumber.reindex(member_labels).to_numpy()
+
+        page_df = pd.DataFrame({
+            'url': pages[members],
+            'cluster': member_clusters,
+            'competitors': degree.reindex(members).to_numpy(),
+            'similarity': best['similarity'].to_numpy(),
+            'top_competitor': pages[best['b'].to_numpy()],
+            'impressions': page_impressions[members],
+            'clicks': page_clicks[members],
+        }).sort_values(['cluster', 'impressions'], ascending=[True, False], kind='stable')
+
+        # Consultas compartidas: las que tienen al menos dos páginas competidoras del mismo cluster
+        cluster_of = np.zeros(len(pages), dtype=np.int64)
+        cluster_of[members] = member_clusters
+        comp = competing.tocoo()
+        entries = pd.DataFrame({'query': comp.row, 'cluster': cluster_of[comp.col], 'impressions': comp.data})
+        entries = entries[entries['cluster'] > 0]
+        shared = entries.groupby(['cluster', 'query']).agg(n=('impressions', 'size'), impressions=('impressions', 'sum'))
+        shared = shared[shared['n'] >= 2].reset_index()
+        shared = shared.sort_values(['cluster', 'impressions'], ascending=[True, False], kind='stable')
+
+        clusters = []
+        top_queries = shared.groupby('cluster')['query'].apply(lambda q: list(queries[q.to_numpy()[:cfg['top_queries']]]))
+        shared_counts = shared.groupby('cluster').size()
+        for cluster, group in page_df.groupby('cluster', sort=True):
+            clusters.append({
+                'cluster': cluster,
+                'n_pages': len(group),
+                'pages': group['url'].tolist(),
+                'primary': group.loc[group['clicks'].idxmax(), 'url'],
+                'shared_queries': int(shared_counts.get(cluster, 0)),
+                'impressions': group['impressions'].sum(),
+                'clicks': group['clicks'].sum(),
+                'top_queries': top_queries.get(cluster, []),
+            })
+    return page_df.reset_index(drop=True), pd.DataFrame(clusters)
+
+
+def add_cannibalization(df, pages):
+    """Añade cluster y nº de páginas competidoras (0 = sin canibalización) a las filas del ranking"""
+    df = df.copy()
+    by_url = pages.set_index('url')
+    df['cannibal_cluster'] = df['url'].map(by_url['cluster']).fillna(0).astype(int).to_numpy()
+    df['cannibal_competitors'] = df['url'].map(by_url['competitors']).fillna(0).astype(int).to_numpy()
+    return df
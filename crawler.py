@@ -0,0 +1,292 @@
+"""Crawler concurrente del propio sitio y grafo de enlaces internos compacto (CSR sobre NumPy)"""
+import re
+import time
+from array import array
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlsplit
+
+import numpy as np
+
+import fetchpool
+import perf
+from scraper import get_random_user_agent, streamed_get, timed_get
+
+HREF_RE = re.compile(r'<a\s[^>]*?href\s*=\s*["\']?([^"\'\s>]+)', re.I)
+SKIP_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.pdf', '.zip', '.css', '.js',
+                   '.xml', '.mp4', '.mp3', '.ico', '.woff', '.woff2', '.avif', '.gz')
+
+# 256 KB bastan para los enlaces de casi cualquier página
+CRAWL_MAX_BYTES = 256 * 1024
+
+
+def normalize_url(href, base=None):
+    """Clave canónica sin esquema ni www, sin query ni fragmento y sin barra final"""
+    url = urljoin(base, href.strip()) if base else href.strip()
+    if not url.startswith('http'):
+        if base or '://' in url:
+            return None
+        url = 'https://' + url
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        return None
+    host = parts.netloc.lower().split('@')[-1]
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path[:-1]
+    return host + path
+
+
+class LinkGraph:
+    """Grafo dirigido en formato CSR: los enlaces salientes del nodo i son indices[indptr[i]:indptr[i + 1]]"""
+
+    # Grafos guardados antes de contar las descargas fallidas
+    failed = 0
+
+    def __init__(self, urls, indptr, indices, crawled, index=None, complete=False, failed=0):
+        self.urls = urls
+        self.index = index if index is not None else {url: i for i, url in enumerate(urls)}
+        self.indptr = indptr
+        self.indices = indices
+        self.crawled = crawled
+        # complete: el crawl agotó la frontera sin descargas fallidas, así que 0 enlaces entrantes es un dato real
+        self.complete = complete
+        self.failed = failed
+        self._pagerank = None
+
+    @classmethod
+    def from_edges(cls, urls, src, dst, crawled, index=None, complete=False, failed=0):
+        n = len(urls)
+        src = np.frombuffer(src, dtype=np.int32) if len(src) else np.zeros(0, dtype=np.int32)
+        dst = np.frombuffer(dst, dtype=np.int32) if len(dst) else np.zeros(0, dtype=np.int32)
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        mask = np.zeros(n, dtype=bool)
+        mask[list(crawled)] = True
+        return cls(urls, indptr, dst[order].astype(np.int32), mask, index, complete, failed)
+
+    @property
+    def n(self):
+        return len(self.urls)
+
+    @property
+    def edges(self):
+        return len(self.indices)
+
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.crawled.nbytes
+
+    def in_degree(self):
+        return np.bincount(self.indices, minlength=self.n)
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def pagerank(self, damping=0.85, tol=1e-8, max_iter=100):
+        """PageRank por iteración de potencias, vectorizado (los nodos sin salida reparten uniformemente)"""
+        if self._pagerank is not None:
+            return self._pagerank
+        n = self.n
+        if n == 0:
+            return np.zeros(0)
+        out = self.out_degree()
+        dangling = out == 0
+        safe_out = np.where(dangling, 1, out)
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            share = np.repeat(rank / safe_out, out)
+            new = np.bincount(self.indices, weights=share, minlength=n)
+            new = damping * (new + rank[dangling].sum() / n) + (1 - damping) / n
+            delta = np.abs(new - rank).sum()
+            rank = new
+            if delta < tol:
+                break
+        self._pagerank = rank
+        return rank
+
+    def authority(self):
+        """PageRank como percentil 0-100 (más estable que la escala bruta, muy sesgada)"""
+        rank = self.pagerank()
+        if self.n < 2:
+            return np.full(self.n, 100.0)
+        order = np.argsort(rank, kind='stable')
+        pct = np.empty(self.n)
+        pct[order] = np.arange(self.n) / (self.n - 1) * 100
+        return pct
+
+    def links_from(self, url):
+        i = self.index.get(normalize_url(url))
+        if i is None:
+            return []
+        return [self.urls[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def sources_to(self, url):
+        i = self.index.get(normalize_url(url))
+        if i is None:
+            return np.zeros(0, dtype=np.int64)
+        positions = np.flatnonzero(self.indices == i)
+        return np.searchsorted(self.indptr, positions, side='right') - 1
+
+    def missing_sources(self, url, n=3):
+        """Páginas rastreadas con más autoridad que todavía no enlazan a `url`"""
+        target = self.index.get(normalize_url(url))
+        candidates = self.crawled.copy()
+        if target is not None:
+            candidates[target] = False
+            candidates[self.sources_to(url)] = False
+        ids = np.flatnonzero(candidates)
+        if len(ids) == 0:
+            return []
+        rank = self.pagerank()[ids]
+        top = ids[np.argsort(-rank, kind='stable')[:n]]
+        authority = self.authority()
+        return [{'url': self.urls[i], 'authority': round(float(authority[i]), 1)} for i in top]
+
+    def metrics_for(self, urls):
+        """Arrays (inlinks, authority, found) alineados con `urls`
+
+        Con el crawl completo, 0 inlinks es una página huérfana. Si no, las páginas que
+        la enlazan pueden no haberse descargado: los valores son mínimos y 0 pasa a -1
+        (no se sabe), esté o no la URL en el grafo.
+        """
+        inlinks = self.in_degree()
+        authority = self.authority()
+        ids = np.array([self.index.get(normalize_url(u), -1) for u in urls], dtype=np.int64)
+        found = ids >= 0
+        out_in = np.full(len(ids), 0 if self.complete else -1, dtype=np.int64)
+        out_auth = np.full(len(ids), np.nan)
+        out_in[found] = inlinks[ids[found]]
+        out_auth[found] = authority[ids[found]]
+        if not self.complete:
+            out_in[out_in == 0] = -1
+        return out_in, out_auth, found
+
+    def summary(self):
+        inlinks = self.in_degree()
+        crawled_in = inlinks[self.crawled]
+        return {
+            'nodes': self.n,
+            'crawled': int(self.crawled.sum()),
+            'edges': self.edges,
+            'orphans': int((crawled_in == 0).sum()),
+            'failed': self.failed,
+            'complete': self.complete,
+            'graph_kb': round(self.nbytes() / 1024, 1),
+        }
+
+
+def sitemap_seeds(domain, limit=5000):
+    """URLs del sitemap del dominio para sembrar el crawl (ingesta en streaming y cacheada, ver sitemap.py)"""
+    import sitemap
+    try:
+        sitemap.ingest(domain, max_entries=limit)
+    except Exception:
+        return []
+    return sitemap.cache().urls(domain.lower().replace('www.', ''), limit)
+
+
+def _fetch_links(url, max_bytes):
+    # Sin hedging: el crawl no debe duplicar peticiones contra el propio sitio
+    response = timed_get('crawl', url, live_get=streamed_get, hedge=False,
+                         headers={'User-Agent': get_random_user_agent()},
+                         timeout=8, allow_redirects=True, max_bytes=max_bytes)
+    response.raise_for_status()
+    html = getattr(response, 'decoded_text', None)
+    if html is None:
+        html = response.text
+    return response.url, HREF_RE.findall(html)
+
+
+def crawl_site(domain, seeds=(), max_pages=500, workers=8, max_nodes=None, use_sitemap=True,
+               max_bytes=CRAWL_MAX_BYTES, progress=None, time_budget=None):
+    """Crawl BFS acotado del dominio. Devuelve un LinkGraph
+
+    La memoria está acotada por `max_pages` (páginas descargadas) y `max_nodes`
+    (URLs distintas internadas); las aristas se guardan en arrays int32.
+    """
+    domain = domain.lower().replace('www.', '')
+    max_nodes = max_nodes or max_pages * 4
+    urls, index = [], {}
+    src, dst = array('i'), array('i')
+    crawled, failed = set(), set()
+    frontier = deque()
+    started = time.monotonic()
+    cut = False
+
+    def intern(key):
+        i = index.get(key)
+        if i is None:
+            if len(urls) >= max_nodes:
+                return None
+            i = index[key] = len(urls)
+            urls.append(key)
+        return i
+
+    def enqueue(url):
+        key = normalize_url(url)
+        if key is None or key.split('/', 1)[0] != domain or key.lower().endswith(SKIP_EXTENSIONS):
+            return
+        before = len(urls)
+        i = intern(key)
+        if i is not None and i == before:
+            frontier.append((i, url if url.startswith('http') else 'https://' + url))
+
+    with perf.stage('crawl_seed'):
+        for url in seeds:
+            enqueue(url)
+        if use_sitemap:
+            for url in sitemap_seeds(domain, limit=max_pages * 2):
+                enqueue(url)
+        if not frontier:
+            enqueue(f"https://{domain}/")
+
+    executor = fetchpool.pool()
+    with perf.stage('crawl'):
+        in_flight = {}
+        try:
+            while frontier or in_flight:
+                while frontier and len(in_flight) < workers and len(crawled) + len(failed) + len(in_flight) < max_pages:
+                    i, url = frontier.popleft()
+                    in_flight[executor.submit(perf.bind(_fetch_links), url, max_bytes)] = i
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = in_flight.pop(future)
+                    try:
+                        final_url, hrefs = future.result()
+                    except Exception:
+                        # HTTP de error, timeout, circuito abierto: sus enlaces salientes no se conocen
+                        failed.add(i)
+                        continue
+                    crawled.add(i)
+                    targets = set()
+                    for href in hrefs:
+                        absolute = urljoin(final_url, href.strip()).split('#', 1)[0]
+                        key = normalize_url(absolute)
+                        if key is None or key.split('/', 1)[0] != domain or key.lower().endswith(SKIP_EXTENSIONS):
+                            continue
+                        before = len(urls)
+                        j = intern(key)
+                        if j is None or j == i:
+                            continue
+                        if j == before:
+                            frontier.append((j, absolute))
+                        targets.add(j)
+                    src.extend([i] * len(targets))
+                    dst.extend(sorted(targets))
+                if progress:
+                    progress(len(crawled) + len(failed), max_pages)
+                if time_budget and time.monotonic() - started > time_budget:
+                    frontier.clear()
+                    cut = True
+        finally:
+            # Crawl cortado o cancelado: lo que no ha empezado sale de la cola del pool compartido
+            fetchpool.cancel(in_flight)
+
+    complete = not cut and not frontier and not failed and len(urls) < max_nodes
+    with perf.stage('link_graph_build'):
+        return LinkGraph.from_edges(urls, src, dst, crawled, index, complete, len(failed))
@@ -0,0 +1,259 @@
+"""Exportación de prioridades, auditorías on-page, competidores y recomendaciones
+
+Cada tabla es un iterable de DataFrames que se escribe por trozos: CSV y Parquet
+van a un zip con un fichero por tabla (o a un único fichero si solo hay una) y
+XLSX a un libro con una hoja por tabla en modo constant_memory. Nada se serializa
+entero en memoria.
+
+Uso sin UI:
+    python -m export Pages.csv --format parquet --out prioridades.parquet
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+import perf
+
+FORMATS = ('csv', 'parquet', 'xlsx')
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'zip': 'application/zip',
+}
+CHUNK_ROWS = int(os.environ.get('CRP_EXPORT_CHUNK_ROWS', 50000))
+XLSX_MAX_ROWS = 1048576
+LIST_SEPARATOR = ' | '
+
+PRIORITY_COLUMNS = ('url', 'score', 'position_current', 'position_previous', 'position_change', 'clicks_current',
+                    'clicks_previous', 'clicks_change', 'impressions_current', 'ctr_current', 'fell_from_page1',
+                    'position_score', 'traffic_score', 'trend_score', 'inlinks', 'authority', 'link_bonus',
+                    'lastmod', 'content_age_days', 'cannibal_cluster', 'cannibal_competitors', 'expected_ctr',
+                    'target_position', 'target_ctr', 'click_gain')
+ON_PAGE_COLUMNS = ('url', 'title', 'title_length', 'description', 'description_length', 'h1_count', 'h1_tags',
+                   'h2_count', 'h2_tags', 'h3_count', 'h3_tags', 'word_count', 'images_total', 'images_without_alt',
+                   'schemas_count', 'schemas', 'faqs_count', 'internal_links', 'bytes', 'truncated')
+# Columnas que añade el ranking a las del CSV limpio, por modo
+SCORE_COLUMNS = {
+    'score': ('position_score', 'traffic_score', 'trend_score', 'score'),
+    'click_gain': ('expected_ctr', 'target_position', 'target_ctr', 'click_gain', 'score'),
+}
+COMPETITOR_COLUMNS = ('url', 'title', 'word_count', 'h1_count', 'h2_count', 'h3_count', 'schemas_count',
+                      'faqs_count', 'images_total', 'internal_links', 'success', 'error')
+
+
+def iter_chunks(df, rows=None):
+    rows = rows or CHUNK_ROWS
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def _flat(value):
+    return LIST_SEPARATOR.join(map(str, value)) if isinstance(value, (list, tuple)) else value
+
+
+def priority_chunks(clean, config=None, rows=None):
+    """Ranking completo (no solo el top mostrado en pantalla), por trozos"""
+    from gsc import DEFAULT_SCORING, rank_gsc_data
+
+    ranked, _ = rank_gsc_data(clean, config)
+    if ranked is None:
+        # Ninguna URL pasa los filtros: se exporta el esquema (cabeceras en CSV, columnas en Parquet/XLSX)
+        mode = dict(DEFAULT_SCORING, **(config or {}))['ranking_mode']
+        added = SCORE_COLUMNS[mode] + (('link_bonus',) if mode == 'score' and 'inlinks' in clean.columns else ())
+        ranked = clean.iloc[:0].assign(**{col: pd.Series(dtype=float) for col in added})
+    columns = [col for col in PRIORITY_COLUMNS if col in ranked.columns]
+    if not len(ranked):
+        yield ranked[columns]
+    for chunk in iter_chunks(ranked, rows):
+        yield chunk[columns]
+
+
+def on_page_frame(report):
+    """Una fila por URL analizada: campos on-page y, si se auditó, el peso de la página"""
+    rows = []
+    for url, metadata in report.get('on_page', {}).items():
+        row = {col: _flat(metadata.get(col)) for col in ON_PAGE_COLUMNS}
+        row['url'] = url
+        audit = report.get('assets', {}).get(url)
+        if audit is not None:
+            row['page_weight_bytes'] = audit['total_bytes']
+            row['assets'] = audit['assets']
+            row['assets_unknown'] = audit['unknown']
+            for kind, size in audit['by_kind'].items():
+                row[f'{kind}_bytes'] = size
+            row['heaviest_asset'] = audit['heaviest'][0]['url'] if audit['heaviest'] else None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def competitor_frame(report):
+    """Una fila por competidor y URL propia comparada"""
+    rows = []
+    for key, comparison in report.get('competitors', {}).items():
+        # Las comparativas por lotes van por (url, keyword)
+        url = comparison.get('url', key)
+        for rank, metadata in enumerate(comparison['competitors'], 1):
+            row = {'own_url': url, 'keyword': comparison['keyword'], 'rank': rank}
+            row.update({col: _flat(metadata.get(col)) for col in COMPETITOR_COLUMNS})
+            row['h2_tags'] = _flat(metadata.get('h2_tags') or [])
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def recommendation_frame(report):
+    """Textos generados: insight on-page, headings sugeridos y huecos de headings de las comparativas, por URL"""
+    rows = [{'url': url, 'type': 'insight', 'text': text} for url, text in report.get('insights', {}).items()]
+    for key, comparison in report.get('competitors', {}).items():
+        url = comparison.get('url', key)
+        if comparison.get('headings'):
+            rows.append({'url': url, 'type': 'headings', 'text': comparison['headings']})
+        if comparison.get('gaps'):
+            rows.append({'url': url, 'type': 'heading_gaps',
+                         'text': LIST_SEPARATOR.join(f"{heading} ({count})" for heading, count in comparison['gaps'])})
+    return pd.DataFrame(rows, columns=['url', 'type', 'text'])
+
+
+def report_tables(clean, config=None, report=None):
+    """{nombre: iterable de trozos}; las tablas vacías no se incluyen"""
+    tables = {'priorities': priority_chunks(clean, config)} if clean is not None else {}
+    report = report or {}
+    for name, build in (('on_page', on_page_frame), ('competitors', competitor_frame),
+                        ('recommendations', recommendation_frame)):
+        frame = build(report)
+        if len(frame):
+            tables[name] = [frame]
+    return tables
+
+
+def _write_csv(chunks, stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(text, index=False, header=header)
+        header = False
+    text.flush()
+    text.detach()
+
+
+def _write_parquet(chunks, stream):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(stream, table.schema, compression='zstd')
+            else:
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+        if writer is None:
+            # Sin trozos: un Parquet válido sin columnas en lugar de un fichero de 0 bytes
+            writer = pq.ParquetWriter(stream, pa.schema([]), compression='zstd')
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _xlsx_rows(chunk):
+    # Sin NaN/inf (xlsxwriter no los admite) y con tipos nativos de Python
+    chunk = chunk.replace([np.inf, -np.inf], np.nan).astype(object)
+    return chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def _write_xlsx(tables, path):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_urls': False})
+    try:
+        for name, chunks in tables.items():
+            sheet, row, part = None, 0, 1
+            for chunk in chunks:
+                if sheet is None and not len(chunk):
+                    # Tabla vacía: hoja solo con cabeceras
+                    sheet = workbook.add_worksheet(name[:28])
+                    sheet.write_row(0, 0, list(chunk.columns))
+                    row, part = 1, part + 1
+                for values in _xlsx_rows(chunk):
+                    if sheet is None or row == XLSX_MAX_ROWS:
+                        # Más filas de las que admite una hoja: se sigue en name_2, name_3…
+                        sheet = workbook.add_worksheet(name[:28] if part == 1 else f"{name[:28]}_{part}")
+                        sheet.write_row(0, 0, list(chunk.columns))
+                        row, part = 1, part + 1
+                    sheet.write_row(row, 0, values)
+                    row += 1
+    finally:
+        workbook.close()
+
+
+def export_filename(names, fmt):
+    """(nombre de fichero, mime) de la exportación de las tablas `names` en `fmt`"""
+    names = list(names)
+    if fmt == 'xlsx':
+        return 'export.xlsx', MIME_TYPES['xlsx']
+    if len(names) == 1:
+        return f"{names[0]}.{fmt}", MIME_TYPES[fmt]
+    return f"export-{fmt}.zip", MIME_TYPES['zip']
+
+
+def export_report(tables, fmt, target):
+    """Escribe las tablas en `target` (ruta o fichero binario). Devuelve (nombre sugerido, mime)"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+    with perf.stage(f'export_{fmt}'):
+        if fmt == 'xlsx':
+            if isinstance(target, (str, os.PathLike)):
+                _write_xlsx(tables, target)
+            else:
+                # constant_memory necesita un fichero en disco
+                with tempfile.TemporaryDirectory() as tmp:
+                    path = os.path.join(tmp, 'export.xlsx')
+                    _write_xlsx(tables, path)
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, target)
+            return export_filename(tables, fmt)
+
+        write = _write_csv if fmt == 'csv' else _write_parquet
+        if len(tables) == 1:
+            (name, chunks), = tables.items()
+            with (open(target, 'wb') if isinstance(target, (str, os.PathLike)) else contextlib.nullcontext(target)) as stream:
+                write(chunks, stream)
+            return export_filename(tables, fmt)
+
+        # Parquet ya va comprimido: en el zip se guarda sin recomprimir
+        compression = zipfile.ZIP_DEFLATED if fmt == 'csv' else zipfile.ZIP_STORED
+        with zipfile.ZipFile(target, 'w', compression=compression) as archive:
+            for name, chunks in tables.items():
+                with archive.open(f"{name}.{fmt}", 'w', force_zip64=True) as stream:
+                    write(chunks, stream)
+        return export_filename(tables, fmt)
+
+
+def main(argv=None):
+    from gsc import clean_gsc_data
+
+    parser = argparse.ArgumentParser(description="Exporta el ranking de prioridades de un CSV de GSC")
+    parser.add_argument('gsc_csv')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args(argv)
+
+    clean = clean_gsc_data(pd.read_csv(args.gsc_csv, encoding='utf-8', on_bad_lines='skip'))
+    if clean is None:
+        parser.error("El CSV no tiene columnas de posición y clicks reconocibles")
+    export_report(report_tables(clean), args.format, args.out)
+    print(args.out)
+
+
+if __name__ == '__main__':
+    main()
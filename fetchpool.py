@@ -0,0 +1,221 @@
+"""Pool de descargas compartido por todo el proceso, con reparto justo entre sesiones
+
+Todas las descargas de páginas (scraping, comparativas, crawl, sitemaps) pasan
+por CRP_FETCH_CONCURRENCY hilos (16 por defecto), en lugar de un pool de 5 por
+análisis: el número de hilos y de conexiones salientes no crece con los usuarios.
+
+Cada tarea pertenece a un propietario (la sesión de Streamlit que lanzó el
+trabajo, o el trabajo si no hay sesión) y los hilos libres atienden a los
+propietarios por turnos: una tarea de cada uno con trabajo pendiente. Un lote de
+200 URLs no retrasa más que una tarea a quien pide 10. cancel(owner) descarta lo
+que el propietario tenga en cola.
+
+El propietario se fija por hilo con activate() (como perf.activate); jobs.py lo
+hace al ejecutar cada trabajo.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+FETCH_CONCURRENCY = int(os.environ.get('CRP_FETCH_CONCURRENCY', 16))
+WAIT_WINDOW = 200
+MAX_IDLE_OWNERS = 256
+DEFAULT_OWNER = 'default'
+
+_local = threading.local()
+
+
+def activate(owner):
+    _local.owner = owner
+
+
+def current_owner():
+    return getattr(_local, 'owner', None) or DEFAULT_OWNER
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class OwnerStats:
+    __slots__ = ('queued', 'running', 'submitted', 'completed', 'cancelled', 'waits', 'last_seen')
+
+    def __init__(self):
+        self.queued = deque()
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.waits = deque(maxlen=WAIT_WINDOW)
+        self.last_seen = time.time()
+
+    def idle(self):
+        return not self.queued and not self.running
+
+
+class FairExecutor:
+    """Executor con un máximo global de hilos y colas por propietario atendidas en round-robin"""
+
+    def __init__(self, workers=FETCH_CONCURRENCY, name='fetch'):
+        self.workers = workers
+        self.name = name
+        self._lock = threading.Condition()
+        # Propietarios con tareas en cola, en orden de turno
+        self._ready = OrderedDict()
+        self._owners = OrderedDict()
+        self._threads = []
+        self._idle_threads = 0
+
+    def _owner(self, owner):
+        stats = self._owners.get(owner)
+        if stats is None:
+            stats = self._owners[owner] = OwnerStats()
+            # Solo se olvidan propietarios sin tareas, empezando por los más antiguos (nunca el que se acaba de crear)
+            idle = [o for o, s in self._owners.items() if s.idle() and o != owner]
+            for old in idle[:max(0, len(self._owners) - MAX_IDLE_OWNERS)]:
+                del self._owners[old]
+        stats.last_seen = time.time()
+        self._owners.move_to_end(owner)
+        return stats
+
+    def submit(self, fn, *args, **kwargs):
+        """Encola fn(*args, **kwargs) a nombre del propietario del hilo actual. Devuelve un Future"""
+        return self.submit_as(current_owner(), fn, *args, **kwargs)
+
+    def submit_as(self, owner, fn, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            stats = self._owner(owner)
+            stats.queued.append((future, fn, args, kwargs, time.perf_counter()))
+            stats.submitted += 1
+            self._ready[owner] = None
+            if self._idle_threads:
+                self._lock.notify()
+            elif len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'{self.name}-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return future
+
+    def submit_if_idle(self, fn, *args, **kwargs):
+        """Como submit(), pero solo si hay un hilo libre o se puede crear uno; si no, devuelve None sin encolar"""
+        with self._lock:
+            if self._ready or (not self._idle_threads and len(self._threads) >= self.workers):
+                return None
+            return self.submit_as(current_owner(), fn, *args, **kwargs)
+
+    def cancel(self, owner):
+        """Cancela las tareas en cola del propietario (las que ya corren terminan). Devuelve cuántas"""
+        with self._lock:
+            stats = self._owners.get(owner)
+            if stats is None:
+                return 0
+            cancelled = 0
+            while stats.queued:
+                if stats.queued.popleft()[0].cancel():
+                    cancelled += 1
+            stats.cancelled += cancelled
+            self._ready.pop(owner, None)
+        return cancelled
+
+    def _next(self):
+        """Siguiente tarea: la primera del propietario al que le toca; este pasa al final del turno"""
+        while self._ready:
+            owner = next(iter(self._ready))
+            stats = self._owners[owner]
+            task = stats.queued.popleft()
+            if stats.queued:
+                self._ready.move_to_end(owner)
+            else:
+                del self._ready[owner]
+            # Las canceladas con Future.cancel() siguen en la cola hasta aquí
+            if task[0].set_running_or_notify_cancel():
+                stats.running += 1
+                stats.waits.append(time.perf_counter() - task[4])
+                return owner, task
+            stats.cancelled += 1
+        return None, None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                owner, task = self._next()
+                while task is None:
+                    self._idle_threads += 1
+                    self._lock.wait()
+                    self._idle_threads -= 1
+                    owner, task = self._next()
+            future, fn, args, kwargs, _ = task
+            # Lo que la tarea envíe al pool (p. ej. peticiones hedged) va a nombre del mismo propietario
+            activate(owner)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            del future, fn, args, kwargs, task
+            with self._lock:
+                stats = self._owners.get(owner)
+                if stats is not None:
+                    stats.running -= 1
+                    stats.completed += 1
+
+    def stats(self):
+        """Totales: hilos, tareas en curso y en cola, y espera en cola (ms) de las últimas tareas"""
+        with self._lock:
+            waits = [w for stats in self._owners.values() for w in stats.waits]
+            return {
+                'workers': self.workers,
+                'threads': len(self._threads),
+                'running': sum(stats.running for stats in self._owners.values()),
+                'queued': sum(len(stats.queued) for stats in self._owners.values()),
+                'owners_waiting': len(self._ready),
+                'wait_p50_ms': round((_percentile(waits, 0.5) or 0) * 1000, 1),
+                'wait_p95_ms': round((_percentile(waits, 0.95) or 0) * 1000, 1),
+            }
+
+    def snapshot(self):
+        """Una fila por propietario: cola, en curso, completadas y espera en cola (ms)"""
+        with self._lock:
+            rows = []
+            for owner, stats in self._owners.items():
+                rows.append({
+                    'owner': owner,
+                    'queued': len(stats.queued),
+                    'running': stats.running,
+                    'completed': stats.completed,
+                    'cancelled': stats.cancelled,
+                    'wait_p50_ms': round((_percentile(stats.waits, 0.5) or 0) * 1000, 1),
+                    'wait_p95_ms': round((_percentile(stats.waits, 0.95) or 0) * 1000, 1),
+                    'wait_max_ms': round(max(stats.waits, default=0) * 1000, 1),
+                })
+        return sorted(rows, key=lambda r: r['queued'] + r['running'], reverse=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """Pool de descargas del proceso (los hilos se crean bajo demanda hasta FETCH_CONCURRENCY)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = FairExecutor()
+    return _pool
+
+
+def submit(fn, *args, **kwargs):
+    return pool().submit(fn, *args, **kwargs)
+
+
+def cancel(futures):
+    """Cancela los futures que aún no han empezado (al abandonar un lote a medias)"""
+    for future in futures:
+        future.cancel()
@@ -0,0 +1,311 @@
+"""Limpieza y scoring de exports de Google Search Console"""
+import threading
+import time
+import weakref
+import numpy as np
+import pandas as pd
+import perf
+
+def clean_number(val):
+    if pd.isna(val):
+        return 0
+    if isinstance(val, (int, float)):
+        return float(val)
+    val = str(val).strip().replace('%', '').replace(',', '')
+    try:
+        return float(val)
+    except:
+        return 0
+
+# Pesos, ventana de posiciones, umbral de clicks y bonificaciones del score (configurables desde la UI)
+DEFAULT_SCORING = {
+    'position_weight': 0.5,
+    'traffic_weight': 0.3,
+    'trend_weight': 0.2,
+    'position_min': 5,
+    'position_max': 20,
+    'click_threshold': 0.3,
+    'bonus_fell_page1': 30,
+    'bonus_position_loss': 15,
+    'bonus_traffic_loss': 10,
+    'bonus_orphan': 10,
+    'bonus_weak_links': 5,
+    'bonus_stale': 10,
+    'stale_days': 365,
+    # 'score' (heurístico) o 'click_gain' (clicks esperados al subir gain_positions puestos)
+    'ranking_mode': 'score',
+    'gain_positions': 3,
+}
+
+RANKING_MODES = ('score', 'click_gain')
+CTR_MAX_POSITION = 100
+# Impresiones a partir de las que el CTR observado de una posición pesa más que la curva ajustada
+CTR_PRIOR_IMPRESSIONS = 1000
+
+CLEAN_COLUMNS = ('url', 'position_current', 'position_previous', 'clicks_current', 'clicks_previous',
+                 'impressions_current', 'ctr_current', 'position_change', 'clicks_change', 'fell_from_page1')
+
+def clean_gsc_data(df):
+    """Columnas limpias y derivadas que no dependen de los pesos; se calcula una vez por CSV"""
+    df = df[~df.iloc[:, 0].astype(str).str.contains('Grand total|^total$', case=False, regex=True, na=False)]
+    df = df[df.iloc[:, 0].notna()]
+    
+    if len(df) == 0:
+        return None
+    
+    pos_cols = [col for col in df.columns if 'position' in col.lower()]
+    click_cols = [col for col in df.columns if 'click' in col.lower()]
+    imp_cols = [col for col in df.columns if 'impression' in col.lower()]
+    ctr_cols = [col for col in df.columns if 'ctr' in col.lower()]
+    
+    pos_cols = sorted(pos_cols, key=lambda x: 'previous' in x.lower())
+    click_cols = sorted(click_cols, key=lambda x: 'previous' in x.lower())
+    imp_cols = sorted(imp_cols, key=lambda x: 'previous' in x.lower())
+    ctr_cols = sorted(ctr_cols, key=lambda x: 'previous' in x.lower())
+    
+    if len(pos_cols) < 2 or len(click_cols) < 2:
+        return None
+    
+    with perf.stage('clean_number'):
+        clean = pd.DataFrame({'url': df.iloc[:, 0].to_numpy()})
+        clean['position_current'] = df[pos_cols[0]].apply(clean_number).to_numpy(dtype=float)
+        clean['position_previous'] = df[pos_cols[1]].apply(clean_number).to_numpy(dtype=float)
+        clean['clicks_current'] = df[click_cols[0]].apply(clean_number).to_numpy(dtype=float)
+        clean['clicks_previous'] = df[click_cols[1]].apply(clean_number).to_numpy(dtype=float)
+        clean['impressions_current'] = df[imp_cols[0]].apply(clean_number).to_numpy(dtype=float) if imp_cols else 0.0
+        clean['ctr_current'] = df[ctr_cols[0]].apply(clean_number).to_numpy(dtype=float) if ctr_cols else 0.0
+    
+    clean['position_change'] = clean['position_current'] - clean['position_previous']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        clean['clicks_change'] = ((clean['clicks_current'] - clean['clicks_previous']) / clean['clicks_previous']) * 100
+    clean['fell_from_page1'] = (clean['position_previous'] <= 10) & (clean['position_current'] > 10)
+    
+    return clean
+
+def rank_gsc_data(clean, config=None, top_k=None):
+    """Score y ranking en una pasada vectorizada sobre las columnas limpias. Devuelve (top_k filas, total)
+
+    Con top_k solo se ordenan las k mejores (np.argpartition), no todo el conjunto.
+    """
+    cfg = dict(DEFAULT_SCORING, **(config or {}))
+    if cfg['ranking_mode'] == 'click_gain':
+        return rank_by_click_gain(clean, cfg, top_k)
+    lo, hi = cfg['position_min'], cfg['position_max']
+    
+    pos = clean['position_current'].to_numpy()
+    clicks = clean['clicks_current'].to_numpy()
+    mask = (pos > 0) & (pos >= lo) & (pos <= hi) & (clicks > 0)
+    if not mask.any():
+        return None, 0
+    mask &= clicks >= clicks[mask].mean() * cfg['click_threshold']
+    idx = np.flatnonzero(mask)
+    if len(idx) == 0:
+        return None, 0
+    
+    pos, clicks = pos[idx], clicks[idx]
+    position_change = clean['position_change'].to_numpy()[idx]
+    clicks_change = clean['clicks_change'].to_numpy()[idx]
+    
+    position_score = (hi - pos) / (hi - lo) * 100 if hi > lo else np.full(len(idx), 100.0)
+    
+    if clicks.max() > clicks.min():
+        traffic_score = (clicks - clicks.min()) / (clicks.max() - clicks.min()) * 100
+    else:
+        traffic_score = np.full(len(idx), 50.0)
+    
+    # Con clicks_previous = 0 el cambio es inf/NaN: las comparaciones con NaN no suman nada
+    with np.errstate(invalid='ignore'):
+        trend_score = (50.0
+                       - np.where(position_change > 0, position_change * 5, 0)
+                       + np.where(clicks_change < 0, clicks_change * 0.3, 0)
+                       + np.where(position_change < 0, -position_change * 3, 0)
+                       + np.where(clicks_change > 0, clicks_change * 0.2, 0))
+    trend_score = np.clip(trend_score, 0, 100)
+    
+    weights = cfg['position_weight'] + cfg['traffic_weight'] + cfg['trend_weight']
+    score = (position_score * cfg['position_weight'] + traffic_score * cfg['traffic_weight']
+             + trend_score * cfg['trend_weight']) / (weights or 1)
+    
+    score += clean['fell_from_page1'].to_numpy()[idx] * cfg['bonus_fell_page1']
+    score += (position_change > 3) * cfg['bonus_position_loss']
+    with np.errstate(invalid='ignore'):
+        score += (clicks_change < -20) * cfg['bonus_traffic_loss']
+    
+    if 'content_age_days' in clean.columns:
+        # Sin lastmod (NaN) no hay bonificación
+        with np.errstate(invalid='ignore'):
+            score += (clean['content_age_days'].to_numpy()[idx] >= cfg['stale_days']) * cfg['bonus_stale']
+    
+    link_bonus = None
+    if 'inlinks' in clean.columns:
+        inlinks = clean['inlinks'].to_numpy()[idx]
+        link_bonus = np.where(inlinks == 0, cfg['bonus_orphan'],
+                              np.where((inlinks >= 1) & (inlinks <= 2), cfg['bonus_weak_links'], 0))
+        score += link_bonus
+    
+    order = _top_order(score, top_k)
+    ranked = clean.iloc[idx[order]].copy()
+    ranked['position_score'] = position_score[order]
+    ranked['traffic_score'] = traffic_score[order]
+    ranked['trend_score'] = trend_score[order]
+    ranked['score'] = score[order]
+    if link_bonus is not None:
+        ranked['link_bonus'] = link_bonus[order]
+    
+    return ranked, len(idx)
+
+def _top_order(score, top_k=None):
+    """Índices de `score` de mayor a menor; con top_k solo se ordenan los k primeros"""
+    with perf.stage('rank_top_k'):
+        if top_k and top_k < len(score):
+            top = np.argpartition(-score, top_k - 1)[:top_k]
+            return top[np.argsort(-score[top], kind='stable')]
+        return np.argsort(-score, kind='stable')
+
+def fit_ctr_curve(clean, max_position=CTR_MAX_POSITION, prior_impressions=CTR_PRIOR_IMPRESSIONS):
+    """Curva CTR (fracción) por posición del propio sitio: curve[p] para p = 1..max_position
+
+    CTR agregado (clicks/impresiones) por posición redondeada, suavizado hacia una
+    ley de potencia a·p^-b ajustada por mínimos cuadrados ponderados en log-log:
+    las posiciones con pocas impresiones se apoyan en la ley. Al final la curva se
+    fuerza a no crecer con la posición.
+    """
+    pos = clean['position_current'].to_numpy()
+    impressions = clean['impressions_current'].to_numpy()
+    valid = (pos >= 1) & (impressions > 0)
+    bucket = np.clip(np.rint(pos[valid]).astype(np.int64), 1, max_position)
+    clicks = np.minimum(clean['clicks_current'].to_numpy()[valid], impressions[valid])
+    bucket_impressions = np.bincount(bucket, weights=impressions[valid], minlength=max_position + 1)
+    bucket_clicks = np.bincount(bucket, weights=clicks, minlength=max_position + 1)
+    
+    positions = np.arange(max_position + 1, dtype=float)
+    positions[0] = 1.0
+    observed = np.divide(bucket_clicks, bucket_impressions, out=np.zeros(max_position + 1),
+                         where=bucket_impressions > 0)
+    fit = (bucket_clicks > 0) & (positions >= 1)
+    fit[0] = False
+    if fit.sum() >= 2:
+        slope, intercept = np.polyfit(np.log(positions[fit]), np.log(observed[fit]), 1,
+                                      w=np.sqrt(bucket_impressions[fit]))
+        prior = np.exp(intercept) * positions ** min(slope, 0.0)
+    else:
+        # Sin datos suficientes: curva genérica (~30% en la posición 1)
+        prior = 0.3 * positions ** -1.1
+    
+    credibility = bucket_impressions / (bucket_impressions + prior_impressions)
+    curve = np.clip(credibility * observed + (1 - credibility) * prior, 0.0, 1.0)
+    curve[0] = curve[1]
+    return np.minimum.accumulate(curve)
+
+_ctr_curves = {}
+_ctr_curves_lock = threading.Lock()
+
+def ctr_curve(clean):
+    """fit_ctr_curve cacheada por DataFrame limpio (una vez por upload, se libera con él)"""
+    key = id(clean)
+    with _ctr_curves_lock:
+        cached = _ctr_curves.get(key)
+    if cached is not None and cached[0]() is clean:
+        return cached[1]
+    with perf.stage('fit_ctr_curve'):
+        curve = fit_ctr_curve(clean)
+    with _ctr_curves_lock:
+        _ctr_curves[key] = (weakref.ref(clean, lambda _, key=key: _ctr_curves.pop(key, None)), curve)
+    return curve
+
+def expected_ctr(curve, positions):
+    """CTR esperado (fracción) en posiciones no enteras, interpolando la curva"""
+    return np.interp(np.clip(positions, 1, len(curve) - 1), np.arange(len(curve)), curve)
+
+def expected_click_gain(positions, impressions, curve, positions_up=3):
+    """(posición objetivo, CTR esperado actual, CTR esperado en el objetivo, clicks ganados por periodo)"""
+    target = np.maximum(positions - positions_up, 1.0)
+    now, then = expected_ctr(curve, positions), expected_ctr(curve, target)
+    return target, now, then, impressions * (then - now)
+
+def rank_by_click_gain(clean, config=None, top_k=None):
+    """Ranking por clicks esperados al subir gain_positions puestos, dentro de la ventana de posiciones
+
+    Mismo contrato que rank_gsc_data; `score` es la ganancia en clicks (no un 0-100).
+    """
+    cfg = dict(DEFAULT_SCORING, **(config or {}))
+    pos = clean['position_current'].to_numpy()
+    impressions = clean['impressions_current'].to_numpy()
+    mask = (pos >= 1) & (pos >= cfg['position_min']) & (pos <= cfg['position_max']) & (impressions > 0)
+    idx = np.flatnonzero(mask)
+    if len(idx) == 0:
+        return None, 0
+    
+    with perf.stage('click_gain'):
+        target, now, then, gain = expected_click_gain(pos[idx], impressions[idx], ctr_curve(clean),
+                                                      cfg['gain_positions'])
+    order = _top_order(gain, top_k)
+    ranked = clean.iloc[idx[order]].copy()
+    ranked['expected_ctr'] = now[order] * 100
+    ranked['target_position'] = target[order]
+    ranked['target_ctr'] = then[order] * 100
+    ranked['click_gain'] = gain[order]
+    ranked['score'] = gain[order]
+    return ranked, len(idx)
+
+def process_gsc_data(df, config=None):
+    clean = clean_gsc_data(df)
+    if clean is None:
+        return None
+    
+    with perf.stage('scoring'):
+        ranked, _ = rank_gsc_data(clean, config)
+    return ranked
+
+def insight_metrics(row):
+    """Métricas GSC de una fila del ranking en el formato que espera get_groq_insight"""
+    return {
+        'position': int(row['position_current']),
+        'position_change': f"{int(row['position_change']):+d}",
+        'clicks': int(row['clicks_current']),
+        'clicks_change': row['clicks_change'],
+        'impressions': int(row['impressions_current']),
+        'ctr': row['ctr_current']
+    }
+
+def add_link_metrics(df, link_graph):
+    """Añade inlinks y autoridad del grafo interno (la bonificación la aplica rank_gsc_data)"""
+    df = df.copy()
+    inlinks, authority, _ = link_graph.metrics_for(df['url'].tolist())
+    df['inlinks'] = inlinks
+    df['authority'] = authority
+    return df
+
+def add_content_age(df, lastmods, now=None):
+    """Añade lastmod (epoch) y antigüedad en días a partir de las fechas del sitemap (None = sin dato)"""
+    df = df.copy()
+    lastmod = np.array([np.nan if v is None else v for v in lastmods], dtype=float)
+    df['lastmod'] = lastmod
+    df['content_age_days'] = np.floor(((now or time.time()) - lastmod) / 86400)
+    return df
+
+def recommend_internal_links(current_url, all_results_df, n=3, link_graph=None):
+    other_urls = all_results_df[all_results_df['url'] != current_url].copy()
+    
+    # Con grafo: no sugerir destinos a los que la página ya enlaza
+    if link_graph is not None:
+        from crawler import normalize_url
+        already_linked = set(link_graph.links_from(current_url))
+        if already_linked:
+            other_urls = other_urls[~other_urls['url'].map(normalize_url).isin(already_linked)]
+    
+    if len(other_urls) == 0:
+        return []
+    
+    other_urls = other_urls.sort_values('score', ascending=False)
+    
+    recommendations = []
+    for idx, row in other_urls.head(n).iterrows():
+        recommendations.append({
+            'url': row['url'],
+            'position': int(row['position_current']),
+            'clicks': int(row['clicks_current']),
+            'score': round(row['score'], 1)
+        })
+    
+    return recommendations
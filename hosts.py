@@ -0,0 +1,253 @@
+"""Estado por host: percentiles de latencia, timeouts adaptativos, peticiones hedged y circuit breaker
+
+El estado se persiste en CRP_HOST_STATS (por defecto .host_stats.json) para que
+los hosts lentos o que nos bloquean se recuerden entre ejecuciones.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+import requests
+
+import fetchpool
+
+STATS_PATH = os.environ.get('CRP_HOST_STATS', '.host_stats.json')
+WINDOW = 50
+MIN_SAMPLES = 5
+MIN_TIMEOUT = 1.5
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 300
+BREAKER_MAX_COOLDOWN = 6 * 3600
+SAVE_INTERVAL = 30
+
+# Respuestas que indican bloqueo o saturación del host (un 404 no es culpa del host)
+BLOCKING_STATUS = (403, 429, 503)
+
+
+class CircuitOpen(requests.ConnectionError):
+    """El host tiene el circuito abierto: se falla sin hacer la petición"""
+
+
+class HostState:
+    __slots__ = ('latencies', 'successes', 'failures', 'consecutive_failures', 'opened_at', 'cooldown', 'trial_running')
+
+    def __init__(self):
+        self.latencies = deque(maxlen=WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.cooldown = BREAKER_COOLDOWN
+        self.trial_running = False
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def state(self, now=None):
+        if self.opened_at is None:
+            return 'closed'
+        if (now or time.time()) - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half-open'
+
+    def to_dict(self):
+        return {
+            'latencies': list(self.latencies), 'successes': self.successes, 'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures, 'opened_at': self.opened_at, 'cooldown': self.cooldown,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.latencies.extend(data.get('latencies', [])[-WINDOW:])
+        state.successes = data.get('successes', 0)
+        state.failures = data.get('failures', 0)
+        state.consecutive_failures = data.get('consecutive_failures', 0)
+        state.opened_at = data.get('opened_at')
+        state.cooldown = data.get('cooldown', BREAKER_COOLDOWN)
+        return state
+
+
+class HostRegistry:
+    def __init__(self, path=STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._dirty = False
+        self._last_save = time.time()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._hosts = {host: HostState.from_dict(d) for host, d in data.items()}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {host: state.to_dict() for host, state in self._hosts.items()}
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def _get(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState()
+        return state
+
+    def before_request(self, host):
+        """Lanza CircuitOpen si el host está bloqueado; en half-open deja pasar una sola petición de prueba"""
+        with self._lock:
+            state = self._get(host)
+            current = state.state()
+            if current == 'open':
+                remaining = state.cooldown - (time.time() - state.opened_at)
+                raise CircuitOpen(f"Circuito abierto para {host} ({remaining:.0f}s restantes)")
+            if current == 'half-open':
+                if state.trial_running:
+                    raise CircuitOpen(f"Circuito semiabierto para {host}: prueba en curso")
+                state.trial_running = True
+
+    def record(self, host, seconds, status=None, error=None, timed_out=False):
+        """Resultado de una petición. timed_out: `seconds` es una cota inferior de la latencia real
+
+        Los timeouts se guardan como muestras censuradas (al valor del timeout): si
+        el host se vuelve lento, el p95 y con él el timeout adaptativo pueden crecer.
+        """
+        failed = error is not None or status in BLOCKING_STATUS
+        with self._lock:
+            state = self._get(host)
+            state.trial_running = False
+            if timed_out:
+                state.latencies.append(seconds)
+            if failed:
+                state.failures += 1
+                state.consecutive_failures += 1
+                if state.opened_at is not None:
+                    # Falla la prueba en half-open: se reabre con cooldown doble
+                    state.cooldown = min(state.cooldown * 2, BREAKER_MAX_COOLDOWN)
+                    state.opened_at = time.time()
+                elif state.consecutive_failures >= BREAKER_THRESHOLD:
+                    state.opened_at = time.time()
+            else:
+                state.successes += 1
+                state.consecutive_failures = 0
+                state.opened_at = None
+                state.cooldown = BREAKER_COOLDOWN
+                state.latencies.append(seconds)
+            self._dirty = True
+            due = time.time() - self._last_save > SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def timeout_for(self, host, default):
+        """Timeout derivado de la latencia observada: 3 × p95, entre MIN_TIMEOUT y el timeout por defecto
+
+        Se duplica por cada fallo consecutivo: antes de que se abra el circuito, el
+        host tiene al menos un intento con (casi) el timeout por defecto.
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or len(state.latencies) < MIN_SAMPLES:
+                return default
+            p95 = state.percentile(0.95)
+            backoff = 2 ** state.consecutive_failures
+        return max(MIN_TIMEOUT, min(default, p95 * 3 * backoff))
+
+    def hedge_after(self, host):
+        """Segundos tras los que se lanza una petición duplicada (p95 del host), o None sin datos suficientes"""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or len(state.latencies) < MIN_SAMPLES:
+                return None
+            return state.percentile(0.95)
+
+    def snapshot(self):
+        with self._lock:
+            rows = []
+            for host, state in self._hosts.items():
+                total = state.successes + state.failures
+                rows.append({
+                    'host': host,
+                    'p50_s': round(state.percentile(0.5) or 0, 3),
+                    'p95_s': round(state.percentile(0.95) or 0, 3),
+                    'failure_rate': round(state.failures / total, 2) if total else 0.0,
+                    'breaker': state.state(),
+                })
+        return sorted(rows, key=lambda r: r['p95_s'], reverse=True)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = HostRegistry()
+            atexit.register(_registry.save)
+    return _registry
+
+
+def hedged_call(fn, hedge_after):
+    """Ejecuta fn(); si no termina en `hedge_after` segundos lanza un duplicado y devuelve el primero que acabe
+
+    Devuelve (resultado, hedged). Si ambos fallan se propaga el error del primero.
+    Las dos peticiones van al pool de descargas compartido (fetchpool), a nombre
+    del propietario actual, y solo si hay un hilo libre: sin hilos libres se
+    ejecuta aquí sin duplicado. Nunca se espera a una tarea que sigue en cola
+    (quien llama suele ser a su vez un hilo del pool).
+    """
+    if not hedge_after:
+        return fn(), False
+
+    executor = fetchpool.pool()
+    first = executor.submit_if_idle(fn)
+    if first is None:
+        return fn(), False
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result(), False
+    if first.cancel():
+        # Otra tarea ocupó el hilo libre y la petición sigue en cola
+        return fn(), False
+
+    second = executor.submit_if_idle(fn)
+    if second is None:
+        return first.result(), False
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.cancelled():
+                continue
+            if future.exception() is None:
+                # La petición perdedora sigue en segundo plano y su resultado se descarta
+                return future.result(), True
+            error = error or future.exception()
+        for future in list(pending):
+            if future.cancel():
+                pending.discard(future)
+    raise error
@@ -0,0 +1,582 @@
+"""Cola de trabajos en segundo plano respaldada por SQLite
+
+Los análisis largos (comparativa de competidores, crawl del sitio, sitemaps) se encolan
+en CRP_JOBS_DB (por defecto .jobs.sqlite3) y los ejecuta un pool de hilos del
+proceso del servidor, fuera del hilo del script de Streamlit. El progreso y los
+resultados parciales quedan en la base de datos, así que la UI puede consultar
+el estado en cada rerun y volver a engancharse a un trabajo tras recargar.
+
+Si el proceso muere con trabajos en curso, al arrancar de nuevo se reencolan
+(hasta MAX_ATTEMPTS) y los handlers retoman desde los resultados parciales.
+
+Cada trabajo puede tener un propietario (la sesión que lo lanzó): sus descargas
+se reparten por turnos con las de otros propietarios en el pool compartido de
+fetchpool y, con watch_owners(), se cancela si la sesión lleva más de
+ORPHAN_GRACE segundos cerrada.
+
+Varios procesos pueden compartir la base de datos (la app y `python -m api` en el
+mismo directorio). Los secretos solo viven en la memoria del proceso que lanzó el
+trabajo, así que cada proceso reclama solo sus trabajos y los de procesos sin
+latido (muertos). Un trabajo que necesitaba secretos y los ha perdido (su proceso
+se reinició) falla en lugar de ejecutarse sin ellos.
+"""
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+import fetchpool
+import perf
+
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+DB_PATH = os.environ.get('CRP_JOBS_DB', '.jobs.sqlite3')
+JOB_WORKERS = int(os.environ.get('CRP_JOB_WORKERS', 2))
+JOB_TTL = int(os.environ.get('CRP_JOBS_TTL', 7 * 24 * 3600))
+HEARTBEAT = 5
+STALE_AFTER = 60
+MAX_ATTEMPTS = 3
+ORPHAN_GRACE = int(os.environ.get('CRP_ORPHAN_GRACE', 30))
+
+ACTIVE = ('queued', 'running')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    result BLOB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat REAL,
+    process TEXT,
+    owner TEXT,
+    secret_keys TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS processes (
+    id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+COLUMNS = ('id', 'kind', 'params', 'status', 'done', 'total', 'message', 'error', 'attempts',
+           'created_at', 'started_at', 'finished_at')
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Registra la función que ejecuta los trabajos de tipo `kind`"""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras se ejecutaba"""
+
+
+class JobQueue:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        # Bases de datos creadas antes de las columnas por proceso
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        for column in ('process', 'owner', 'secret_keys'):
+            if column not in existing:
+                self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} TEXT')
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def submit(self, kind, params, process=None, owner=None, secret_keys=(), job_id=None):
+        """Encola un trabajo de `process` (solo él lo reclama mientras tenga latido)
+
+        secret_keys: nombres (nunca valores) de los secretos que necesita el trabajo.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        job_id = job_id or uuid.uuid4().hex[:12]
+        self._execute('INSERT INTO jobs (id, kind, params, status, created_at, process, owner, secret_keys) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                      (job_id, kind, json.dumps(params, ensure_ascii=False), 'queued', time.time(), process, owner,
+                       json.dumps(sorted(secret_keys))))
+        return job_id
+
+    def beat_process(self, process):
+        self._execute('INSERT OR REPLACE INTO processes (id, heartbeat) VALUES (?, ?)', (process, time.time()))
+
+    def claim(self, process=None):
+        """Pasa a 'running' el trabajo encolado más antiguo de `process` o de un proceso sin latido
+
+        Atómico entre hilos y procesos; el trabajo queda a nombre de `process`.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, heartbeat = ?, attempts = attempts + 1, process = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND (process IS NULL OR process = ? "
+                "OR process NOT IN (SELECT id FROM processes WHERE heartbeat >= ?)) ORDER BY created_at LIMIT 1) "
+                "AND status = 'queued' RETURNING id, kind, params, created_at, owner, secret_keys",
+                (now, now, process, process, now - STALE_AFTER)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'kind': row[1], 'params': json.loads(row[2]), 'created_at': row[3], 'owner': row[4],
+                'secret_keys': json.loads(row[5] or '[]')}
+
+    def progress(self, job_id, done, total, message=None):
+        """Actualiza el progreso; lanza JobCancelled si el trabajo ya no está en curso"""
+        cursor = self._execute(
+            "UPDATE jobs SET done = ?, total = ?, message = COALESCE(?, message), heartbeat = ? "
+            "WHERE id = ? AND status = 'running'",
+            (int(done), int(total), message, time.time(), job_id))
+        if cursor.rowcount == 0:
+            raise JobCancelled(job_id)
+
+    def heartbeat(self, job_ids):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'",
+                                   [(now, job_id) for job_id in job_ids])
+
+    def add_item(self, job_id, item):
+        """Guarda un resultado parcial (se conserva aunque el trabajo falle o se reinicie)"""
+        self._execute('INSERT INTO job_items (job_id, seq, data) '
+                      'SELECT ?, COALESCE(MAX(seq), -1) + 1, ? FROM job_items WHERE job_id = ?',
+                      (job_id, pickle.dumps(item), job_id))
+
+    def items(self, job_id):
+        rows = self._execute('SELECT data FROM job_items WHERE job_id = ? ORDER BY seq', (job_id,)).fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    def finish(self, job_id, result):
+        self._execute("UPDATE jobs SET status = 'done', result = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                      (pickle.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        self._execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                      (str(error)[:500], time.time(), job_id))
+
+    def cancel(self, job_id):
+        self._execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                      (time.time(), job_id))
+
+    def get(self, job_id):
+        if not job_id:
+            return None
+        row = self._execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def result(self, job_id):
+        row = self._execute("SELECT result FROM jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+        return pickle.loads(row[0]) if row and row[0] is not None else None
+
+    def recent(self, limit=10):
+        rows = self._execute(f"SELECT {', '.join(COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        jobs = [dict(zip(COLUMNS, row)) for row in rows]
+        for job in jobs:
+            job['params'] = json.loads(job['params'])
+        return jobs
+
+    def requeue_stale(self):
+        """Reencola trabajos 'running' sin latido (su proceso murió); tras MAX_ATTEMPTS se marcan como fallidos"""
+        limit = time.time() - STALE_AFTER
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'failed', error = 'Proceso interrumpido', finished_at = ? "
+                               "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                               (time.time(), limit, MAX_ATTEMPTS))
+            return self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND heartbeat < ?",
+                                      (limit,)).rowcount
+
+    def purge(self, older_than=JOB_TTL):
+        limit = time.time() - older_than
+        with self._lock:
+            self._conn.execute('DELETE FROM job_items WHERE job_id IN '
+                               "(SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?)", (limit,))
+            self._conn.execute("DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?", (limit,))
+            self._conn.execute('DELETE FROM processes WHERE heartbeat < ?', (limit,))
+
+
+class Job:
+    """Contexto que recibe un handler: parámetros, progreso, resultados parciales y secretos en memoria"""
+
+    def __init__(self, queue, job_id, params, secrets=None):
+        self.queue = queue
+        self.id = job_id
+        self.params = params
+        self.secrets = secrets or {}
+
+    def progress(self, done, total, message=None):
+        self.queue.progress(self.id, done, total, message)
+
+    def add_item(self, item):
+        self.queue.add_item(self.id, item)
+
+    def items(self):
+        return self.queue.items(self.id)
+
+
+class WorkerPool:
+    """Hilos que reclaman y ejecutan trabajos de la cola; uno más mantiene el latido de los que están en curso"""
+
+    def __init__(self, queue, workers=JOB_WORKERS):
+        self.queue = queue
+        self.workers = workers
+        self._wakeup = threading.Event()
+        self._running = set()
+        self._running_lock = threading.Lock()
+        # Secretos (API keys), recorder de perf y propietario por trabajo: solo en memoria, nunca en la base de datos
+        self._runtime = {}
+        self._threads = []
+        # Propietario vigente de cada trabajo activo (cambia si otra sesión se reengancha) y desde cuándo no está
+        self._owners = {}
+        self._orphaned = {}
+        self.owner_alive = None
+
+    def start(self):
+        self.queue.beat_process(PROCESS_ID)
+        self.queue.requeue_stale()
+        self.queue.purge()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._beat, name='job-heartbeat', daemon=True).start()
+        return self
+
+    def submit(self, kind, params, secrets=None, owner=None):
+        # El runtime se registra antes del INSERT: un worker puede reclamar el trabajo en cuanto existe
+        job_id = uuid.uuid4().hex[:12]
+        with self._running_lock:
+            self._runtime[job_id] = (secrets, perf.current(), owner)
+        try:
+            self.queue.submit(kind, params, PROCESS_ID, owner, [k for k, v in (secrets or {}).items() if v], job_id)
+        except Exception:
+            self._forget(job_id)
+            raise
+        self.adopt(job_id, owner)
+        self._wakeup.set()
+        return job_id
+
+    def adopt(self, job_id, owner):
+        """`owner` sigue el trabajo (p. ej. tras recargar la página): ya no se cancela por la sesión anterior"""
+        if owner:
+            with self._running_lock:
+                self._owners[job_id] = owner
+                self._orphaned.pop(job_id, None)
+
+    def _forget(self, job_id):
+        """Suelta lo que el proceso guarda de un trabajo que ya no se va a ejecutar aquí (secretos incluidos)"""
+        with self._running_lock:
+            self._runtime.pop(job_id, None)
+            self._owners.pop(job_id, None)
+            self._orphaned.pop(job_id, None)
+
+    def cancel(self, job_id):
+        """Cancela el trabajo; si nadie lo había reclamado, sus secretos salen de memoria ya"""
+        self.queue.cancel(job_id)
+        with self._running_lock:
+            self._runtime.pop(job_id, None)
+
+    def _sweep_runtime(self):
+        """Runtime de trabajos que salieron de ACTIVE sin llegar a _run (cancelados desde otro proceso, purgados)"""
+        with self._running_lock:
+            pending = list(self._runtime)
+        for job_id in pending:
+            job = self.queue.get(job_id)
+            if job is None or job['status'] not in ACTIVE:
+                with self._running_lock:
+                    self._runtime.pop(job_id, None)
+
+    def _reap(self):
+        """Cancela los trabajos cuyo propietario lleva más de ORPHAN_GRACE segundos sin sesión"""
+        if self.owner_alive is None:
+            return
+        now = time.time()
+        with self._running_lock:
+            owners = list(self._owners.items())
+        for job_id, owner in owners:
+            job = self.queue.get(job_id)
+            if job is None or job['status'] not in ACTIVE:
+                self._forget(job_id)
+                continue
+            if self.owner_alive(owner):
+                with self._running_lock:
+                    self._orphaned.pop(job_id, None)
+                continue
+            with self._running_lock:
+                orphan = now - self._orphaned.setdefault(job_id, now) > ORPHAN_GRACE
+            if orphan:
+                # El handler lo nota en el siguiente progress y sus descargas en cola se descartan
+                self.queue.cancel(job_id)
+                self._forget(job_id)
+
+    def _beat(self):
+        while True:
+            time.sleep(HEARTBEAT)
+            self.queue.beat_process(PROCESS_ID)
+            with self._running_lock:
+                running = list(self._running)
+            if running:
+                self.queue.heartbeat(running)
+            self.queue.requeue_stale()
+            self._reap()
+            self._sweep_runtime()
+
+    def _work(self):
+        while True:
+            job = self.queue.claim(PROCESS_ID)
+            if job is None:
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        with self._running_lock:
+            secrets, recorder, owner = self._runtime.pop(job['id'], (None, None, job['owner']))
+        perf.activate(recorder)
+        # Sin propietario el trabajo compite por turnos como uno más
+        fetchpool.activate(owner or f"job:{job['id']}")
+        with self._running_lock:
+            self._running.add(job['id'])
+        try:
+            missing = [key for key in job['secret_keys'] if not (secrets or {}).get(key)]
+            if missing:
+                # Lanzado por otro proceso o antes de un reinicio: sin la API key el resultado saldría vacío sin error
+                raise RuntimeError(f"Faltan los secretos del trabajo ({', '.join(missing)}): el proceso que lo "
+                                   "lanzó se reinició; vuelve a lanzarlo")
+            perf.current().add_stage('job_queue_wait', time.time() - job['created_at'])
+            with perf.stage(f"job:{job['kind']}"):
+                result = HANDLERS[job['kind']](Job(self.queue, job['id'], job['params'], secrets))
+            self.queue.finish(job['id'], result)
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.queue.fail(job['id'], e)
+        finally:
+            with self._running_lock:
+                self._running.discard(job['id'])
+            perf.activate(None)
+            fetchpool.activate(None)
+
+
+_queue = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """Pool de trabajos del proceso (se arranca con la primera llamada)"""
+    global _queue, _pool
+    with _pool_lock:
+        if _pool is None:
+            _queue = JobQueue()
+            _pool = WorkerPool(_queue).start()
+    return _pool
+
+
+def queue():
+    return pool().queue
+
+
+def submit(kind, params, secrets=None, owner=None):
+    return pool().submit(kind, params, secrets, owner)
+
+
+def adopt(job_id, owner):
+    pool().adopt(job_id, owner)
+
+
+def cancel(job_id):
+    pool().cancel(job_id)
+
+
+def watch_owners(owner_alive):
+    """Activa la cancelación de trabajos huérfanos: owner_alive(owner) -> False si su sesión ya no existe"""
+    pool().owner_alive = owner_alive
+
+
+@handler('competitors')
+def run_competitors(job):
+    """Scraping del top de competidores y recomendaciones de headings; retoma desde los parciales"""
+    from llm import get_heading_recommendations
+    from scraper import scrape_many, _normalize_page_url
+
+    urls = job.params['urls']
+    competitors = job.items()
+    scraped = {item['url'] for item in competitors}
+    pending = [url for url in urls if _normalize_page_url(url) not in scraped]
+    job.progress(len(competitors), len(urls))
+
+    for data in scrape_many(pending):
+        job.add_item(data)
+        competitors.append(data)
+        job.progress(len(competitors), len(urls), data['url'][:80])
+
+    # Reordenar para mantener orden original
+    order = [_normalize_page_url(url) for url in urls]
+    competitors.sort(key=lambda x: order.index(x['url']) if x['url'] in order else 999)
+
+    result = {'competitors': competitors, 'headings': None, 'headings_error': None}
+    api_key = job.secrets.get('groq_api_key')
+    if api_key:
+        try:
+            result['headings'] = get_heading_recommendations(job.params['keyword'], job.params['own']['metadata'],
+                                                             competitors, job.params['language'], api_key)
+        except Exception as e:
+            result['headings_error'] = str(e)
+    return result
+
+
+@handler('batch_competitors')
+def run_batch_competitors(job):
+    """Comparativa por lotes: SERPs espaciadas y cada página de la unión descargada una sola vez
+
+    Los parciales son ('serp', keyword, urls) y ('page', metadatos), así que al
+    reanudar no se repiten búsquedas ni descargas.
+    """
+    import batch
+    from scraper import scrape_many, _normalize_page_url
+
+    pairs = job.params['pairs']
+    serps, pages = {}, {}
+    for item in job.items():
+        if item[0] == 'serp':
+            serps[item[1]] = item[2]
+        else:
+            pages[item[1]['url']] = item[1]
+
+    keywords = list(dict.fromkeys(pair['keyword'] for pair in pairs))
+    pending_keywords = [keyword for keyword in keywords if keyword not in serps]
+    # Total provisional hasta conocer las SERPs: ~10 resultados por keyword
+    total = len(keywords) * 11 + len(pairs)
+    job.progress(len(serps), total)
+    for keyword, urls in batch.fetch_serps(pending_keywords, job.params.get('serp_interval')):
+        serps[keyword] = urls
+        job.add_item(('serp', keyword, urls))
+        job.progress(len(serps), total, keyword)
+
+    # Unión de competidores y páginas propias, normalizada como la devuelve scrape_many
+    union = list(dict.fromkeys(_normalize_page_url(url) for url in
+                               [pair['url'] for pair in pairs] + [url for urls in serps.values() for url in urls or []]))
+    pending = [url for url in union if url not in pages]
+    total = len(keywords) + len(union)
+    job.progress(len(keywords) + len(pages), total)
+    for data in scrape_many(pending):
+        pages[data['url']] = data
+        job.add_item(('page', data))
+        job.progress(len(keywords) + len(pages), total, data['url'][:80])
+
+    return {
+        'comparisons': batch.compare_pairs(pairs, serps, pages, _normalize_page_url),
+        'stats': batch.dedup_stats(pairs, serps, len(union)),
+    }
+
+
+@handler('crawl')
+def run_crawl(job):
+    """Crawl del propio sitio; devuelve el LinkGraph"""
+    from crawler import crawl_site
+
+    params = job.params
+    return crawl_site(params['domain'], seeds=params['seeds'], max_pages=params['max_pages'], progress=job.progress)
+
+
+@handler('sitemap')
+def run_sitemap(job):
+    """Ingesta de los sitemaps del dominio en la caché de lastmod"""
+    import sitemap
+
+    return sitemap.ingest(job.params['domain'], progress=job.progress)
+
+
+@handler('audit')
+def run_audit(job):
+    """Auditoría on-page de una URL; opcionalmente peso de página e insight del LLM (con métricas GSC)"""
+    from scraper import fetch_page, parse_page, _failed_metadata
+
+    params = job.params
+    steps = 1 + bool(params.get('assets')) + bool(params.get('metrics'))
+    job.progress(0, steps, params['url'][:80])
+    try:
+        url, html, info = fetch_page(params['url'])
+    except Exception as e:
+        return {'metadata': _failed_metadata(params['url'], e), 'assets': None, 'insight': None}
+    result = {'metadata': parse_page(url, html, params.get('domain'), info), 'assets': None, 'insight': None}
+    done = 1
+    job.progress(done, steps)
+
+    if params.get('assets'):
+        from assets import audit_page
+        result['assets'] = audit_page(url, html, html_bytes=info['bytes'])
+        done += 1
+        job.progress(done, steps)
+
+    api_key = job.secrets.get('groq_api_key')
+    if params.get('metrics') and api_key and result['metadata']['success']:
+        from llm import get_groq_insight
+        result['insight'] = get_groq_insight(url, params['metrics'], result['metadata'],
+                                             params.get('language', 'English'), api_key)
+        done += 1
+        job.progress(done, steps)
+    return result
+
+
+@handler('insights')
+def run_insights(job):
+    """Recomendaciones del LLM para muchas URLs: scraping por lotes y varias URLs por petición
+
+    Los parciales son los metadatos descargados; al reanudar solo se repiten las
+    llamadas al LLM.
+    """
+    from llm import get_groq_insights_packed
+    from scraper import scrape_many, _normalize_page_url
+
+    params = job.params
+    metrics = {_normalize_page_url(url): values for url, values in params['metrics'].items()}
+    pages = {metadata['url']: metadata for metadata in job.items()}
+    pending = [url for url in metrics if url not in pages]
+    total = len(metrics) + 1
+    job.progress(len(pages), total)
+    for metadata in scrape_many(pending, params.get('domain')):
+        pages[metadata['url']] = metadata
+        job.add_item(metadata)
+        job.progress(len(pages), total, metadata['url'][:80])
+
+    failed = {url: pages[url].get('error') or 'scrape' for url in metrics if not pages[url]['success']}
+    items = [(url, metrics[url], pages[url]) for url in metrics if url not in failed]
+    api_key = job.secrets.get('groq_api_key')
+    if not items or not api_key:
+        return {'insights': {}, 'failed': failed, 'stats': None}
+    insights, errors, stats = get_groq_insights_packed(items, params.get('language', 'English'), api_key,
+                                                       pack_size=params.get('pack_size'))
+    failed.update(errors)
+    job.progress(total, total)
+    return {'insights': insights, 'failed': failed, 'stats': stats}
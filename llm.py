@@ -0,0 +1,307 @@
+"""Llamadas a la API de Groq"""
+import json
+import os
+import re
+import time
+import perf
+import replay
+from texts import TEXTS_BY_LANGUAGE
+
+GROQ_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
+# URLs por petición en el modo empaquetado y reintentos de las que no validan
+PACK_SIZE = int(os.environ.get('CRP_LLM_PACK_SIZE', 8))
+PACK_RETRIES = 2
+# Tokens de salida por URL empaquetada (3 recomendaciones de una línea)
+PACK_TOKENS_PER_URL = 160
+
+def make_client(api_key, **kwargs):
+    """Cliente Groq; el SDK se importa aquí porque es lo más lento de cargar"""
+    from groq import Groq
+    return Groq(api_key=api_key, **kwargs)
+
+def groq_chat(client, prompt, temperature, max_tokens, model="llama-3.3-70b-versatile", response_format=None):
+    """Llamada a Groq instrumentada (tiempo, bytes y tokens)"""
+    start = time.perf_counter()
+    try:
+        payload = {
+            'messages': [{"role": "user", "content": prompt}],
+            'model': model,
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }
+        if response_format:
+            payload['response_format'] = response_format
+        chat_completion = replay.llm_call(payload, lambda: client.chat.completions.create(**payload))
+    except Exception as e:
+        perf.record_call('llm', GROQ_ENDPOINT, time.perf_counter() - start, nbytes=len(prompt.encode('utf-8')), error=str(e)[:200])
+        raise
+
+    content = chat_completion.choices[0].message.content or ""
+    usage = getattr(chat_completion, 'usage', None)
+    perf.record_call(
+        'llm', GROQ_ENDPOINT, time.perf_counter() - start,
+        nbytes=len(prompt.encode('utf-8')) + len(content.encode('utf-8')),
+        status=200,
+        replay=replay.mode(),
+        prompt_tokens=getattr(usage, 'prompt_tokens', None),
+        completion_tokens=getattr(usage, 'completion_tokens', None)
+    )
+    return chat_completion
+
+def insight_prompt(url, metrics, metadata, lang):
+    """Prompt de recomendaciones de una sola URL"""
+    if lang == "Español":
+        return f"""Eres un experto SEO. Analiza esta URL y genera 3 recomendaciones ESPECÍFICAS y ACCIONABLES en español:
+
+URL: {url}
+
+**Datos GSC:**
+- Posición: {metrics['position']} (cambio: {metrics['position_change']})
+- Clicks: {metrics['clicks']} (cambio: {metrics['clicks_change']}%)
+- CTR: {metrics['ctr']:.1f}%
+
+**Datos On-Page:**
+- Title: "{metadata['title']}" ({metadata['title_length']} caracteres)
+- Meta Description: ({metadata['description_length']} caracteres)
+- Word Count: {metadata['word_count']} palabras
+- H1: {metadata['h1_count']}, H2: {metadata['h2_count']}, H3: {metadata['h3_count']}
+- Schemas: {metadata['schemas_count']}
+- FAQs: {metadata['faqs_count']}
+- Enlaces internos en contenido: {metadata['internal_links']}
+
+Genera 3 recomendaciones concretas priorizadas por impacto. Cada una en 1 línea, formato:
+1. [Acción específica con número/dato]
+2. [Acción específica con número/dato]
+3. [Acción específica con número/dato]"""
+    else:
+        return f"""You are an SEO expert. Analyze this URL and generate 3 SPECIFIC and ACTIONABLE recommendations in English:
+
+URL: {url}
+
+**GSC Data:**
+- Position: {metrics['position']} (change: {metrics['position_change']})
+- Clicks: {metrics['clicks']} (change: {metrics['clicks_change']}%)
+- CTR: {metrics['ctr']:.1f}%
+
+**On-Page Data:**
+- Title: "{metadata['title']}" ({metadata['title_length']} characters)
+- Meta Description: ({metadata['description_length']} characters)
+- Word Count: {metadata['word_count']} words
+- H1: {metadata['h1_count']}, H2: {metadata['h2_count']}, H3: {metadata['h3_count']}
+- Schemas: {metadata['schemas_count']}
+- FAQs: {metadata['faqs_count']}
+- Internal links in content: {metadata['internal_links']}
+
+Generate 3 concrete recommendations prioritized by impact. Each in 1 line, format:
+1. [Specific action with number/data]
+2. [Specific action with number/data]
+3. [Specific action with number/data]"""
+
+def get_groq_insight(url, metrics, metadata, lang, api_key):
+    TEXTS = TEXTS_BY_LANGUAGE[lang]
+    if not api_key:
+        return TEXTS['api_key_required']
+    
+    try:
+        client = make_client(api_key)
+        prompt = insight_prompt(url, metrics, metadata, lang)
+        chat_completion = groq_chat(client, prompt, temperature=0.3, max_tokens=300)
+        return chat_completion.choices[0].message.content
+    except Exception as e:
+        if "invalid" in str(e).lower() or "unauthorized" in str(e).lower():
+            return TEXTS['api_key_invalid']
+        return f"Error: {str(e)}"
+
+PACKED_INSTRUCTIONS = {
+    "Español": """Eres un experto SEO. Para CADA URL de la lista JSON de abajo genera 3 recomendaciones ESPECÍFICAS y ACCIONABLES en español, priorizadas por impacto, cada una en 1 línea y con un número/dato concreto.
+
+Campos: pos (posición), pos_change (cambio de posición), clicks, clicks_change (%), ctr (%), title, title_len y desc_len (caracteres del title y de la meta description), words, h1/h2/h3 (nº de headings), schemas, faqs, links (enlaces internos en el contenido).
+
+Responde SOLO con un objeto JSON cuyas claves sean exactamente las URLs y cuyos valores sean listas de 3 cadenas:
+{"https://...": ["...", "...", "..."]}""",
+    "English": """You are an SEO expert. For EACH URL in the JSON list below generate 3 SPECIFIC and ACTIONABLE recommendations in English, prioritized by impact, each in 1 line and with a concrete number/data point.
+
+Fields: pos (position), pos_change (position change), clicks, clicks_change (%), ctr (%), title, title_len and desc_len (title and meta description characters), words, h1/h2/h3 (heading counts), schemas, faqs, links (internal links in content).
+
+Reply ONLY with a JSON object whose keys are exactly the URLs and whose values are lists of 3 strings:
+{"https://...": ["...", "...", "..."]}""",
+}
+
+JSON_OBJECT_RE = re.compile(r'\{.*\}', re.S)
+
+def estimate_tokens(text):
+    """Tokens aproximados (~4 caracteres por token) para comparar prompts sin tokenizador"""
+    return len(text) // 4 + 1
+
+def _packed_item(url, metrics, metadata):
+    return {
+        'url': url, 'pos': metrics['position'], 'pos_change': metrics['position_change'],
+        'clicks': metrics['clicks'], 'clicks_change': round(float(metrics['clicks_change']), 1),
+        'ctr': round(float(metrics['ctr']), 1), 'title': metadata['title'], 'title_len': metadata['title_length'],
+        'desc_len': metadata['description_length'], 'words': metadata['word_count'], 'h1': metadata['h1_count'],
+        'h2': metadata['h2_count'], 'h3': metadata['h3_count'], 'schemas': metadata['schemas_count'],
+        'faqs': metadata['faqs_count'], 'links': metadata['internal_links'],
+    }
+
+def packed_prompt(items, lang):
+    """Bloque de instrucciones fijo seguido de los datos de varias URLs en JSON compacto"""
+    data = [_packed_item(url, metrics, metadata) for url, metrics, metadata in items]
+    return PACKED_INSTRUCTIONS[lang] + "\n\nURLs:\n" + json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+def parse_packed(content, urls):
+    """Recomendaciones válidas de la respuesta JSON: {url: texto numerado}. Las URLs que faltan o no validan no se incluyen"""
+    match = JSON_OBJECT_RE.search(content or '')
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return {}
+    
+    valid = {}
+    for url in urls:
+        recommendations = data.get(url)
+        if not isinstance(recommendations, list):
+            continue
+        recommendations = [r.strip() for r in recommendations if isinstance(r, str) and r.strip()]
+        if len(recommendations) >= 3:
+            valid[url] = "\n".join(f"{i}. {text}" for i, text in enumerate(recommendations[:3], 1))
+    return valid
+
+def get_groq_insights_packed(items, lang, api_key, pack_size=None, retries=PACK_RETRIES, client=None):
+    """Recomendaciones de muchas URLs con PACK_SIZE URLs por petición y salida JSON validada
+
+    items: [(url, métricas, metadatos)]. Las URLs que no validan se vuelven a pedir
+    una a una (una URL problemática no vuelve a tumbar a las demás) hasta `retries`
+    veces. Devuelve ({url: texto}, {url: error}, estadísticas frente a una llamada
+    por URL). Los errores, también el de crear el cliente, quedan por URL.
+    """
+    pack_size = pack_size or PACK_SIZE
+    by_url = {url: (url, metrics, metadata) for url, metrics, metadata in items}
+    results, errors = {}, {}
+    stats = {'urls': len(by_url), 'requests': 0, 'retried_urls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+             'packed_prompt_tokens_est': 0,
+             'single_prompt_tokens_est': sum(estimate_tokens(insight_prompt(*item, lang)) for item in by_url.values())}
+    
+    pending = list(by_url)
+    if client is None:
+        try:
+            client = make_client(api_key)
+        except Exception as e:
+            # Clave vacía o rechazada por el SDK: error por URL, como un fallo de la petición
+            errors = {url: str(e) for url in pending}
+            pending = []
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+        if attempt:
+            stats['retried_urls'] += len(pending)
+        size = 1 if attempt else pack_size
+        failed = []
+        for start in range(0, len(pending), size):
+            pack = pending[start:start + size]
+            prompt = packed_prompt([by_url[url] for url in pack], lang)
+            stats['requests'] += 1
+            stats['packed_prompt_tokens_est'] += estimate_tokens(prompt)
+            try:
+                completion = groq_chat(client, prompt, temperature=0.3, max_tokens=PACK_TOKENS_PER_URL * len(pack) + 50,
+                                       response_format={'type': 'json_object'})
+            except Exception as e:
+                for url in pack:
+                    errors[url] = str(e)
+                failed.extend(pack)
+                continue
+            usage = getattr(completion, 'usage', None)
+            stats['prompt_tokens'] += getattr(usage, 'prompt_tokens', None) or 0
+            stats['completion_tokens'] += getattr(usage, 'completion_tokens', None) or 0
+            valid = parse_packed(completion.choices[0].message.content, pack)
+            results.update(valid)
+            for url in pack:
+                if url not in valid:
+                    errors[url] = 'invalid'
+                    failed.append(url)
+        pending = failed
+    
+    for url in results:
+        errors.pop(url, None)
+    stats['requests_saved'] = stats['urls'] - stats['requests'] if stats['requests'] else 0
+    stats['failed'] = len(errors)
+    tokens = stats['prompt_tokens'] + stats['completion_tokens']
+    stats['tokens_per_url'] = round(tokens / len(results), 1) if results and tokens else None
+    stats['prompt_tokens_saved_est'] = stats['single_prompt_tokens_est'] - stats['packed_prompt_tokens_est']
+    return results, errors, stats
+
+def get_heading_recommendations(keyword, metadata, competitors_metadata, lang, api_key):
+    """H2 que tienen los competidores y faltan en la página, filtrados por el LLM. Lanza la excepción de Groq si falla"""
+    all_competitor_h2 = []
+    for meta in competitors_metadata:
+        if meta['success'] and meta.get('h2_tags'):
+            all_competitor_h2.extend(meta['h2_tags'])
+
+    current_h2 = set([h.lower() for h in metadata['h2_tags']])
+
+    missing_h2_candidates = []
+    for h2 in all_competitor_h2:
+        h2_lower = h2.lower()
+        if h2_lower not in current_h2:
+            if h2 not in missing_h2_candidates:
+                missing_h2_candidates.append(h2)
+
+    if lang == "Español":
+        heading_prompt = f"""Eres un experto SEO. Analiza los headings FALTANTES en esta página comparando con la competencia.
+
+**Keyword objetivo:** {keyword}
+
+**H2 ACTUALES en la página (YA EXISTEN, NO recomendar):**
+{', '.join(metadata['h2_tags']) if metadata['h2_tags'] else 'Ninguno'}
+
+**H2 que tienen los COMPETIDORES pero TÚ NO TIENES:**
+{', '.join(missing_h2_candidates[:15]) if missing_h2_candidates else 'Los competidores no tienen H2 adicionales relevantes'}
+
+**INSTRUCCIÓN CRÍTICA:** 
+Solo recomienda H2 que:
+1. Los competidores SÍ tienen
+2. Tú NO tienes actualmente
+3. Son relevantes para la keyword "{keyword}"
+
+**NO recomiendes H2 que ya existen en la lista de "H2 ACTUALES".**
+
+Genera:
+**H2 FALTANTES recomendados (5-8 máximo):**
+1. [H2 que tienen competidores pero tú no]
+2. [H2 que tienen competidores pero tú no]
+...
+
+**Justificación:**
+Explica brevemente por qué estos H2 son importantes para cubrir la intención de búsqueda."""
+    else:
+        heading_prompt = f"""You are an SEO expert. Analyze the MISSING headings on this page compared to competitors.
+
+**Target keyword:** {keyword}
+
+**CURRENT H2s on the page (ALREADY EXIST, DO NOT recommend):**
+{', '.join(metadata['h2_tags']) if metadata['h2_tags'] else 'None'}
+
+**H2s that COMPETITORS have but YOU DON'T:**
+{', '.join(missing_h2_candidates[:15]) if missing_h2_candidates else 'Competitors do not have additional relevant H2s'}
+
+**CRITICAL INSTRUCTION:** 
+Only recommend H2s that:
+1. Competitors DO have
+2. You DON'T currently have
+3. Are relevant to the keyword "{keyword}"
+
+**DO NOT recommend H2s that already exist in the "CURRENT H2s" list.**
+
+Generate:
+**MISSING H2s recommended (5-8 maximum):**
+1. [H2 competitors have but you don't]
+2. [H2 competitors have but you don't]
+...
+
+**Justification:**
+Briefly explain why these H2s are important to cover search intent."""
+
+    client = make_client(api_key)
+    chat_completion = groq_chat(client, heading_prompt, temperature=0.4, max_tokens=800)
+    return chat_completion.choices[0].message.content
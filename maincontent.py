@@ -0,0 +1,180 @@
+"""Contenido principal de una página: bloques puntuados por densidad de texto y de enlaces
+
+Un solo recorrido del DOM, sin decompose(): el soup queda intacto para el resto
+de extracciones (schemas, imágenes). Cada bloque con texto propio (p, li, h2, td,
+un div con texto directo…) cuenta como contenido salvo que sea boilerplate: está
+dentro de nav/footer/aside/form o de un elemento marcado como tal por role,
+class o id, o más de MAX_LINK_DENSITY de sus palabras son texto de enlaces. El
+contenedor principal es el elemento más profundo que reúne al menos COVERAGE de
+las palabras de contenido de la página (donde el texto está concentrado); de él
+salen el word count, los H2/H3 y los enlaces internos.
+"""
+from bs4 import NavigableString
+from bs4.element import PreformattedString
+
+MAX_LINK_DENSITY = 0.5
+# Mayor que 0.5: los elementos que la cumplen forman una sola cadena de ancestros
+COVERAGE = 0.6
+
+SKIP_TAGS = frozenset(('head', 'title', 'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'object'))
+BOILERPLATE_TAGS = frozenset(('nav', 'footer', 'aside', 'form'))
+BOILERPLATE_ROLES = frozenset(('navigation', 'contentinfo', 'complementary', 'search'))
+# Tokens completos de class/id ("sidebar" sí, "has-sidebar" no); nunca se aplican a body/main/article
+BOILERPLATE_TOKENS = frozenset(('sidebar', 'widget', 'widgets', 'comment', 'comments', 'menu', 'navbar', 'footer',
+                                'share', 'sharing', 'social', 'related', 'breadcrumb', 'breadcrumbs', 'cookie',
+                                'cookies', 'newsletter', 'subscribe', 'advert', 'ads'))
+NEVER_BOILERPLATE = frozenset(('html', 'body', 'main', 'article'))
+# El texto de estas etiquetas pertenece al bloque que las contiene
+INLINE_TAGS = frozenset(('a', 'abbr', 'b', 'bdi', 'bdo', 'br', 'cite', 'code', 'data', 'del', 'dfn', 'em', 'font',
+                         'i', 'img', 'ins', 'kbd', 'label', 'mark', 'picture', 'q', 's', 'samp', 'small', 'source',
+                         'span', 'strike', 'strong', 'sub', 'sup', 'time', 'tt', 'u', 'var', 'wbr', 'button',
+                         'input', 'select', 'option', 'textarea'))
+HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3}
+
+
+class _Block:
+    __slots__ = ('tag', 'parent', 'boilerplate', 'heading', 'start', 'end', 'words', 'link_words', 'good', 'bad',
+                 'content', 'text')
+
+    def __init__(self, tag, parent, boilerplate, start):
+        self.tag = tag
+        self.parent = parent
+        self.boilerplate = boilerplate
+        self.heading = HEADING_LEVELS.get(tag.name)
+        self.start = start
+        self.end = None
+        # Palabras propias (texto directo o en etiquetas inline) y cuántas están dentro de <a>
+        self.words = 0
+        self.link_words = 0
+        # Palabras de contenido y de boilerplate de todo el subárbol
+        self.good = 0
+        self.bad = 0
+        self.content = False
+        self.text = [] if self.heading else None
+
+
+def _is_boilerplate(tag):
+    if tag.name in BOILERPLATE_TAGS:
+        return True
+    if tag.name in NEVER_BOILERPLATE:
+        return False
+    attrs = tag.attrs
+    if not attrs:
+        return False
+    if attrs.get('role') in BOILERPLATE_ROLES:
+        return True
+    classes = attrs.get('class') or ()
+    if isinstance(classes, str):
+        classes = classes.split()
+    ident = attrs.get('id')
+    return any(token.lower() in BOILERPLATE_TOKENS for token in classes) or (
+        isinstance(ident, str) and ident.lower() in BOILERPLATE_TOKENS)
+
+
+def _is_internal(href, target_domain):
+    return target_domain in href or (href.startswith('/') and not href.startswith('//'))
+
+
+def _describe(tag):
+    if tag.get('id'):
+        return f"{tag.name}#{tag['id']}"
+    if tag.get('class'):
+        return f"{tag.name}.{'.'.join(tag['class'])}"
+    return tag.name
+
+
+def extract_main_content(soup, target_domain=None):
+    """Word count, headings y enlaces internos del contenido principal, en tiempo lineal
+
+    H1: de toda la página salvo boilerplate (suele ir en la cabecera, fuera del
+    artículo). H2/H3, palabras y enlaces internos: del contenedor principal y
+    solo de sus bloques de contenido (sin listas de enlaces ni widgets).
+    """
+    root = soup.body or soup
+    top = _Block(root, None, False, 0)
+    headings, links = [], []
+    seq = 1
+    # Candidatos a contenedor en post-orden (cada uno antes que sus ancestros)
+    candidates = []
+    # (iterador de hijos, bloque que se cierra al agotarlo o None, bloque al que va el texto, dentro de <a>)
+    stack = [(iter(root.contents), top, top, False)]
+
+    while stack:
+        children, closing, block, in_link = stack[-1]
+        node = next(children, None)
+        if node is None:
+            stack.pop()
+            if closing is None:
+                continue
+            block = closing
+            block.end = seq
+            if block.words:
+                if block.boilerplate or (not block.heading and block.link_words > block.words * MAX_LINK_DENSITY):
+                    block.bad += block.words
+                else:
+                    block.good += block.words
+                    block.content = True
+            if block.parent is not None:
+                block.parent.good += block.good
+                block.parent.bad += block.bad
+            if not block.boilerplate and not block.heading:
+                candidates.append(block)
+            continue
+
+        if isinstance(node, NavigableString):
+            if isinstance(node, PreformattedString):
+                continue
+            count = len(node.split())
+            if count:
+                block.words += count
+                if in_link:
+                    block.link_words += count
+                if block.text is not None:
+                    block.text.append(node.strip())
+            continue
+
+        name = node.name
+        if name in SKIP_TAGS:
+            continue
+        link = in_link
+        if name == 'a':
+            link = True
+            href = node.get('href')
+            if href:
+                links.append((seq, href, block))
+                seq += 1
+        if name in INLINE_TAGS:
+            stack.append((iter(node.contents), None, block, link))
+            continue
+        child = _Block(node, block, block.boilerplate or _is_boilerplate(node), seq)
+        seq += 1
+        if child.heading:
+            headings.append(child)
+        stack.append((iter(node.contents), child, child, link))
+
+    threshold = COVERAGE * top.good
+    container = next((block for block in candidates if block.good and block.good >= threshold), top)
+
+    def scoped(position):
+        return container.start <= position < container.end
+
+    h_tags = {1: [], 2: [], 3: []}
+    for heading in headings:
+        text = " ".join(heading.text)
+        if text and not heading.boilerplate and (heading.heading == 1 or scoped(heading.start)):
+            h_tags[heading.heading].append(text)
+
+    internal_links = 0
+    if target_domain:
+        internal_links = sum(1 for position, href, block in links
+                             if block.content and scoped(position) and _is_internal(href, target_domain))
+
+    return {
+        'word_count': container.good,
+        'h1_tags': h_tags[1],
+        'h2_tags': h_tags[2],
+        'h3_tags': h_tags[3],
+        'internal_links': internal_links,
+        'container': _describe(container.tag) if container.tag is not soup else 'document',
+        'page_words': top.good + top.bad,
+    }
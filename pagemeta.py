@@ -0,0 +1,135 @@
+"""Metadatos on-page de una URL: registro compacto con un único esquema para éxito y fallo
+
+PageMetadata reemplaza al dict de 20+ claves que devolvía el scraper. Usa
+__slots__ (sin __dict__ por instancia), los contadores (h1_count, schemas_count…)
+se derivan de las listas y se serializa como tupla de campos en marshal, formato que
+también usa pickle, así que la cola de trabajos y el pool de parseo mueven bytes compactos.
+Sigue admitiendo el acceso tipo dict (meta['title'], meta.get('truncated')).
+"""
+import marshal
+
+FORMAT_VERSION = 1
+MARSHAL_VERSION = 4
+
+STR_FIELDS = ('url', 'error', 'title', 'description')
+INT_FIELDS = ('title_length', 'description_length', 'word_count', 'images_total', 'images_without_alt',
+              'internal_links', 'bytes')
+FLAG_FIELDS = ('success', 'truncated', 'aborted')
+LIST_FIELDS = ('h1_tags', 'h2_tags', 'h3_tags', 'schemas', 'faqs')
+FIELDS = STR_FIELDS + INT_FIELDS + FLAG_FIELDS + LIST_FIELDS
+
+# Orden de las claves del dict histórico (to_dict / keys)
+KEYS = ('success', 'url', 'error', 'title', 'title_length', 'description', 'description_length',
+        'h1_count', 'h1_tags', 'h2_count', 'h2_tags', 'h3_count', 'h3_tags', 'word_count',
+        'images_total', 'images_without_alt', 'schemas', 'schemas_count', 'faqs_count', 'faqs',
+        'internal_links', 'bytes', 'truncated', 'aborted')
+_KEY_SET = frozenset(KEYS)
+_SETTABLE = frozenset(FIELDS)
+_VERSION_BYTE = bytes([FORMAT_VERSION])
+
+
+class PageMetadata:
+    __slots__ = FIELDS
+
+    def __init__(self, url, success=True, error='', title='', title_length=0, description='',
+                 description_length=0, h1_tags=(), h2_tags=(), h3_tags=(), word_count=0,
+                 images_total=0, images_without_alt=0, schemas=(), faqs=(), internal_links=0,
+                 bytes=0, truncated=False, aborted=False):
+        self.url = url
+        self.success = success
+        self.error = error
+        self.title = title
+        self.title_length = title_length
+        self.description = description
+        self.description_length = description_length
+        self.h1_tags = list(h1_tags)
+        self.h2_tags = list(h2_tags)
+        self.h3_tags = list(h3_tags)
+        self.word_count = word_count
+        self.images_total = images_total
+        self.images_without_alt = images_without_alt
+        self.schemas = list(schemas)
+        self.faqs = list(faqs)
+        self.internal_links = internal_links
+        self.bytes = bytes
+        self.truncated = truncated
+        self.aborted = aborted
+
+    @classmethod
+    def failed(cls, url, error, aborted=False):
+        """Mismo esquema que un éxito, con los campos vacíos"""
+        return cls(url, success=False, error=str(error), aborted=aborted)
+
+    @property
+    def h1_count(self):
+        return len(self.h1_tags)
+
+    @property
+    def h2_count(self):
+        return len(self.h2_tags)
+
+    @property
+    def h3_count(self):
+        return len(self.h3_tags)
+
+    @property
+    def schemas_count(self):
+        return len(self.schemas)
+
+    @property
+    def faqs_count(self):
+        return len(self.faqs)
+
+    # Acceso tipo dict para el código que trata los metadatos como diccionario
+    def __getitem__(self, key):
+        if key not in _KEY_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in _SETTABLE:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in _KEY_SET
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in _KEY_SET else default
+
+    def keys(self):
+        return KEYS
+
+    def to_dict(self):
+        """Dict con el esquema histórico (JSON, parámetros de trabajos)"""
+        return {key: getattr(self, key) for key in KEYS}
+
+    def __eq__(self, other):
+        if not isinstance(other, PageMetadata):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in FIELDS)
+
+    def __repr__(self):
+        status = 'ok' if self.success else f'error={self.error!r}'
+        return f"PageMetadata({self.url!r}, {status}, words={self.word_count})"
+
+    def to_bytes(self):
+        """Byte de versión + tupla de campos en marshal (C, sin nombres de clave ni contadores)"""
+        return _VERSION_BYTE + marshal.dumps(tuple([getattr(self, name) for name in FIELDS]), MARSHAL_VERSION)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:1] != _VERSION_BYTE:
+            raise ValueError(f"Versión de PageMetadata no soportada: {data[:1]!r}")
+        meta = cls.__new__(cls)
+        for name, value in zip(FIELDS, marshal.loads(memoryview(data)[1:])):
+            setattr(meta, name, value)
+        return meta
+
+    def __reduce__(self):
+        # pickle (cola de trabajos, IPC con el pool de parseo) usa el formato binario
+        return (_from_bytes, (self.to_bytes(),))
+
+
+def _from_bytes(data):
+    return PageMetadata.from_bytes(data)
@@ -0,0 +1,228 @@
+"""Instrumentación de rendimiento: tiempos por etapa, llamadas externas y profiling opcional"""
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+MAX_CALLS = 500
+
+
+class PerfRecorder:
+    """Acumula tiempos por etapa y un registro de llamadas externas (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.calls = deque(maxlen=MAX_CALLS)
+        self.profile_report = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds, count=1):
+        with self._lock:
+            entry = self.stages.setdefault(name, {'count': 0, 'total_s': 0.0, 'max_s': 0.0})
+            entry['count'] += count
+            entry['total_s'] += seconds
+            entry['max_s'] = max(entry['max_s'], seconds)
+
+    def record_call(self, kind, url, seconds, nbytes=0, status=None, error=None, **extra):
+        call = {
+            'kind': kind,
+            'host': urlparse(url).netloc if '://' in url else url,
+            'url': url[:200],
+            'seconds': round(seconds, 4),
+            'bytes': int(nbytes or 0),
+            'status': status,
+            'error': error,
+            'ts': time.time(),
+        }
+        call.update(extra)
+        with self._lock:
+            self.calls.append(call)
+        self.add_stage(f"call:{kind}", seconds)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.calls.clear()
+            self.profile_report = None
+
+    def summary(self):
+        with self._lock:
+            stages = [
+                {'stage': name, 'count': s['count'], 'total_s': round(s['total_s'], 4),
+                 'mean_ms': round(s['total_s'] / s['count'] * 1000, 2) if s['count'] else 0.0,
+                 'max_ms': round(s['max_s'] * 1000, 2)}
+                for name, s in self.stages.items()
+            ]
+            calls = list(self.calls)
+
+        hosts = {}
+        for call in calls:
+            h = hosts.setdefault(call['host'], {'host': call['host'], 'calls': 0, 'bytes': 0, 'total_s': 0.0, 'errors': 0})
+            h['calls'] += 1
+            h['bytes'] += call['bytes']
+            h['total_s'] = round(h['total_s'] + call['seconds'], 4)
+            h['errors'] += 1 if call['error'] else 0
+
+        return {
+            'stages': sorted(stages, key=lambda s: s['total_s'], reverse=True),
+            'hosts': sorted(hosts.values(), key=lambda h: h['total_s'], reverse=True),
+            'calls': calls,
+            'profile': self.profile_report,
+        }
+
+    def to_json(self):
+        return json.dumps(self.summary(), ensure_ascii=False, indent=2, default=str)
+
+
+class _NullRecorder:
+    """Recorder vacío cuando la instrumentación no está activa en el hilo"""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add_stage(self, *args, **kwargs):
+        pass
+
+    def record_call(self, *args, **kwargs):
+        pass
+
+
+_NULL = _NullRecorder()
+_local = threading.local()
+
+
+def activate(recorder):
+    _local.recorder = recorder
+
+
+def current():
+    return getattr(_local, 'recorder', None) or _NULL
+
+
+def stage(name):
+    return current().stage(name)
+
+
+def record_call(kind, url, seconds, **kwargs):
+    current().record_call(kind, url, seconds, **kwargs)
+
+
+def bind(fn):
+    """Propaga el recorder del hilo actual a funciones ejecutadas en un ThreadPoolExecutor"""
+    recorder = current()
+
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'recorder', None)
+        _local.recorder = recorder
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.recorder = previous
+
+    return wrapper
+
+
+class Profiler:
+    """Profiler opcional para una ejecución: 'cprofile' (determinista) o 'sampling' (muestreo de pila)"""
+
+    def __init__(self, mode='cprofile', interval=0.005, top=30):
+        self.mode = mode
+        self.interval = interval
+        self.top = top
+        self._profile = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._samples = Counter()
+        self._total = 0
+
+    def start(self):
+        if self.mode == 'sampling':
+            target = threading.get_ident()
+            self._thread = threading.Thread(target=self._sample, args=(target,), daemon=True)
+            self._thread.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def _sample(self, target):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                break
+            # Cuenta cada función presente en la pila (tiempo inclusivo)
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+                if key not in seen:
+                    self._samples[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+            self._total += 1
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(self.top)
+            self._profile = None
+            return out.getvalue()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            lines = [f"{self._total} samples @ {self.interval * 1000:.0f}ms"]
+            for key, n in self._samples.most_common(self.top):
+                lines.append(f"{n / max(self._total, 1) * 100:6.1f}%  {key}")
+            return "\n".join(lines)
+        return None
+
+
+def begin_run(state, profile_mode=None):
+    """Activa el recorder de la sesión para esta ejecución del script y arranca el profiler si se pidió"""
+    recorder = state.get('perf_recorder')
+    if recorder is None:
+        recorder = state['perf_recorder'] = PerfRecorder()
+
+    # Un profiler colgado de una ejecución interrumpida (st.rerun) se cierra aquí
+    pending = state.pop('perf_profiler', None)
+    if pending is not None:
+        recorder.profile_report = pending.stop()
+
+    if profile_mode:
+        state['perf_profiler'] = Profiler(profile_mode).start()
+
+    state['perf_run_start'] = time.perf_counter()
+    activate(recorder)
+    return recorder
+
+
+def end_run(state):
+    recorder = state.get('perf_recorder')
+    if recorder is None:
+        return None
+
+    start = state.pop('perf_run_start', None)
+    if start is not None:
+        recorder.add_stage('script_run', time.perf_counter() - start)
+
+    profiler = state.pop('perf_profiler', None)
+    if profiler is not None:
+        recorder.profile_report = profiler.stop()
+    return recorder
@@ -0,0 +1,232 @@
+"""Modo record/replay para todo el tráfico HTTP y LLM saliente
+
+Configuración por variables de entorno (o configure()):
+    CRP_HTTP_MODE       off | record | replay
+    CRP_REPLAY_DIR      directorio del almacén (por defecto .replay/)
+    CRP_REPLAY_LATENCY  segundos de latencia simulada en replay, o 'recorded'
+                        para reproducir la duración original de cada respuesta
+
+Las respuestas se guardan comprimidas (gzip) y direccionadas por contenido:
+blobs/<sha256> contiene el cuerpo y index/<clave>.json apunta al blob con
+status, cabeceras y duración. Cuerpos idénticos se guardan una sola vez.
+Las respuestas que quien llama rechaza con una excepción (p. ej. contenido no
+HTML) se graban con esa excepción y en replay se vuelve a lanzar la misma.
+"""
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+KEPT_HEADERS = ('content-type', 'last-modified', 'etag', 'location', 'content-length', 'content-range')
+
+
+class ReplayMiss(requests.ConnectionError):
+    """No hay respuesta grabada para la petición en modo replay"""
+
+
+class ReplayStore:
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def put_blob(self, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = os.path.join(self.path, 'blobs', digest[:2], digest + '.gz')
+        if not os.path.exists(path):
+            self._write(path, gzip.compress(body, compresslevel=6))
+        return digest
+
+    def get_blob(self, digest):
+        with open(os.path.join(self.path, 'blobs', digest[:2], digest + '.gz'), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def put(self, key, entry, body=b''):
+        entry = dict(entry, blob=self.put_blob(body), recorded_at=time.time())
+        self._write(os.path.join(self.path, 'index', key + '.json'), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.path, 'index', key + '.json'), encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None, None
+        return entry, self.get_blob(entry['blob'])
+
+    def stats(self):
+        sizes = {'entries': 0, 'blobs': 0, 'blob_bytes': 0}
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith('.json'):
+                    sizes['entries'] += 1
+                elif name.endswith('.gz'):
+                    sizes['blobs'] += 1
+                    sizes['blob_bytes'] += os.path.getsize(os.path.join(root, name))
+        return sizes
+
+
+_config = {
+    'mode': os.environ.get('CRP_HTTP_MODE', 'off'),
+    'path': os.environ.get('CRP_REPLAY_DIR', '.replay'),
+    'latency': os.environ.get('CRP_REPLAY_LATENCY', '0'),
+}
+_store = None
+
+
+def configure(mode=None, path=None, latency=None):
+    global _store
+    if mode is not None:
+        _config['mode'] = mode
+    if path is not None:
+        _config['path'] = path
+    if latency is not None:
+        _config['latency'] = str(latency)
+    _store = None
+
+
+def mode():
+    return _config['mode']
+
+
+def store():
+    global _store
+    if _store is None:
+        _store = ReplayStore(_config['path'])
+    return _store
+
+
+def _simulate_latency(entry):
+    latency = _config['latency']
+    if latency == 'recorded':
+        time.sleep(entry.get('elapsed', 0))
+    elif float(latency) > 0:
+        time.sleep(float(latency))
+
+
+def _http_key(method, url, params=None, data=None):
+    # El User-Agent es aleatorio: no forma parte de la clave
+    return store().key('http', method.upper(), url, params or {}, data)
+
+
+def http_get(url, live_get=requests.get, method='GET', **kwargs):
+    """requests.get con record/replay. Devuelve un requests.Response en los tres modos
+
+    `method` solo distingue la grabación (p. ej. 'HEAD' con live_get=requests.head).
+    """
+    current = mode()
+    if current == 'off':
+        return live_get(url, **kwargs)
+
+    key = _http_key(method, url, kwargs.get('params'))
+    if current == 'replay':
+        entry, body = store().get(key)
+        if entry is None:
+            raise ReplayMiss(f"Sin grabación para {method} {url}")
+        _simulate_latency(entry)
+        response = _response(entry, body)
+        if entry.get('error'):
+            raise _recorded_error(entry['error'], response)
+        return response
+
+    start = time.perf_counter()
+    try:
+        response = live_get(url, **kwargs)
+    except requests.RequestException as e:
+        # Respuestas rechazadas por quien llama (p. ej. contenido no HTML): se graba el resultado, no solo el éxito
+        if getattr(e, 'response', None) is None:
+            raise
+        _put_response(key, url, e.response, time.perf_counter() - start, b'', error={
+            'type': f"{type(e).__module__}.{type(e).__qualname__}", 'message': str(e)})
+        raise
+    _put_response(key, url, response, time.perf_counter() - start, response.content)
+    return response
+
+
+def _put_response(key, url, response, elapsed, body, error=None):
+    entry = {
+        'url': url,
+        'final_url': response.url,
+        'status': response.status_code,
+        'reason': response.reason,
+        'encoding': response.encoding,
+        'headers': {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS},
+        'elapsed': elapsed,
+        'truncated': getattr(response, 'truncated', False),
+    }
+    if error is not None:
+        entry['error'] = error
+    store().put(key, entry, body)
+
+
+def _response(entry, body):
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.url = entry['final_url']
+    response.encoding = entry.get('encoding')
+    response.reason = entry.get('reason')
+    response._content = body
+    response.truncated = entry.get('truncated', False)
+    return response
+
+
+def _recorded_error(error, response):
+    """Vuelve a crear la excepción grabada; si su clase ya no existe, una RequestException genérica"""
+    module, _, name = error['type'].rpartition('.')
+    try:
+        cls = getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError, ValueError):
+        cls = None
+    if not (isinstance(cls, type) and issubclass(cls, requests.RequestException)):
+        cls = requests.RequestException
+    return cls(error['message'], response=response)
+
+
+def llm_call(payload, live_call):
+    """Record/replay de una llamada de chat. `payload` identifica la petición; `live_call()` la ejecuta"""
+    current = mode()
+    if current == 'off':
+        return live_call()
+
+    key = store().key('llm', payload)
+    if current == 'replay':
+        entry, body = store().get(key)
+        if entry is None:
+            raise ReplayMiss(f"Sin grabación para la llamada LLM {key[:12]}")
+        _simulate_latency(entry)
+        data = json.loads(body)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role='assistant', content=data['content']))],
+            usage=SimpleNamespace(**data['usage']) if data.get('usage') else None,
+        )
+
+    start = time.perf_counter()
+    completion = live_call()
+    usage = getattr(completion, 'usage', None)
+    data = {
+        'content': completion.choices[0].message.content,
+        'usage': {
+            'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+            'completion_tokens': getattr(usage, 'completion_tokens', None),
+            'total_tokens': getattr(usage, 'total_tokens', None),
+        } if usage is not None else None,
+    }
+    store().put(key, {'kind': 'llm', 'model': payload.get('model'), 'elapsed': time.perf_counter() - start},
+                json.dumps(data, ensure_ascii=False).encode('utf-8'))
+    return completion
@@ -0,0 +1,439 @@
+"""Descarga y extracción on-page de páginas y resultados de búsqueda"""
+import requests
+from bs4 import BeautifulSoup
+import codecs
+import json
+import os
+import time
+import re
+import random
+from urllib.parse import urlsplit
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import perf
+import replay
+import hosts
+import fetchpool
+import snapshots
+from maincontent import extract_main_content
+from pagemeta import PageMetadata
+
+USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
+)
+
+# Compilados una vez por proceso
+DOMAIN_RE = re.compile(r'https?://([^/]+)')
+CHARSET_RE = re.compile(r'charset=["\']?([\w-]+)', re.I)
+
+def get_random_user_agent():
+    """Retorna un User-Agent aleatorio para evitar bloqueos"""
+    return random.choice(USER_AGENTS)
+
+# Límite de descarga por página (configurable); por encima se trunca el HTML
+MAX_HTML_BYTES = int(os.environ.get('CRP_MAX_HTML_BYTES', 2 * 1024 * 1024))
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain', 'application/xml', 'text/xml')
+CHUNK_SIZE = 16 * 1024
+
+class NonHtmlContent(requests.RequestException):
+    """La respuesta no es HTML: se aborta antes de descargar el cuerpo"""
+
+def _is_html(content_type):
+    # Sin Content-Type se intenta igualmente
+    return not content_type or content_type.split(';')[0].strip().lower() in HTML_CONTENT_TYPES
+
+def _charset(content_type):
+    match = CHARSET_RE.search(content_type or '')
+    if match:
+        try:
+            codecs.lookup(match.group(1))
+            return match.group(1)
+        except LookupError:
+            pass
+    return 'utf-8'
+
+def streamed_get(url, max_bytes=None, deadline=None, **kwargs):
+    """GET en streaming: rechaza no-HTML por cabecera, corta en `max_bytes` y decodifica por trozos
+
+    Devuelve un requests.Response con el cuerpo (posiblemente truncado) ya leído
+    y los atributos extra `truncated` y `decoded_text`.
+    """
+    max_bytes = max_bytes or MAX_HTML_BYTES
+    deadline = deadline or kwargs.get('timeout', 6)
+    start = time.monotonic()
+
+    response = requests.get(url, stream=True, **kwargs)
+    try:
+        content_type = response.headers.get('Content-Type', '')
+        if response.ok and not _is_html(content_type):
+            raise NonHtmlContent(f"Contenido no HTML ({content_type.split(';')[0]})", response=response)
+
+        encoding = _charset(content_type)
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        chunks, parts, size, truncated = [], [], 0, False
+
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if size + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - size]
+                truncated = True
+            chunks.append(chunk)
+            parts.append(decoder.decode(chunk))
+            size += len(chunk)
+            # Streams infinitos o muy lentos: tiempo total acotado, no solo por lectura
+            if truncated or time.monotonic() - start > deadline:
+                truncated = True
+                break
+
+        parts.append(decoder.decode(b'', final=True))
+    finally:
+        response.close()
+
+    response._content = b''.join(chunks)
+    response._content_consumed = True
+    response.encoding = encoding
+    response.truncated = truncated
+    response.decoded_text = ''.join(parts)
+    return response
+
+def timed_get(kind, url, live_get=None, hedge=True, host_scope=None, **kwargs):
+    """requests.get instrumentado: registra host, tiempo, bytes y status en el panel de rendimiento
+
+    Aplica además el estado por host: circuit breaker, timeout adaptativo y
+    petición duplicada (hedged) si la respuesta tarda más que el p95 del host.
+    hedge=False para descargas grandes o con efectos (p. ej. parseo en streaming).
+    host_scope separa el estado de peticiones que no se parecen a una descarga de
+    página (p. ej. 'asset': un 403 a HEAD no debe abrir el circuito de las páginas).
+    """
+    host = urlsplit(url).netloc.lower()
+    if host_scope:
+        host = f"{host_scope}:{host}"
+    registry = hosts.registry()
+    start = time.perf_counter()
+    if live_get is not None:
+        kwargs['live_get'] = live_get
+    
+    # En replay no hay red: no se consulta ni se contamina el estado por host
+    live = replay.mode() != 'replay'
+    hedged = False
+    try:
+        if live:
+            registry.before_request(host)
+            if 'timeout' in kwargs:
+                kwargs['timeout'] = registry.timeout_for(host, kwargs['timeout'])
+        hedge_after = registry.hedge_after(host) if live and hedge else None
+        response, hedged = hosts.hedged_call(lambda: replay.http_get(url, **kwargs), hedge_after)
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        if live and not isinstance(e, hosts.CircuitOpen):
+            # Un contenido no HTML no es un fallo del host
+            registry.record(host, elapsed, error=None if isinstance(e, NonHtmlContent) else type(e).__name__,
+                            timed_out=isinstance(e, requests.Timeout))
+        perf.record_call(kind, url, elapsed, error=str(e)[:200], replay=replay.mode(),
+                         aborted=isinstance(e, NonHtmlContent), circuit_open=isinstance(e, hosts.CircuitOpen))
+        raise
+    elapsed = time.perf_counter() - start
+    if live:
+        registry.record(host, elapsed, status=response.status_code)
+    nbytes = getattr(response, 'streamed_bytes', None) or len(response.content)
+    perf.record_call(kind, url, elapsed, nbytes=nbytes, status=response.status_code,
+                     replay=replay.mode(), truncated=getattr(response, 'truncated', False), hedged=hedged)
+    return response
+
+def extract_domain(url):
+    if not url.startswith('http'):
+        url = 'https://' + url
+    
+    match = DOMAIN_RE.search(url)
+    if match:
+        return match.group(1).replace('www.', '')
+    return None
+
+# Descargas simultáneas por lote (en el pool compartido de fetchpool) y procesos de parseo
+FETCH_WORKERS = int(os.environ.get('CRP_FETCH_WORKERS', 5))
+PARSE_WORKERS = int(os.environ.get('CRP_PARSE_WORKERS', os.cpu_count() or 1))
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _normalize_page_url(url):
+    if not url.startswith('http'):
+        url = 'https://' + url
+    return url
+
+def _failed_metadata(url, error):
+    return PageMetadata.failed(url, error, aborted=isinstance(error, NonHtmlContent))
+
+def fetch_page(url, max_bytes=None):
+    """Etapa de red: descarga el HTML de una página. Devuelve (url, html, info)"""
+    url = _normalize_page_url(url)
+    
+    if not url or url == 'https://' or len(url) < 10:
+        raise ValueError("URL inválida")
+    
+    headers = {
+        'User-Agent': get_random_user_agent(),
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Referer': 'https://www.google.com/'
+    }
+    
+    response = timed_get('page', url, live_get=streamed_get, headers=headers, timeout=6, allow_redirects=True,
+                         max_bytes=max_bytes)
+    response.raise_for_status()
+    
+    # En replay no hay streaming: se vuelve a comprobar el tipo
+    if not _is_html(response.headers.get('Content-Type', '')):
+        raise NonHtmlContent(f"Contenido no HTML ({response.headers.get('Content-Type', '').split(';')[0]})")
+    
+    html = getattr(response, 'decoded_text', None)
+    if html is None:
+        if response.encoding is None:
+            response.encoding = 'utf-8'
+        html = response.text
+    
+    info = {'bytes': len(response.content), 'truncated': bool(getattr(response, 'truncated', False))}
+    snapshots.record(url, html, info)
+    return url, html, info
+
+def parse_page(url, html, target_domain=None, info=None):
+    """Etapa de CPU: extrae los metadatos on-page del HTML descargado"""
+    metadata = _extract_metadata(html, url, target_domain)
+    metadata.bytes = (info or {}).get('bytes', len(html))
+    metadata.truncated = (info or {}).get('truncated', False)
+    return metadata
+
+def _parse_in_worker(url, html, target_domain, info):
+    start = time.perf_counter()
+    metadata = parse_page(url, html, target_domain, info)
+    return metadata, time.perf_counter() - start
+
+def parse_pool(workers=None):
+    """Pool de procesos compartido para el parseo (spawn: seguro desde un proceso con hilos)"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=workers or PARSE_WORKERS,
+                                              mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+def _reset_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+def scrape_url_metadata(url, target_domain=None, max_bytes=None):
+    """Scraping mejorado con User-Agent aleatorio y mejor extracción de headings"""
+    url = _normalize_page_url(url)
+    try:
+        url, html, info = fetch_page(url, max_bytes)
+        with perf.stage('html_parse'):
+            return parse_page(url, html, target_domain, info)
+    except Exception as e:
+        return _failed_metadata(url, e)
+
+def scrape_many(urls, target_domain=None, fetch_workers=None, parse_workers=None, max_bytes=None):
+    """Pipeline descarga → parseo para lotes de URLs; genera metadatos en orden de finalización
+
+    Las descargas van al pool compartido del proceso (fetchpool), con como mucho
+    fetch_workers del lote a la vez, y el HTML se pasa a un pool de procesos para
+    el parseo, que es Python puro bajo el GIL. parse_workers=0 parsea en hilos.
+    """
+    fetch_workers = fetch_workers or FETCH_WORKERS
+    parse_workers = PARSE_WORKERS if parse_workers is None else parse_workers
+    pool = parse_pool(parse_workers) if parse_workers > 0 else None
+    fetchers = fetchpool.pool()
+    urls = deque(urls)
+    fetches, parses = {}, {}
+    pending = set()
+    
+    try:
+        while urls or pending:
+            while urls and len(fetches) < fetch_workers:
+                url = urls.popleft()
+                future = fetchers.submit(perf.bind(fetch_page), url, max_bytes)
+                fetches[future] = _normalize_page_url(url)
+                pending.add(future)
+            
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    url = fetches.pop(future)
+                    try:
+                        page_url, html, info = future.result()
+                    except Exception as e:
+                        yield _failed_metadata(url, e)
+                        continue
+                    
+                    executor = pool or fetchers
+                    try:
+                        parse_future = executor.submit(_parse_in_worker, page_url, html, target_domain, info)
+                    except BrokenProcessPool:
+                        _reset_parse_pool()
+                        pool = None
+                        parse_future = fetchers.submit(_parse_in_worker, page_url, html, target_domain, info)
+                    parses[parse_future] = (page_url, html, info)
+                    pending.add(parse_future)
+                else:
+                    page_url, html, info = parses.pop(future)
+                    try:
+                        metadata, seconds = future.result()
+                    except BrokenProcessPool:
+                        # Un worker murió: se parsea aquí y se recrea el pool para el siguiente lote
+                        _reset_parse_pool()
+                        pool = None
+                        metadata, seconds = _parse_in_worker(page_url, html, target_domain, info)
+                    except Exception as e:
+                        yield _failed_metadata(page_url, e)
+                        continue
+                    perf.current().add_stage('html_parse', seconds)
+                    yield metadata
+    finally:
+        # Lote abandonado (trabajo cancelado, generador cerrado): lo que no ha empezado sale de la cola
+        fetchpool.cancel(pending)
+
+def _extract_metadata(html, url, target_domain=None):
+    """Extrae title, meta, headings, schemas, imágenes y enlaces internos del HTML"""
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    title = soup.find('title')
+    title_text = title.get_text().strip() if title else ""
+    
+    meta_desc = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
+    description = meta_desc.get('content', '').strip() if meta_desc else ""
+    
+    # Word count, H1/H2/H3 y enlaces internos salen del contenido principal (sin menús, sidebar ni pie)
+    content = extract_main_content(soup, target_domain)
+    
+    # Los scripts JSON-LD siguen en el soup (no se eliminan etiquetas): cada uno se parsea una vez
+    schemas = []
+    faqs = []
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            schema_data = json.loads(script.string)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(schema_data, dict):
+            continue
+        schema_type = schema_data.get('@type', 'Unknown')
+        if isinstance(schema_type, list):
+            schemas.extend(schema_type)
+        else:
+            schemas.append(schema_type)
+        if schema_type == 'FAQPage':
+            for entity in schema_data.get('mainEntity', []):
+                question = entity.get('name', '') if isinstance(entity, dict) else ''
+                if question:
+                    faqs.append(question)
+    
+    images_total = 0
+    images_without_alt = 0
+    try:
+        images = soup.find_all('img')
+        images_total = len(images)
+        images_without_alt = len([img for img in images if not img.get('alt')])
+    except:
+        pass
+    
+    return PageMetadata(
+        url,
+        title=title_text[:200],
+        title_length=len(title_text),
+        description=description[:500],
+        description_length=len(description),
+        h1_tags=content['h1_tags'],
+        h2_tags=content['h2_tags'],
+        h3_tags=content['h3_tags'],
+        word_count=content['word_count'],
+        images_total=images_total,
+        images_without_alt=images_without_alt,
+        schemas=schemas,
+        faqs=faqs,
+        internal_links=content['internal_links']
+    )
+
+def get_google_top_10(keyword, debug=False):
+    """Mejorado con User-Agent aleatorio"""
+    try:
+        headers = {
+            'User-Agent': get_random_user_agent()
+        }
+        
+        url = f"https://html.duckduckgo.com/html/?q={keyword.replace(' ', '+')}"
+        
+        response = timed_get('serp', url, headers=headers, timeout=15)
+        response.raise_for_status()
+        
+        with perf.stage('serp_parse'):
+            soup = BeautifulSoup(response.text, 'html.parser')
+        results = []
+        
+        for result in soup.find_all('a', class_='result__url'):
+            href = result.get('href', '')
+            if href.startswith('http') and href not in results:
+                results.append(href)
+                if len(results) >= 10:
+                    break
+        
+        if len(results) >= 5:
+            return results[:10]
+            
+    except:
+        pass
+    
+    try:
+        headers = {
+            'User-Agent': get_random_user_agent(),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'es-ES,es;q=0.9,en-US,en;q=0.8',
+            'Referer': 'https://www.google.com/',
+            'DNT': '1',
+            'Cookie': 'CONSENT=YES+cb.20210720-07-p0.en+FX+417;'
+        }
+        
+        url = f"https://www.google.com/search?q={keyword.replace(' ', '+')}&num=15"
+        
+        response = timed_get('serp', url, headers=headers, timeout=15)
+        response.raise_for_status()
+        
+        with perf.stage('serp_parse'):
+            soup = BeautifulSoup(response.text, 'html.parser')
+        results = []
+        
+        for selector in [
+            soup.find_all('div', class_='g'),
+            soup.find_all('div', class_='yuRUbf'),
+            soup.find_all('a', jsname='UWckNb')
+        ]:
+            for elem in selector:
+                link = elem.find('a', href=True) if elem.name == 'div' else elem
+                if link:
+                    href = link.get('href', '')
+                    
+                    if '/url?q=' in href:
+                        href = href.split('/url?q=')[1].split('&')[0]
+                    
+                    if (href.startswith('http') and 
+                        'google.com' not in href and 
+                        'youtube.com' not in href and
+                        href not in results):
+                        results.append(href)
+            
+            if len(results) >= 10:
+                break
+        
+        if len(results) >= 5:
+            return results[:10]
+            
+    except:
+        pass
+    
+    return []
@@ -0,0 +1,423 @@
+"""Ingesta en streaming de sitemaps (índices, hijos y .xml.gz) con caché persistente de lastmod
+
+Los sitemaps se descargan en paralelo y se parsean por trozos con expat:
+cada <url> se procesa y se descarta, así que la memoria no crece con el tamaño
+del sitemap. Las entradas (URL normalizada → lastmod) se guardan en
+CRP_SITEMAP_CACHE (por defecto .sitemap_cache.sqlite3); un sitemap descargado
+hace menos de CRP_SITEMAP_TTL segundos no se vuelve a pedir y, pasado ese
+tiempo, se revalida con ETag / Last-Modified.
+
+Las entradas de una descarga van a una tabla de staging (con un id propio de
+cada descarga) y sustituyen a las anteriores del sitemap (junto con su ETag) en
+una sola transacción al terminar: una descarga cortada deja la caché como estaba
+y dos descargas simultáneas del mismo sitemap no se pisan el staging. Cada URL
+guarda a qué sitemaps pertenece, así que si deja de aparecer en uno sigue
+viva mientras otro la liste.
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from functools import lru_cache
+from xml.parsers import expat
+
+import requests
+
+import fetchpool
+import perf
+import replay
+from crawler import normalize_url
+from scraper import get_random_user_agent, timed_get
+
+CACHE_PATH = os.environ.get('CRP_SITEMAP_CACHE', '.sitemap_cache.sqlite3')
+SITEMAP_TTL = int(os.environ.get('CRP_SITEMAP_TTL', 24 * 3600))
+SITEMAP_WORKERS = int(os.environ.get('CRP_SITEMAP_WORKERS', 4))
+MAX_SITEMAPS = 2000
+BATCH_SIZE = 5000
+CHUNK_SIZE = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sitemaps (
+    url TEXT PRIMARY KEY,
+    domain TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL,
+    entries INTEGER NOT NULL DEFAULT 0,
+    children TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS entries (
+    domain TEXT NOT NULL,
+    url_key TEXT NOT NULL,
+    loc TEXT NOT NULL,
+    lastmod INTEGER,
+    sitemap TEXT NOT NULL,
+    PRIMARY KEY (domain, url_key, sitemap)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_sitemap ON entries (sitemap);
+CREATE TABLE IF NOT EXISTS staging (
+    ingest TEXT NOT NULL,
+    url_key TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    loc TEXT NOT NULL,
+    lastmod INTEGER,
+    PRIMARY KEY (ingest, url_key)
+) WITHOUT ROWID;
+"""
+
+
+@lru_cache(maxsize=4096)
+def parse_lastmod(value):
+    """Fecha W3C (2024-05-01, 2024-05-01T10:00:00+02:00, ...Z) a epoch UTC, o None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def iter_sitemap(chunks):
+    """Genera ('url' | 'sitemap', loc, lastmod) a partir de trozos de bytes, con memoria constante
+
+    Parser incremental expat sin construir árbol: solo se guarda la entrada en curso.
+    Los trozos pueden venir comprimidos con gzip (se detecta por la cabecera).
+    """
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.buffer_text = True
+    ready = []
+    entry = {'loc': None, 'lastmod': None}
+    text = []
+
+    def start(name, attrs):
+        text.clear()
+
+    def data(chunk):
+        text.append(chunk)
+
+    def end(name):
+        name = name.rsplit(' ', 1)[-1]
+        # Solo el primer <loc>/<lastmod> de cada entrada (image:loc y similares vienen después)
+        if name == 'loc' and entry['loc'] is None:
+            entry['loc'] = ''.join(text).strip()
+        elif name == 'lastmod' and entry['lastmod'] is None:
+            entry['lastmod'] = ''.join(text)
+        elif name in ('url', 'sitemap'):
+            if entry['loc']:
+                ready.append((name, entry['loc'], parse_lastmod(entry['lastmod'])))
+            entry['loc'] = entry['lastmod'] = None
+        text.clear()
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = data
+
+    def feed(data, final=False):
+        parser.Parse(data, final)
+        yield from ready
+        ready.clear()
+
+    inflater = None
+    first = True
+    for chunk in chunks:
+        if first:
+            first = False
+            if chunk[:2] == b'\x1f\x8b':
+                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if inflater is None:
+            yield from feed(chunk)
+            continue
+        # Descompresión acotada: un trozo gzip de 64 KB puede expandirse a varios MB de XML
+        while chunk:
+            yield from feed(inflater.decompress(chunk, CHUNK_SIZE))
+            chunk = inflater.unconsumed_tail
+    yield from feed(inflater.flush() if inflater is not None else b'', final=True)
+
+
+def _response_chunks(response):
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        if chunk:
+            yield chunk
+
+
+def _body_chunks(body):
+    stream = io.BytesIO(body)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+class SitemapCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+        self._conn.executescript(SCHEMA)
+
+    def _migrate(self):
+        """Cachés creadas antes de la pertenencia por sitemap y del staging por descarga"""
+        staging = {row[1] for row in self._conn.execute('PRAGMA table_info(staging)')}
+        if staging and 'ingest' not in staging:
+            # Solo contiene restos de descargas a medias
+            self._conn.execute('DROP TABLE staging')
+        keys = {row[1] for row in self._conn.execute('PRAGMA table_info(entries)') if row[5]}
+        if keys and 'sitemap' not in keys:
+            self._conn.executescript("""
+                BEGIN;
+                ALTER TABLE entries RENAME TO entries_old;
+                DROP INDEX IF EXISTS entries_sitemap;
+                """ + SCHEMA + """
+                INSERT INTO entries (domain, url_key, loc, lastmod, sitemap)
+                    SELECT domain, url_key, loc, lastmod, sitemap FROM entries_old;
+                DROP TABLE entries_old;
+                COMMIT;
+            """)
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def sitemap(self, url):
+        row = self._execute('SELECT etag, last_modified, fetched_at, entries, children FROM sitemaps WHERE url = ?',
+                            (url,)).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'fetched_at': row[2], 'entries': row[3],
+                'children': [c for c in row[4].split('\n') if c]}
+
+    def discard(self, ingest):
+        """Descarta las entradas en staging de una descarga (fallida o ya aplicada)"""
+        self._execute('DELETE FROM staging WHERE ingest = ?', (ingest,))
+
+    def add_entries(self, domain, ingest, rows):
+        with self._transaction() as conn:
+            conn.executemany('INSERT OR REPLACE INTO staging (ingest, url_key, domain, loc, lastmod) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             [(ingest, key, domain, loc, lastmod) for key, loc, lastmod in rows])
+
+    def done(self, url, ingest, domain, etag, last_modified, entries, children):
+        """Descarga completa: sus entradas en staging reemplazan a las anteriores del sitemap, con su ETag
+
+        El reemplazo va en una transacción con el lock tomado, así que dos descargas
+        del mismo sitemap se aplican una detrás de otra y gana la última completa.
+        """
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM entries WHERE sitemap = ?', (url,))
+            conn.execute('INSERT OR REPLACE INTO entries (domain, url_key, loc, lastmod, sitemap) '
+                         'SELECT domain, url_key, loc, lastmod, ? FROM staging WHERE ingest = ?', (url, ingest))
+            conn.execute('DELETE FROM staging WHERE ingest = ?', (ingest,))
+            conn.execute('INSERT OR REPLACE INTO sitemaps (url, domain, etag, last_modified, fetched_at, entries, children) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (url, domain, etag, last_modified, time.time(), entries, '\n'.join(children)))
+
+    def touch(self, url):
+        self._execute('UPDATE sitemaps SET fetched_at = ? WHERE url = ?', (time.time(), url))
+
+    def lastmod_for(self, domain, keys):
+        found = {}
+        keys = [k for k in keys if k]
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            # Una URL listada en varios sitemaps: la fecha más reciente
+            rows = self._execute(f"SELECT url_key, MAX(lastmod) FROM entries WHERE domain = ? AND url_key IN "
+                                 f"({', '.join('?' * len(batch))}) GROUP BY url_key", [domain] + batch).fetchall()
+            found.update(rows)
+        return found
+
+    def urls(self, domain, limit):
+        rows = self._execute('SELECT MIN(loc) FROM entries WHERE domain = ? GROUP BY url_key LIMIT ?',
+                             (domain, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, domain):
+        return self._execute('SELECT COUNT(DISTINCT url_key) FROM entries WHERE domain = ?', (domain,)).fetchone()[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SitemapCache()
+    return _cache
+
+
+def _stream_sitemap(url, on_item, **kwargs):
+    """live_get para timed_get: parsea mientras descarga y devuelve la respuesta sin cuerpo"""
+    response = requests.get(url, stream=True, **kwargs)
+    nbytes = 0
+    try:
+        if response.status_code == 200:
+            def counted():
+                nonlocal nbytes
+                for chunk in _response_chunks(response):
+                    nbytes += len(chunk)
+                    yield chunk
+            for item in iter_sitemap(counted()):
+                on_item(item)
+    finally:
+        response.close()
+    response._content = b''
+    response._content_consumed = True
+    response.streamed_bytes = nbytes
+    return response
+
+
+def _fetch_one(domain, url, store, refresh):
+    """Descarga y parsea un sitemap. Devuelve (sitemaps hijos, entradas nuevas)"""
+    cached = store.sitemap(url)
+    if cached and not refresh and time.time() - cached['fetched_at'] < SITEMAP_TTL:
+        return cached['children'], 0
+
+    headers = {'User-Agent': get_random_user_agent()}
+    if cached and not refresh:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    children, batch = [], []
+    count = 0
+    ingest = uuid.uuid4().hex
+
+    def on_item(item):
+        nonlocal count
+        kind, loc, lastmod = item
+        if kind == 'sitemap':
+            children.append(loc)
+            return
+        key = normalize_url(loc)
+        if key is None:
+            return
+        batch.append((key, loc, lastmod))
+        count += 1
+        if len(batch) >= BATCH_SIZE:
+            with perf.stage('sitemap_store'):
+                store.add_entries(domain, ingest, batch)
+            batch.clear()
+
+    try:
+        # Con record/replay el cuerpo tiene que pasar por el almacén: se descarga entero y se parsea por trozos
+        if replay.mode() == 'off':
+            response = timed_get('sitemap', url, live_get=lambda u, **kw: _stream_sitemap(u, on_item, **kw),
+                                 hedge=False, headers=headers, timeout=30)
+        else:
+            response = timed_get('sitemap', url, hedge=False, headers=headers, timeout=30)
+            if response.status_code == 200:
+                for item in iter_sitemap(_body_chunks(response.content)):
+                    on_item(item)
+
+        if response.status_code == 304 and cached:
+            store.touch(url)
+            return cached['children'], 0
+        response.raise_for_status()
+
+        if batch:
+            store.add_entries(domain, ingest, batch)
+        store.done(url, ingest, domain, response.headers.get('ETag'), response.headers.get('Last-Modified'), count, children)
+    finally:
+        # Tras done() no queda nada; si algo falló, las entradas anteriores y su ETag siguen intactas
+        store.discard(ingest)
+    return children, count
+
+
+def discover(domain):
+    """Sitemaps declarados en robots.txt; si no hay, /sitemap.xml"""
+    try:
+        response = timed_get('robots', f"https://{domain}/robots.txt",
+                             headers={'User-Agent': get_random_user_agent()}, timeout=10)
+        if response.status_code == 200:
+            found = [line.split(':', 1)[1].strip() for line in response.text.splitlines()
+                     if line.lower().startswith('sitemap:')]
+            if found:
+                return found
+    except Exception:
+        pass
+    return [f"https://{domain}/sitemap.xml"]
+
+
+def ingest(domain, start_urls=None, workers=None, refresh=False, max_entries=None, progress=None):
+    """Recorre el índice de sitemaps del dominio en paralelo y guarda loc/lastmod en la caché
+
+    Devuelve un resumen con sitemaps procesados, fallidos y entradas en caché.
+    """
+    domain = domain.lower().replace('www.', '')
+    store = cache()
+    pending = list(start_urls or discover(domain))
+    seen = set(pending)
+    processed, failed, fetched_entries = 0, 0, 0
+
+    executor = fetchpool.pool()
+    with perf.stage('sitemap_ingest'):
+        in_flight = {}
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < (workers or SITEMAP_WORKERS):
+                    if max_entries and fetched_entries >= max_entries:
+                        pending.clear()
+                        break
+                    url = pending.pop(0)
+                    in_flight[executor.submit(perf.bind(_fetch_one), domain, url, store, refresh)] = url
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.pop(future)
+                    processed += 1
+                    try:
+                        children, count = future.result()
+                    except (requests.RequestException, expat.ExpatError, zlib.error, OSError):
+                        failed += 1
+                        continue
+                    fetched_entries += count
+                    for child in children:
+                        if child not in seen and len(seen) < MAX_SITEMAPS:
+                            seen.add(child)
+                            pending.append(child)
+                if progress:
+                    progress(processed, len(seen), f"{fetched_entries} URLs")
+        finally:
+            fetchpool.cancel(in_flight)
+
+    return {'sitemaps': processed, 'failed': failed, 'fetched_entries': fetched_entries,
+            'cached_entries': store.count(domain)}
+
+
+def lastmod_for(domain, urls):
+    """Epoch de lastmod alineado con `urls` (None si el sitemap no la incluye o no tiene fecha)"""
+    domain = domain.lower().replace('www.', '')
+    keys = [normalize_url(str(url)) for url in urls]
+    found = cache().lastmod_for(domain, list(set(keys)))
+    return [found.get(key) for key in keys]
@@ -0,0 +1,523 @@
+"""Archivo local de snapshots HTML: direccionado por contenido, deduplicado y comprimido
+
+Cada HTML descargado se guarda en CRP_SNAPSHOT_DB (por defecto .snapshots.sqlite3)
+por su sha256, así que un cuerpo idéntico se guarda una sola vez. Los blobs van
+comprimidos con zlib y un diccionario por dominio entrenado con sus primeras
+páginas: cabecera, menú y estilos se repiten entre páginas y apenas ocupan. El
+índice de versiones guarda, por URL, cada contenido distinto con su primera y
+última descarga. CRP_SNAPSHOTS=0 desactiva el archivo.
+
+Las descargas solo encolan el HTML (record()): un hilo en segundo plano comprime
+y escribe, fuera del camino de la descarga. Con la cola llena el snapshot se
+descarta. El mismo hilo aplica la retención: versiones no vistas en
+CRP_SNAPSHOT_MAX_DAYS días (180) y, por encima de CRP_SNAPSHOT_MAX_MB (1024), las
+más antiguas (0 desactiva cada límite).
+
+Uso sin UI:
+    python -m snapshots stats
+    python -m snapshots history https://example.com/post
+    python -m snapshots reextract --domain example.com
+    python -m snapshots prune
+"""
+import argparse
+import atexit
+import contextlib
+import hashlib
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+import perf
+
+ENABLED = os.environ.get('CRP_SNAPSHOTS', '1') != '0'
+ARCHIVE_PATH = os.environ.get('CRP_SNAPSHOT_DB', '.snapshots.sqlite3')
+# Páginas distintas de un dominio con las que se entrena su diccionario
+DICT_SAMPLES = int(os.environ.get('CRP_SNAPSHOT_DICT_SAMPLES', 8))
+# zlib solo alcanza los últimos 32 KB: un diccionario mayor no aporta
+DICT_SIZE = 32 * 1024
+COMPRESSION_LEVEL = 9
+BATCH_SIZE = 200
+MAX_BYTES = int(os.environ.get('CRP_SNAPSHOT_MAX_MB', 1024)) * 1024 * 1024
+MAX_AGE = int(os.environ.get('CRP_SNAPSHOT_MAX_DAYS', 180)) * 24 * 3600
+# Al pasar de MAX_BYTES se poda hasta esta fracción, para no podar en cada escritura
+PRUNE_TARGET = 0.9
+PRUNE_EVERY = 500
+WRITE_QUEUE = int(os.environ.get('CRP_SNAPSHOT_QUEUE', 256))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dictionaries (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    domain TEXT NOT NULL,
+    dictionary INTEGER,
+    raw_bytes INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_domain ON blobs (domain, dictionary);
+CREATE TABLE IF NOT EXISTS versions (
+    url TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    domain TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    fetches INTEGER NOT NULL DEFAULT 1,
+    bytes INTEGER,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (url, version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS versions_domain ON versions (domain);
+CREATE INDEX IF NOT EXISTS versions_digest ON versions (digest);
+CREATE INDEX IF NOT EXISTS versions_last_seen ON versions (last_seen);
+"""
+
+# Fragmentos de hasta un '>' (etiquetas y el texto que las precede)
+FRAGMENT_RE = re.compile(rb'[^>]*>|[^>]+$')
+
+
+def snapshot_domain(url):
+    return urlsplit(url).netloc.lower()
+
+
+def train_dictionary(samples, size=DICT_SIZE):
+    """Diccionario zlib con los fragmentos que se repiten en la mayoría de `samples` (bytes)
+
+    Se conservan en el orden de la primera muestra, para que cabecera, menú y pie
+    queden como secuencias largas; si no caben, se descartan primero los menos
+    repetidos.
+    """
+    fragments = [FRAGMENT_RE.findall(sample) for sample in samples]
+    frequency = {}
+    for found in fragments:
+        for fragment in set(found):
+            frequency[fragment] = frequency.get(fragment, 0) + 1
+
+    threshold = max(2, (len(samples) + 1) // 2)
+    common, seen = [], set()
+    for found in fragments:
+        for fragment in found:
+            if frequency[fragment] >= threshold and len(fragment) >= 4 and fragment not in seen:
+                seen.add(fragment)
+                common.append(fragment)
+
+    total = sum(map(len, common))
+    if total > size:
+        dropped = set()
+        for fragment in sorted(common, key=lambda f: (frequency[f], -len(f))):
+            if total <= size:
+                break
+            dropped.add(fragment)
+            total -= len(fragment)
+        common = [f for f in common if f not in dropped]
+    return b''.join(common)
+
+
+def compress(body, zdict=None):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict) if zdict else zlib.compressobj(COMPRESSION_LEVEL)
+    return compressor.compress(body) + compressor.flush()
+
+
+def decompress(data, zdict=None):
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+class SnapshotArchive:
+    def __init__(self, path=ARCHIVE_PATH, dict_samples=DICT_SAMPLES):
+        self.path = path
+        self.dict_samples = dict_samples
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._dictionaries = {}
+        self._training = set()
+        # Dominios sin fragmentos comunes: se reintenta al doblar las muestras, no con cada blob nuevo
+        self._train_after = {}
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def _dictionary_for(self, domain):
+        """(id, datos) del diccionario del dominio o None"""
+        if domain not in self._dictionaries:
+            row = self._execute('SELECT id, data FROM dictionaries WHERE domain = ?', (domain,)).fetchone()
+            if row is None:
+                return None
+            self._dictionaries[domain] = (row[0], bytes(row[1]))
+        return self._dictionaries[domain]
+
+    def _dictionary_data(self, dictionary_id):
+        if dictionary_id is None:
+            return None
+        for known_id, data in self._dictionaries.values():
+            if known_id == dictionary_id:
+                return data
+        row = self._execute('SELECT domain, data FROM dictionaries WHERE id = ?', (dictionary_id,)).fetchone()
+        self._dictionaries[row[0]] = (dictionary_id, bytes(row[1]))
+        return self._dictionaries[row[0]][1]
+
+    def put(self, url, html, info=None):
+        """Archiva el HTML de `url`. Devuelve (versión, nueva): un contenido igual al último no crea versión"""
+        body = html.encode('utf-8') if isinstance(html, str) else html
+        digest = hashlib.sha256(body).hexdigest()
+        info = info or {}
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute('SELECT version, digest FROM versions WHERE url = ? ORDER BY version DESC LIMIT 1',
+                                     (url,)).fetchone()
+            if row is not None and row[1] == digest:
+                self._conn.execute('UPDATE versions SET last_seen = ?, fetches = fetches + 1 WHERE url = ? AND version = ?',
+                                   (now, url, row[0]))
+                return row[0], False
+            stored = self._conn.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is not None
+
+        domain = snapshot_domain(url)
+        if not stored:
+            dictionary = self._dictionary_for(domain)
+            data = compress(body, dictionary[1] if dictionary else None)
+
+        with self._transaction() as conn:
+            if not stored:
+                conn.execute('INSERT OR IGNORE INTO blobs (digest, domain, dictionary, raw_bytes, stored_bytes, data) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (digest, domain, dictionary[0] if dictionary else None, len(body), len(data), data))
+            version = conn.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM versions WHERE url = ?',
+                                   (url,)).fetchone()[0]
+            conn.execute('INSERT INTO versions (url, version, domain, digest, first_seen, last_seen, bytes, truncated) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (url, version, domain, digest, now, now, info.get('bytes', len(body)), int(bool(info.get('truncated')))))
+
+        if not stored and dictionary is None:
+            self._maybe_train(domain)
+        return version, True
+
+    def _maybe_train(self, domain):
+        with self._lock:
+            if domain in self._training:
+                return
+            count = self._conn.execute('SELECT COUNT(*) FROM blobs WHERE domain = ? AND dictionary IS NULL',
+                                       (domain,)).fetchone()[0]
+            if count < max(self.dict_samples, self._train_after.get(domain, 0)):
+                return
+            self._training.add(domain)
+        try:
+            with perf.stage('snapshot_train'):
+                rows = self._execute('SELECT digest, data FROM blobs WHERE domain = ? AND dictionary IS NULL',
+                                     (domain,)).fetchall()
+                samples = {digest: decompress(data) for digest, data in rows}
+                zdict = train_dictionary(list(samples.values()))
+                if not zdict:
+                    with self._lock:
+                        self._train_after[domain] = count * 2
+                    return
+                # Las muestras se recomprimen con el diccionario que han entrenado
+                recompressed = [(compress(body, zdict), digest) for digest, body in samples.items()]
+            with self._transaction() as conn:
+                dictionary_id = conn.execute(
+                    'INSERT INTO dictionaries (domain, created_at, samples, data) VALUES (?, ?, ?, ?)',
+                    (domain, time.time(), len(samples), zdict)).lastrowid
+                conn.executemany('UPDATE blobs SET dictionary = ?, stored_bytes = ?, data = ? WHERE digest = ?',
+                                 [(dictionary_id, len(data), data, digest) for data, digest in recompressed])
+                self._dictionaries[domain] = (dictionary_id, zdict)
+        finally:
+            with self._lock:
+                self._training.discard(domain)
+
+    @staticmethod
+    def _drop_unreferenced(conn, digests):
+        """Borra los blobs de `digests` que ya no usa ninguna versión. Devuelve los bytes liberados"""
+        freed = 0
+        for digest in digests:
+            row = conn.execute('SELECT stored_bytes FROM blobs WHERE digest = ? AND NOT EXISTS '
+                               '(SELECT 1 FROM versions WHERE digest = ?)', (digest, digest)).fetchone()
+            if row is not None:
+                conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+                freed += row[0]
+        return freed
+
+    def prune(self, max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        """Retención: borra las versiones no vistas en `max_age` segundos y, si los blobs pasan de
+        `max_bytes`, las vistas hace más tiempo hasta quedar en PRUNE_TARGET. Devuelve las versiones borradas
+
+        El fichero no encoge (sin VACUUM): SQLite reutiliza las páginas liberadas.
+        """
+        deleted = 0
+        if max_age:
+            limit = time.time() - max_age
+            with self._transaction() as conn:
+                digests = [row[0] for row in conn.execute('SELECT DISTINCT digest FROM versions WHERE last_seen < ?',
+                                                          (limit,))]
+                deleted += conn.execute('DELETE FROM versions WHERE last_seen < ?', (limit,)).rowcount
+                self._drop_unreferenced(conn, digests)
+        if max_bytes:
+            total = self._execute('SELECT COALESCE(SUM(stored_bytes), 0) FROM blobs').fetchone()[0]
+            if total > max_bytes:
+                while total > max_bytes * PRUNE_TARGET:
+                    with self._transaction() as conn:
+                        rows = conn.execute('SELECT v.url, v.version, v.digest, b.stored_bytes FROM versions v '
+                                            'JOIN blobs b ON b.digest = v.digest ORDER BY v.last_seen LIMIT ?',
+                                            (BATCH_SIZE,)).fetchall()
+                        if not rows:
+                            break
+                        # Solo las necesarias (estimado: un blob compartido no se libera hasta su última versión)
+                        excess, taken = total - max_bytes * PRUNE_TARGET, []
+                        for row in rows:
+                            taken.append(row)
+                            excess -= row[3]
+                            if excess <= 0:
+                                break
+                        conn.executemany('DELETE FROM versions WHERE url = ? AND version = ?',
+                                         [(url, version) for url, version, _, _ in taken])
+                        total -= self._drop_unreferenced(conn, {digest for _, _, digest, _ in taken})
+                    deleted += len(taken)
+        return deleted
+
+    def get(self, url, version=None):
+        """HTML archivado de `url` (última versión por defecto) o None"""
+        sql = ('SELECT b.data, b.dictionary FROM versions v JOIN blobs b ON b.digest = v.digest WHERE v.url = ? ' +
+               ('AND v.version = ?' if version else 'ORDER BY v.version DESC LIMIT 1'))
+        row = self._execute(sql, (url, version) if version else (url,)).fetchone()
+        if row is None:
+            return None
+        return decompress(row[0], self._dictionary_data(row[1])).decode('utf-8')
+
+    def history(self, url):
+        rows = self._execute('SELECT v.version, v.digest, v.first_seen, v.last_seen, v.fetches, v.bytes, v.truncated, '
+                             'b.stored_bytes FROM versions v JOIN blobs b ON b.digest = v.digest WHERE v.url = ? '
+                             'ORDER BY v.version', (url,)).fetchall()
+        return [{'version': r[0], 'digest': r[1], 'first_seen': r[2], 'last_seen': r[3], 'fetches': r[4],
+                 'bytes': r[5], 'truncated': bool(r[6]), 'stored_bytes': r[7]} for r in rows]
+
+    def latest(self, urls=None, domain=None):
+        """Genera (url, html, info) de la última versión de cada URL archivada"""
+        sql = ('SELECT v.url, v.digest, v.bytes, v.truncated FROM versions v '
+               'WHERE v.version = (SELECT MAX(version) FROM versions WHERE url = v.url)')
+        if urls is None:
+            rows = self._execute(sql + (' AND v.domain = ?' if domain else ''), (domain,) if domain else ()).fetchall()
+        else:
+            urls, rows = list(urls), []
+            for start in range(0, len(urls), 500):
+                batch = urls[start:start + 500]
+                rows += self._execute(sql + f" AND v.url IN ({', '.join('?' * len(batch))})", batch).fetchall()
+
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            digests = list({row[1] for row in batch})
+            blobs = {digest: (data, dictionary) for digest, data, dictionary in self._execute(
+                f"SELECT digest, data, dictionary FROM blobs WHERE digest IN ({', '.join('?' * len(digests))})",
+                digests).fetchall()}
+            for url, digest, size, truncated in batch:
+                data, dictionary = blobs[digest]
+                html = decompress(data, self._dictionary_data(dictionary)).decode('utf-8')
+                yield url, html, {'bytes': size, 'truncated': bool(truncated)}
+
+    def stats(self, domain=None):
+        """Tamaño del archivo: snapshots, blobs, bytes originales y guardados (con diccionarios)"""
+        where, args = ('WHERE domain = ?', (domain,)) if domain else ('', ())
+        blobs, raw, stored = self._execute(
+            f"SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(stored_bytes), 0) FROM blobs {where}",
+            args).fetchone()
+        dictionaries, dictionary_bytes = self._execute(
+            f"SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM dictionaries {where}", args).fetchone()
+        urls, snapshots, fetches = self._execute(
+            f"SELECT COUNT(DISTINCT url), COUNT(*), COALESCE(SUM(fetches), 0) FROM versions {where}", args).fetchone()
+        total = stored + dictionary_bytes
+        return {
+            'urls': urls,
+            'snapshots': snapshots,
+            'fetches': fetches,
+            'blobs': blobs,
+            'raw_bytes': raw,
+            'stored_bytes': total,
+            'dictionaries': dictionaries,
+            'ratio': round(raw / total, 2) if total else None,
+            'bytes_per_snapshot': round(total / snapshots) if snapshots else None,
+        }
+
+    def domains(self):
+        return [row[0] for row in self._execute('SELECT DISTINCT domain FROM blobs ORDER BY domain').fetchall()]
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def archive():
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = SnapshotArchive()
+    return _archive
+
+
+_writes = None
+_writer_lock = threading.Lock()
+_writer_stats = {'written': 0, 'dropped': 0, 'failed': 0, 'pruned': 0}
+# Lo actualizan el hilo escritor y los hilos que llaman a record()
+_stats_lock = threading.Lock()
+
+
+def _count(key, n=1):
+    with _stats_lock:
+        _writer_stats[key] += n
+
+
+def _write_loop(pending):
+    since_prune = PRUNE_EVERY
+    while True:
+        url, html, info = pending.get()
+        try:
+            if since_prune >= PRUNE_EVERY:
+                _count('pruned', archive().prune())
+                since_prune = 0
+            archive().put(url, html, info)
+            since_prune += 1
+            _count('written')
+        except Exception:
+            # Un fallo del archivo (disco lleno, base de datos bloqueada…) no para el hilo
+            _count('failed')
+        finally:
+            pending.task_done()
+
+
+def _writer():
+    global _writes
+    with _writer_lock:
+        if _writes is None:
+            _writes = queue.Queue(maxsize=WRITE_QUEUE)
+            threading.Thread(target=_write_loop, args=(_writes,), name='snapshot-writer', daemon=True).start()
+            atexit.register(flush, 5)
+    return _writes
+
+
+def record(url, html, info=None):
+    """Encola un HTML recién descargado para archivarlo en segundo plano; nunca bloquea la descarga
+
+    Con la cola llena (el disco no da abasto) el snapshot se descarta.
+    """
+    if not ENABLED:
+        return
+    try:
+        _writer().put_nowait((url, html, info))
+    except queue.Full:
+        _count('dropped')
+
+
+def flush(timeout=None):
+    """Espera a que se escriban los snapshots encolados. Devuelve False si vence `timeout`"""
+    if _writes is None:
+        return True
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _writes.all_tasks_done:
+        while _writes.unfinished_tasks:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            _writes.all_tasks_done.wait(remaining)
+    return True
+
+
+def writer_stats():
+    with _stats_lock:
+        stats = dict(_writer_stats)
+    return dict(stats, queued=_writes.qsize() if _writes is not None else 0)
+
+
+def reextract(urls=None, domain=None, target_domain=None, parse_workers=None, store=None):
+    """Vuelve a extraer los metadatos de las últimas versiones archivadas, en paralelo y sin red
+
+    Genera PageMetadata en orden de finalización. El parseo va al pool de procesos
+    de scraper (parse_workers=0 parsea en este hilo).
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+    from scraper import PARSE_WORKERS, _parse_in_worker, parse_page, parse_pool
+
+    store = store or archive()
+    parse_workers = PARSE_WORKERS if parse_workers is None else parse_workers
+    if parse_workers == 0:
+        for url, html, info in store.latest(urls, domain):
+            with perf.stage('html_parse'):
+                yield parse_page(url, html, target_domain, info)
+        return
+
+    pool = parse_pool(parse_workers)
+    # Solo unas pocas páginas en vuelo por worker: el archivo no se descomprime entero en memoria
+    in_flight = set()
+    for url, html, info in store.latest(urls, domain):
+        in_flight.add(pool.submit(_parse_in_worker, url, html, target_domain, info))
+        if len(in_flight) >= parse_workers * 4:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                metadata, seconds = future.result()
+                perf.current().add_stage('html_parse', seconds)
+                yield metadata
+    for future in wait(in_flight).done:
+        metadata, seconds = future.result()
+        perf.current().add_stage('html_parse', seconds)
+        yield metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archivo local de snapshots HTML")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats')
+    history = commands.add_parser('history')
+    history.add_argument('url')
+    extract = commands.add_parser('reextract')
+    extract.add_argument('--domain', default=None)
+    extract.add_argument('--workers', type=int, default=None)
+    prune = commands.add_parser('prune')
+    prune.add_argument('--max-mb', type=int, default=MAX_BYTES // (1024 * 1024))
+    prune.add_argument('--max-days', type=int, default=MAX_AGE // (24 * 3600))
+    args = parser.parse_args(argv)
+
+    store = archive()
+    if args.command == 'stats':
+        print(f"total: {store.stats()}")
+        for domain in store.domains():
+            print(f"{domain}: {store.stats(domain)}")
+    elif args.command == 'history':
+        for entry in store.history(args.url):
+            print(entry)
+    elif args.command == 'prune':
+        deleted = store.prune(args.max_mb * 1024 * 1024, args.max_days * 24 * 3600)
+        print(f"{deleted} versiones borradas; {store.stats()}")
+    else:
+        start = time.perf_counter()
+        pages = failed = 0
+        for metadata in reextract(domain=args.domain, parse_workers=args.workers):
+            pages += 1
+            failed += not metadata['success']
+        seconds = time.perf_counter() - start
+        print(f"{pages} páginas ({failed} con error) en {seconds:.2f}s, {pages / seconds if seconds else 0:.1f} páginas/s")
+
+
+if __name__ == '__main__':
+    main()
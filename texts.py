@@ -0,0 +1,306 @@
+"""Textos de la interfaz por idioma. Se construyen una sola vez por proceso, no en cada rerun"""
+
+TEXTS_BY_LANGUAGE = {
+    "Español": {
+        'title': '🎯 Content Refresh Prioritizer',
+        'subtitle': 'Descubre qué páginas optimizar primero basándote en Google Search Console',
+        'upload': '📊 Google Search Console CSV',
+        'analyze_btn': '🚀 Analizar',
+        'analyzing': 'Analizando datos...',
+        'success': 'oportunidades encontradas',
+        'new_analysis': '🔄 Nuevo análisis',
+        'prioritized_urls': '📋 URLs Priorizadas',
+        'select_url': '💡 **Selecciona una URL** de la lista escribiendo su número para ver el análisis completo',
+        'enter_number': 'Ingresa el número (#) de la URL que quieres analizar:',
+        'analyze_selected': '🔍 Analizar URL seleccionada',
+        'deep_analysis': '🎯 Análisis Profundo',
+        'on_page': '🔍 Análisis On-Page',
+        'ai_recommendations': '💡 Recomendaciones IA',
+        'generating': 'Generando análisis personalizado...',
+        'internal_links': '🔗 Recomendaciones de Enlaces Internos',
+        'current': 'Actual',
+        'suggestion': 'Sugerencia',
+        'your_page_has': 'Tu página tiene',
+        'internal_links_text': 'enlaces internos en el contenido.',
+        'add_links_to': 'Añade enlaces a estas páginas de alto rendimiento:',
+        'comparativa': '📊 Comparativa vs Top 10 de Google',
+        'auto_scraping': '🤖 Scraping Automático',
+        'manual_input': '✍️ Input Manual',
+        'auto_desc': '**Intenta obtener automáticamente las URLs del top 10 de Google**',
+        'enter_keyword': 'Ingresa la keyword principal de esta URL:',
+        'keyword_placeholder': 'Ej: how to build app with bubble',
+        'get_top10': '🔍 Obtener Top 10 automáticamente',
+        'getting_top10': 'Obteniendo top 10 para',
+        'urls_obtained': 'Se obtuvieron',
+        'obtained_urls': 'URLs obtenidas',
+        'analyze_urls': '▶️ Analizar estas URLs',
+        'scraping_blocked': 'No se pudo obtener el top 10 automáticamente',
+        'use_manual': 'Google está bloqueando el scraping. Usa el método **Input Manual** en la pestaña de al lado.',
+        'manual_desc': '**Pega manualmente las URLs del top 10 de Google**',
+        'manual_tip': '💡 Abre Google en modo incógnito, busca tu keyword, y copia las URLs de los primeros 10 resultados',
+        'keyword': 'Keyword:',
+        'paste_urls': 'Pega las URLs del top 10 (una por línea):',
+        'urls_ready': 'URLs listas para analizar',
+        'need_3_urls': 'Necesitas al menos 3 URLs válidas',
+        'analyzing_urls': 'Analizando',
+        'for_keyword': 'URLs para la keyword:',
+        'analyzing_position': 'Analizando posición',
+        'heading_recommendations': '📑 Recomendaciones de Headings Faltantes',
+        'heading_structure': '📑 Estructura de Encabezados de la Competencia',
+        'heading_structure_desc': 'Analiza cómo estructuran su contenido los competidores del Top 10',
+        'generating_headings': 'Generando análisis de headings faltantes...',
+        'new_comparativa': '🔄 Nueva comparativa',
+        'back_to_list': '⬅️ Volver a la lista de URLs',
+        'priority_calculation': '¿Cómo se calcula la prioridad?',
+        'tutorial': '¿Cómo exportar desde GSC?',
+        'upload_csv': 'Sube tu CSV de Google Search Console para comenzar',
+        'fell': 'Empeoró',
+        'rose': 'Mejoró',
+        'pos': 'pos',
+        'no_change': 'Sin cambio',
+        'api_key_required': '⚠️ Necesitas ingresar tu Groq API Key en el sidebar para usar las recomendaciones con IA',
+        'api_key_invalid': '❌ API Key inválida. Verifica que la copiaste correctamente desde console.groq.com',
+        'perf_title': '📈 Rendimiento',
+        'perf_stages': 'Etapas',
+        'perf_hosts': 'Llamadas externas por host',
+        'perf_calls': 'Últimas llamadas',
+        'perf_profile': 'Profile de la última ejecución',
+        'perf_export': '💾 Exportar JSON',
+        'perf_reset': '🧹 Reiniciar métricas',
+        'perf_empty': 'Sin métricas todavía',
+        'perf_host_state': 'Estado por host (timeouts adaptativos y circuit breaker)',
+        'perf_fetch_pool': 'Pool de descargas del servidor: {running}/{workers} en curso, {queued} en cola; espera en cola p50 {wait_p50_ms} ms, p95 {wait_p95_ms} ms. Por sesión:',
+        'fetch_stats': 'Descargas: {aborted} abortadas (no HTML), {truncated} truncadas por tamaño',
+        'page_truncated': '⚠️ El HTML superó el límite de descarga y se analizó truncado',
+        'site_crawl': '🕸️ Enlaces internos del sitio',
+        'site_crawl_desc': 'Rastrea tu dominio (desde las URLs de GSC y el sitemap) para detectar páginas huérfanas o poco enlazadas. Las páginas con 0 enlaces suman +10 al score y las de 1-2 enlaces +5.',
+        'crawl_max_pages': 'Máximo de páginas a rastrear:',
+        'crawl_btn': '🕸️ Rastrear sitio',
+        'crawling': 'Rastreando',
+        'crawl_summary': '{crawled} páginas rastreadas, {failed} fallidas, {nodes} URLs, {edges} enlaces, {orphans} huérfanas ({graph_kb} KB)',
+        'crawl_partial': 'Crawl parcial o con descargas fallidas: los enlaces entrantes son mínimos y ninguna URL se marca como huérfana',
+        'link_sources': 'Páginas con más autoridad que aún no enlazan a esta URL:',
+        'inlinks': 'Enlaces entrantes',
+        'jobs': '🧵 Trabajos en segundo plano',
+        'job_running': '⏳ En segundo plano: puedes seguir usando la app o recargar la página',
+        'job_cancel': '⏹️ Cancelar',
+        'job_attach': 'Abrir',
+        'job_failed': 'El trabajo terminó como',
+        'job_partial': 'Resultados parciales',
+        'job_reattached': '🔗 Trabajo recuperado tras recargar la página',
+        'no_jobs': 'Sin trabajos recientes',
+        'scoring': '⚖️ Pesos del score',
+        'scoring_desc': 'Los pesos se normalizan para que sumen 100%. Cambiarlos recalcula el ranking sin volver a procesar el CSV.',
+        'weight_position': 'Peso posición (%)',
+        'weight_traffic': 'Peso tráfico (%)',
+        'weight_trend': 'Peso tendencias (%)',
+        'position_window': 'Ventana de posiciones',
+        'click_threshold': 'Umbral de clicks (× media)',
+        'bonus_fell_page1': 'Bonus: cayó de página 1',
+        'bonus_position_loss': 'Bonus: perdió >3 posiciones',
+        'bonus_traffic_loss': 'Bonus: perdió >20% tráfico',
+        'bonus_orphan': 'Bonus: página huérfana',
+        'bonus_weak_links': 'Bonus: 1-2 enlaces internos',
+        'no_results_scoring': '⚠️ Ninguna URL cumple los filtros actuales del score',
+        'top_k_shown': 'Se muestran las {k} con mayor score',
+        'bonus_stale': 'Bonus: contenido antiguo',
+        'stale_days': 'Antiguo a partir de (días)',
+        'ranking_mode': 'Ordenar por',
+        'ranking_mode_score': 'Score heurístico',
+        'ranking_mode_click_gain': 'Clicks ganables',
+        'click_gain_desc': 'Ajusta la curva CTR por posición de tu sitio con las filas del CSV y ordena por los clicks extra que daría subir N posiciones (impresiones × ΔCTR esperado). Pesos y bonus no se aplican.',
+        'gain_positions': 'Posiciones a subir',
+        'click_gain': 'Clicks ganables',
+        'click_gain_help': 'De la posición {current:.1f} a la {target:.1f}: CTR esperado {ctr_now:.1f}% → {ctr_target:.1f}% con {impressions:,} impresiones',
+        'sitemap': '🗓️ Antigüedad del contenido (sitemap)',
+        'sitemap_desc': 'Lee el índice de sitemaps del dominio (robots.txt o /sitemap.xml, incluidos .xml.gz) y cruza el lastmod con tus URLs. El resultado se cachea entre ejecuciones.',
+        'sitemap_btn': '🗓️ Leer sitemaps',
+        'sitemap_summary': '{sitemaps} sitemaps ({failed} con error), {cached_entries} URLs en caché; {matched} de tus URLs tienen lastmod',
+        'cannibalization': '⚔️ Canibalización de keywords',
+        'cannibal_desc': 'Sube un export Query×Page (consulta, página, clicks, impresiones) para detectar URLs propias que compiten por las mismas consultas. Actualizar solo una de ellas no arregla la caída: conviene fusionar o diferenciar.',
+        'cannibal_upload': 'Export Query×Page (CSV)',
+        'cannibal_btn': '⚔️ Detectar canibalización',
+        'cannibal_bad_file': '❌ No se reconocen las columnas de consulta, página e impresiones',
+        'cannibal_none': '✅ No hay páginas canibalizadas',
+        'cannibal_summary': '{clusters} clusters con {pages} páginas canibalizadas ({pairs} pares consulta-página)',
+        'cannibal_warning': '⚔️ Esta URL compite con otras {n} páginas tuyas por las mismas consultas (cluster #{cluster})',
+        'cannibal_queries': 'Consultas compartidas',
+        'asset_audit_btn': '📦 Auditar peso de la página',
+        'asset_audit_running': 'Midiendo imágenes, scripts y CSS...',
+        'asset_audit': '📦 Peso de la página',
+        'page_weight': 'Peso total',
+        'asset_unknown': '{unknown} assets sin tamaño ({timed_out} fuera del tiempo límite)',
+        'export': '📥 Exportar resultados',
+        'export_desc': 'Ranking completo con los pesos actuales, más las auditorías on-page, comparativas de competidores y recomendaciones generadas en esta sesión. CSV y Parquet se descargan en un zip con un fichero por tabla; XLSX, con una hoja por tabla.',
+        'export_format': 'Formato',
+        'export_btn': '📥 Descargar',
+        'batch': '🧮 Comparativa por lotes',
+        'batch_desc': 'Una pareja por línea: URL propia y keyword. Las SERPs se piden espaciadas y cada página (tuya o de la competencia) se descarga una sola vez aunque aparezca en varias keywords.',
+        'batch_pairs': 'Parejas URL, keyword',
+        'batch_btn': '🧮 Comparar en lote',
+        'batch_no_pairs': '❌ No hay parejas válidas (formato: https://..., keyword)',
+        'batch_summary': '{pairs} comparativas, {keywords} SERPs; {unique_fetches} páginas descargadas en lugar de {naive_fetches} ({fetches_saved} descargas ahorradas)',
+        'batch_pick': 'Comparativa',
+        'batch_no_serp': 'No se obtuvieron resultados de búsqueda para esta keyword',
+        'batch_own_rank': 'Tu URL aparece en la posición #{rank} de la SERP',
+        'batch_gaps': 'H2 frecuentes en la competencia que te faltan',
+        'bulk_insights': '🤖 Recomendaciones IA en lote',
+        'bulk_insights_desc': 'Recomendaciones para las primeras URLs del ranking con varias URLs por petición al LLM (respuesta JSON validada; las que no validan se vuelven a pedir).',
+        'bulk_insights_n': 'URLs del ranking',
+        'bulk_insights_btn': '🤖 Generar en lote',
+        'bulk_insights_summary': '{urls} URLs en {requests} peticiones ({requests_saved} peticiones ahorradas frente a una por URL); {retried_urls} URLs reintentadas, {failed} sin recomendación',
+        'bulk_insights_tokens': '{tokens_per_url} tokens por URL · prompt estimado {packed_prompt_tokens_est} tokens frente a {single_prompt_tokens_est} con una llamada por URL',
+        'bulk_insights_failed': 'Sin recomendación'
+    },
+    "English": {
+        'title': '🎯 Content Refresh Prioritizer',
+        'subtitle': 'Discover which pages to optimize first based on Google Search Console',
+        'upload': '📊 Google Search Console CSV',
+        'analyze_btn': '🚀 Analyze',
+        'analyzing': 'Analyzing data...',
+        'success': 'opportunities found',
+        'new_analysis': '🔄 New analysis',
+        'prioritized_urls': '📋 Prioritized URLs',
+        'select_url': '💡 **Select a URL** from the list by entering its number to see the full analysis',
+        'enter_number': 'Enter the number (#) of the URL you want to analyze:',
+        'analyze_selected': '🔍 Analyze selected URL',
+        'deep_analysis': '🎯 Deep Analysis',
+        'on_page': '🔍 On-Page Analysis',
+        'ai_recommendations': '💡 AI Recommendations',
+        'generating': 'Generating personalized analysis...',
+        'internal_links': '🔗 Internal Links Recommendations',
+        'current': 'Current',
+        'suggestion': 'Suggestion',
+        'your_page_has': 'Your page has',
+        'internal_links_text': 'internal links in content.',
+        'add_links_to': 'Add links to these high-performance pages:',
+        'comparativa': '📊 Comparison vs Google Top 10',
+        'auto_scraping': '🤖 Automatic Scraping',
+        'manual_input': '✍️ Manual Input',
+        'auto_desc': '**Try to automatically get the top 10 URLs from Google**',
+        'enter_keyword': 'Enter the main keyword for this URL:',
+        'keyword_placeholder': 'Ex: how to build app with bubble',
+        'get_top10': '🔍 Get Top 10 automatically',
+        'getting_top10': 'Getting top 10 for',
+        'urls_obtained': 'URLs obtained:',
+        'obtained_urls': 'Obtained URLs',
+        'analyze_urls': '▶️ Analyze these URLs',
+        'scraping_blocked': 'Could not get top 10 automatically',
+        'use_manual': 'Google is blocking scraping. Use the **Manual Input** method in the next tab.',
+        'manual_desc': '**Manually paste the top 10 URLs from Google**',
+        'manual_tip': '💡 Open Google in incognito mode, search your keyword, and copy the URLs of the first 10 results',
+        'keyword': 'Keyword:',
+        'paste_urls': 'Paste top 10 URLs (one per line):',
+        'urls_ready': 'URLs ready to analyze',
+        'need_3_urls': 'You need at least 3 valid URLs',
+        'analyzing_urls': 'Analyzing',
+        'for_keyword': 'URLs for keyword:',
+        'analyzing_position': 'Analyzing position',
+        'heading_recommendations': '📑 Missing Headings Recommendations',
+        'heading_structure': '📑 Competitor Heading Structure',
+        'heading_structure_desc': 'Analyze how Top 10 competitors structure their content',
+        'generating_headings': 'Generating missing headings analysis...',
+        'new_comparativa': '🔄 New comparison',
+        'back_to_list': '⬅️ Back to URL list',
+        'priority_calculation': 'How is priority calculated?',
+        'tutorial': 'How to export from GSC?',
+        'upload_csv': 'Upload your Google Search Console CSV to start',
+        'fell': 'Worsened',
+        'rose': 'Improved',
+        'pos': 'pos',
+        'no_change': 'No change',
+        'api_key_required': '⚠️ You need to enter your Groq API Key in the sidebar to use AI recommendations',
+        'api_key_invalid': '❌ Invalid API Key. Verify you copied it correctly from console.groq.com',
+        'perf_title': '📈 Performance',
+        'perf_stages': 'Stages',
+        'perf_hosts': 'External calls by host',
+        'perf_calls': 'Latest calls',
+        'perf_profile': 'Last run profile',
+        'perf_export': '💾 Export JSON',
+        'perf_reset': '🧹 Reset metrics',
+        'perf_empty': 'No metrics yet',
+        'perf_host_state': 'Per-host state (adaptive timeouts and circuit breaker)',
+        'perf_fetch_pool': 'Server fetch pool: {running}/{workers} running, {queued} queued; queue wait p50 {wait_p50_ms} ms, p95 {wait_p95_ms} ms. Per session:',
+        'fetch_stats': 'Downloads: {aborted} aborted (non-HTML), {truncated} truncated by size',
+        'page_truncated': '⚠️ The HTML exceeded the download limit and was analyzed truncated',
+        'site_crawl': '🕸️ Site internal links',
+        'site_crawl_desc': 'Crawl your domain (from the GSC URLs and the sitemap) to detect orphaned or weakly linked pages. Pages with 0 links add +10 to the score and pages with 1-2 links +5.',
+        'crawl_max_pages': 'Maximum pages to crawl:',
+        'crawl_btn': '🕸️ Crawl site',
+        'crawling': 'Crawling',
+        'crawl_summary': '{crawled} pages crawled, {failed} failed, {nodes} URLs, {edges} links, {orphans} orphans ({graph_kb} KB)',
+        'crawl_partial': 'Partial crawl or failed fetches: inbound link counts are minimums and no URL is flagged as orphan',
+        'link_sources': 'Highest-authority pages that do not link to this URL yet:',
+        'inlinks': 'Inbound links',
+        'jobs': '🧵 Background jobs',
+        'job_running': '⏳ Running in the background: you can keep using the app or reload the page',
+        'job_cancel': '⏹️ Cancel',
+        'job_attach': 'Open',
+        'job_failed': 'The job ended as',
+        'job_partial': 'Partial results',
+        'job_reattached': '🔗 Job recovered after reloading the page',
+        'no_jobs': 'No recent jobs',
+        'scoring': '⚖️ Score weights',
+        'scoring_desc': 'Weights are normalized to add up to 100%. Changing them recomputes the ranking without reprocessing the CSV.',
+        'weight_position': 'Position weight (%)',
+        'weight_traffic': 'Traffic weight (%)',
+        'weight_trend': 'Trends weight (%)',
+        'position_window': 'Position window',
+        'click_threshold': 'Click threshold (× mean)',
+        'bonus_fell_page1': 'Bonus: dropped from page 1',
+        'bonus_position_loss': 'Bonus: lost >3 positions',
+        'bonus_traffic_loss': 'Bonus: lost >20% traffic',
+        'bonus_orphan': 'Bonus: orphan page',
+        'bonus_weak_links': 'Bonus: 1-2 internal links',
+        'no_results_scoring': '⚠️ No URL matches the current score filters',
+        'top_k_shown': 'Showing the {k} with the highest score',
+        'bonus_stale': 'Bonus: stale content',
+        'stale_days': 'Stale after (days)',
+        'ranking_mode': 'Rank by',
+        'ranking_mode_score': 'Heuristic score',
+        'ranking_mode_click_gain': 'Click upside',
+        'click_gain_desc': "Fits your site's CTR-by-position curve from the CSV rows and ranks by the extra clicks from moving up N positions (impressions × expected ΔCTR). Weights and bonuses are not applied.",
+        'gain_positions': 'Positions to climb',
+        'click_gain': 'Click upside',
+        'click_gain_help': 'From position {current:.1f} to {target:.1f}: expected CTR {ctr_now:.1f}% → {ctr_target:.1f}% on {impressions:,} impressions',
+        'sitemap': '🗓️ Content age (sitemap)',
+        'sitemap_desc': "Reads the domain's sitemap index (robots.txt or /sitemap.xml, including .xml.gz) and joins lastmod onto your URLs. The result is cached between runs.",
+        'sitemap_btn': '🗓️ Read sitemaps',
+        'sitemap_summary': '{sitemaps} sitemaps ({failed} with errors), {cached_entries} URLs cached; {matched} of your URLs have lastmod',
+        'cannibalization': '⚔️ Keyword cannibalization',
+        'cannibal_desc': 'Upload a Query×Page export (query, page, clicks, impressions) to find your own URLs competing for the same queries. Refreshing just one of them will not fix the drop: merge or differentiate them.',
+        'cannibal_upload': 'Query×Page export (CSV)',
+        'cannibal_btn': '⚔️ Detect cannibalization',
+        'cannibal_bad_file': '❌ Could not find the query, page and impressions columns',
+        'cannibal_none': '✅ No cannibalized pages found',
+        'cannibal_summary': '{clusters} clusters with {pages} cannibalized pages ({pairs} query-page pairs)',
+        'cannibal_warning': '⚔️ This URL competes with {n} other pages of yours for the same queries (cluster #{cluster})',
+        'cannibal_queries': 'Shared queries',
+        'asset_audit_btn': '📦 Audit page weight',
+        'asset_audit_running': 'Measuring images, scripts and CSS...',
+        'asset_audit': '📦 Page weight',
+        'page_weight': 'Total weight',
+        'asset_unknown': '{unknown} assets without size ({timed_out} over the time budget)',
+        'export': '📥 Export results',
+        'export_desc': 'Full ranking with the current weights, plus the on-page audits, competitor comparisons and recommendations generated in this session. CSV and Parquet download as a zip with one file per table; XLSX as one sheet per table.',
+        'export_format': 'Format',
+        'export_btn': '📥 Download',
+        'batch': '🧮 Batch comparison',
+        'batch_desc': "One pair per line: your URL and a keyword. SERPs are requested with spacing and each page (yours or a competitor's) is fetched once even if it ranks for several keywords.",
+        'batch_pairs': 'URL, keyword pairs',
+        'batch_btn': '🧮 Compare in batch',
+        'batch_no_pairs': '❌ No valid pairs (format: https://..., keyword)',
+        'batch_summary': '{pairs} comparisons, {keywords} SERPs; {unique_fetches} pages fetched instead of {naive_fetches} ({fetches_saved} fetches saved)',
+        'batch_pick': 'Comparison',
+        'batch_no_serp': 'No search results were found for this keyword',
+        'batch_own_rank': 'Your URL ranks #{rank} in the SERP',
+        'batch_gaps': 'H2s common among competitors that you are missing',
+        'bulk_insights': '🤖 Batch AI recommendations',
+        'bulk_insights_desc': 'Recommendations for the top URLs of the ranking with several URLs per LLM request (validated JSON reply; URLs that fail validation are requested again).',
+        'bulk_insights_n': 'Ranking URLs',
+        'bulk_insights_btn': '🤖 Generate in batch',
+        'bulk_insights_summary': '{urls} URLs in {requests} requests ({requests_saved} requests saved versus one per URL); {retried_urls} URLs retried, {failed} without recommendation',
+        'bulk_insights_tokens': '{tokens_per_url} tokens per URL · estimated prompt {packed_prompt_tokens_est} tokens versus {single_prompt_tokens_est} with one call per URL',
+        'bulk_insights_failed': 'No recommendation'
+    }
+}